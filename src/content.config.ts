@@ -4,6 +4,7 @@ import { docsSchema } from '@astrojs/starlight/schema';
 import { snippetLoader } from './scripts/snippets-loader';
 import { file } from 'astro/loaders';
 import { snippetType } from './util/read-snippet';
+import { parseSnippets } from './util/snippet-formats';
 
 const snippets1 = defineCollection({
     loader: async () =>  {
@@ -22,7 +23,7 @@ const snippets1 = defineCollection({
 export const collections = {
 	docs: defineCollection({ loader: docsLoader(), schema: docsSchema() }),
     snippets: defineCollection({
-        loader: file("snippets.json"),
+        loader: file("snippets.json", { parser: parseSnippets }),
         schema: snippetType
     })
 	// snippets: snippetLoader({
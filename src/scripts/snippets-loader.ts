@@ -1,21 +1,94 @@
 import type { Loader, LoaderContext} from "astro/loaders"
-import {z} from "astro:content"
+import { spawn, type ChildProcess } from "node:child_process"
+import { createInterface } from "node:readline"
+import { join } from "node:path"
+import { snippetType } from "../util/read-snippet"
 
+const SERVER_SCRIPT = join(process.cwd(), "tools", "snippet-parser", "server.py")
+
+/// A marker error reported by tools/snippet-parser/server.py
+export interface SnippetDiagnostic {
+    file: string,
+    line: number,
+    code: string,
+    message: string,
+}
+
+/// Client of the long lived snippet parser (tools/snippet-parser/server.py),
+/// one JSON-RPC message per line over its stdin/stdout.
+export class SnippetServer {
+    private process: ChildProcess;
+    private nextId = 1;
+    private pending = new Map<number, {resolve: (result: any) => void,
+                                       reject: (error: Error) => void}>();
+
+    constructor(llvmRootPath: string, python = "python3") {
+        this.process = spawn(python, [SERVER_SCRIPT, "--root", llvmRootPath],
+                             {stdio: ["pipe", "pipe", "inherit"]});
+        createInterface({input: this.process.stdout!}).on("line", (line) => {
+            const response = JSON.parse(line);
+            const call = this.pending.get(response.id);
+            if (!call)
+                return;
+            this.pending.delete(response.id);
+            if (response.error)
+                call.reject(new Error(`snippet server: ${response.error.message}`));
+            else
+                call.resolve(response.result);
+        });
+        this.process.on("exit", () => {
+            for (const call of this.pending.values())
+                call.reject(new Error("snippet server exited"));
+            this.pending.clear();
+        });
+    }
+
+    request(method: string, params: object = {}): Promise<any> {
+        const id = this.nextId++;
+        return new Promise((resolve, reject) => {
+            this.pending.set(id, {resolve, reject});
+            this.process.stdin!.write(
+                JSON.stringify({jsonrpc: "2.0", id, method, params}) + "\n");
+        });
+    }
+
+    snippetsForFile(path: string): Promise<{snippets: any[], diagnostics: SnippetDiagnostic[]}> {
+        return this.request("snippets_for_file", {path});
+    }
+
+    snippetById(id: string): Promise<{snippet: any | null, diagnostics: SnippetDiagnostic[]}> {
+        return this.request("snippet", {id});
+    }
+
+    async ids(): Promise<string[]> {
+        return (await this.request("ids")).ids;
+    }
+
+    async close() {
+        await this.request("shutdown");
+        this.process.stdin!.end();
+    }
+}
+
+let server: SnippetServer | null = null;
+
+/// Loads the snippets of the ids in the snippet id index through the
+/// snippet server, which only parses the files that changed since the
+/// last load.
 export function snippetLoader(options: {llvmRootPath: string}) : Loader {
     return {
         name: "snippets-loader",
         load: async(context: LoaderContext) : Promise<void> => {
-            context.logger.debug("====calling a logger yo")
-            console.log("==== running yuo")
-            // context.store.set({
-            //     id: "some entry",
-            //     data: {
-            //         snippetsInFile: ["aslkdjf", "aslkdjf"]
-            //     }
-            // })
+            server ??= new SnippetServer(options.llvmRootPath);
+            context.store.clear();
+            for (const id of await server.ids()) {
+                const { snippet, diagnostics } = await server.snippetById(id);
+                for (const d of diagnostics)
+                    context.logger.warn(`${d.file}:${d.line}: ${d.message}`);
+                if (snippet)
+                    context.store.set({ id, data: await context.parseData({ id, data: snippet }) });
+            }
         },
-        schema: () => z.array(z.object({
-            snippetId: z.string()
-        }))
+        schema: snippetType
     }
 }
@@ -15,9 +15,42 @@ export const snippetType = z.object({
     context_stack: z.array(z.object({
         line: z.number(),
         type: z.string(),
+        // only with main.py --embed-text
+        content: z.string().optional(),
+        // only with main.py --symbols, the class that declares the
+        // qualified name of an out-of-line definition
+        declared_in: z.object({
+            name: z.string(),
+            type: z.string(),
+            file: z.string(),
+            line: z.number(),
+        }).optional(),
     })),
     //type has values "add","replace"
     type: z.string(),
+    // sha1 of the code between the markers
+    hash: z.string().optional(),
+    // hashes main.py --relocate finds the snippet again with,
+    // see tools/snippet-parser/snippet_relocate.py
+    fingerprint: z.object({
+        start: z.string(),
+        end: z.string(),
+        before: z.string(),
+        after: z.string(),
+        context: z.array(z.string()),
+    }).optional(),
+    // The fields below are only there when snippets.json was
+    // built with main.py --embed-text
+    code: z.string().optional(),
+    before: z.array(z.string()).optional(),
+    after: z.array(z.string()).optional(),
+    // Only on replace=<id> snippets, resolved by main.py: the code
+    // of <id> and the unified line diff from it to this snippet
+    replaces: z.object({
+        id: z.string(),
+        removed: z.string(),
+        diff: z.array(z.string()),
+    }).optional(),
 })
 
 interface Range {
@@ -113,6 +146,9 @@ export async function readSnippet(
     snippet: z.infer<typeof snippetType>,
     beforeContext: number = 2,
     afterContext: number = 2): Promise<SnippetContent> {
+    if (snippet.code !== undefined) {
+        return readEmbeddedSnippet(snippet, beforeContext, afterContext);
+    }
     const text = await fs.readFile(getAbsoluteFilepath(snippet.filename), "utf-8");
     const lines = text.split("\n");
     let startSnipI = snippet.start_lineno - 1;
@@ -172,6 +208,42 @@ export async function readSnippet(
     }
 }
 
+/**
+ * Same as readSnippet, for snippets.json files built with
+ * main.py --embed-text. Everything is taken from the JSON,
+ * the LLVM sources are not read.
+ */
+function readEmbeddedSnippet(
+    snippet: z.infer<typeof snippetType>,
+    beforeContext: number,
+    afterContext: number): SnippetContent {
+    const joinLines = (lines: string[]) => lines.map(line => line + "\n").join("");
+    const before = snippet.before ?? [];
+    const after = snippet.after ?? [];
+    if (snippet.type === "end") {
+        afterContext = 0;
+    }
+    let contextStack = [];
+    for (const context of snippet.context_stack) {
+        if (context.type === "NONE") continue;
+        contextStack.push({
+            text: context.content ?? "",
+            type: context.type
+        })
+    }
+    return {
+        // an empty snippet reads as a single empty line
+        snippet: snippet.code || "\n",
+        contextStack,
+        filename: snippet.filename,
+        surrounding: {
+            lines: SURROUNDING_CONTEXT_LINES,
+            before: joinLines(before.slice(Math.max(0, before.length - beforeContext))),
+            after: joinLines(after.slice(0, afterContext)),
+        }
+    }
+}
+
 export async function readSnippet1(snippet: z.infer<typeof snippetType>): Promise<SnippetContent> {
     const text = await fs.readFile(snippet.filename, "utf-8");
     let context_start = snippet.context_stack.at(-1)?.line ?? -1;
@@ -0,0 +1,57 @@
+import fs from "node:fs/promises"
+
+/// One scope of the context stack at a line, as in
+/// tools/snippet-parser/scope_index.py: open from start to end - 1,
+/// declared on line
+export interface Scope {
+    type: string,
+    line: number,
+    start: number,
+    end: number,
+}
+
+/// An entry of the scope index (main.py --scopes), see scope_index.py
+/// for the layout
+interface ScopeEntry {
+    blob: string,
+    spans: [number, number, string, number][],
+    lines: number[],
+    stacks: number[],
+    nodes: [number, number][],
+}
+
+export class ScopeIndex {
+    private constructor(private files: Record<string, ScopeEntry>) {}
+
+    static async load(path: string): Promise<ScopeIndex> {
+        const data = JSON.parse(await fs.readFile(path, "utf-8"));
+        return new ScopeIndex(data.files);
+    }
+
+    /// The context stack at filename:line, bottom first, null if the
+    /// file is not in the index or was indexed from contents other
+    /// than blob (the git blob hash of the file)
+    contextAt(filename: string, line: number, blob: string): Scope[] | null {
+        const entry = this.files[filename];
+        if (!entry || entry.blob !== blob)
+            return null;
+        // last change of the stack at or before line
+        let low = 0, high = entry.lines.length;
+        while (low < high) {
+            const mid = (low + high) >> 1;
+            if (entry.lines[mid] <= line)
+                low = mid + 1;
+            else
+                high = mid;
+        }
+        const scopes: Scope[] = [];
+        let node = low > 0 ? entry.stacks[low - 1] : -1;
+        while (node !== -1) {
+            const [span, parent] = entry.nodes[node];
+            const [start, end, type, declLine] = entry.spans[span];
+            scopes.push({type, line: declLine, start, end});
+            node = parent;
+        }
+        return scopes.reverse();
+    }
+}
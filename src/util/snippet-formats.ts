@@ -0,0 +1,59 @@
+/// Reads the output of tools/snippet-parser/main.py in any of
+/// its --format values (json, ndjson or compact) as the list
+/// of snippets in snippets.json.
+
+interface CompactSnippets {
+    format: "compact";
+    files: string[];
+    context_stacks: unknown[];
+    fields: string[];
+    snippets: unknown[][];
+}
+
+/**
+ * The snippets of a --format compact output, with the indices
+ * into the files and context_stacks tables replaced by the values
+ */
+export function expandCompact(data: CompactSnippets) {
+    return data.snippets.map(row => {
+        const snippet: Record<string, unknown> = {};
+        // null is a key the snippet does not have
+        data.fields.forEach((field, i) => {
+            if (row[i] !== null) {
+                snippet[field] = row[i];
+            }
+        });
+        if ("filename" in snippet) {
+            snippet.filename = data.files[snippet.filename as number];
+        }
+        if ("context_stack" in snippet) {
+            snippet.context_stack = data.context_stacks[snippet.context_stack as number];
+        }
+        return snippet;
+    });
+}
+
+/**
+ * Parser for the astro file() loader
+ * @param text The contents of snippets.json
+ */
+export function parseSnippets(text: string) {
+    const trimmed = text.trimStart();
+    if (trimmed.startsWith("[")) {
+        return JSON.parse(text);
+    }
+    if (trimmed.startsWith("{")) {
+        let data;
+        try {
+            data = JSON.parse(text);
+        } catch {
+            // ndjson with a single snippet per line
+        }
+        if (data?.format === "compact") {
+            return expandCompact(data);
+        }
+    }
+    return text.split("\n")
+        .filter(line => line.trim() !== "")
+        .map(line => JSON.parse(line));
+}
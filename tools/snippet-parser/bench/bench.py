@@ -0,0 +1,191 @@
+# Benchmarks for the snippet parser.
+# Parses a corpus (generated by gen_corpus.py unless --corpus is given)
+# in process, timing each phase of FileSnippetReader, and then runs
+# main.py end to end on the same files.
+#
+# python3 bench.py [--corpus DIR] [gen_corpus.py options] [--repeat N]
+#                  [-j N] [--json results.json] [--baseline old.json]
+#
+# With --baseline, the throughput is compared against an earlier
+# --json result and the exit code is 1 if any of them regressed by
+# more than --threshold percent.
+
+import argparse
+import json
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+BENCH_DIR = Path(__file__).resolve().parent
+PARSER_DIR = BENCH_DIR.parent
+sys.path.insert(0, str(PARSER_DIR))
+sys.path.insert(0, str(BENCH_DIR))
+
+import main as parser  # noqa: E402
+from gen_corpus import add_corpus_args, generate_corpus  # noqa: E402
+
+PHASES = ["read", "scan", "decode", "walk", "to_dict", "serialize"]
+
+
+def corpus_files(corpus_dir: Path):
+    suffixes = [".cpp", ".h", ".td", ".ll", ".s", ".txt"]
+    return sorted(p for p in corpus_dir.rglob("*")
+                  if p.is_file() and p.suffix in suffixes)
+
+
+def parse_in_process(files, corpus_dir: Path, embed_text: bool):
+    """
+    Parse every file once. Returns the seconds spent per phase
+    and the number of snippets.
+    """
+    times = dict.fromkeys(PHASES, 0.0)
+    snippets = 0
+    for f in files:
+        reader = parser.FileSnippetReader(
+            f, f.relative_to(corpus_dir).as_posix(), embed_text=embed_text)
+        for phase, t in reader.times.items():
+            times[phase] += t
+        t = time.perf_counter()
+        dicts = reader.to_dict()
+        times["to_dict"] += time.perf_counter() - t
+        t = time.perf_counter()
+        json.dumps(dicts, indent=2)
+        times["serialize"] += time.perf_counter() - t
+        snippets += len(dicts)
+    return times, snippets
+
+
+def peak_memory_in_process(files, corpus_dir: Path, embed_text: bool):
+    """ Peak traced memory in bytes while parsing all files """
+    tracemalloc.start()
+    parse_in_process(files, corpus_dir, embed_text)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak
+
+
+def run_end_to_end(files, jobs: int, embed_text: bool):
+    """
+    Run main.py on all files. Returns the wall time and the
+    peak RSS of the process in bytes.
+    """
+    with tempfile.TemporaryDirectory() as tmp:
+        command = [sys.executable, str(PARSER_DIR / "main.py"),
+                   "--no-cache", "-j", str(jobs),
+                   "-o", str(Path(tmp) / "snippets.json")]
+        if embed_text:
+            command.append("--embed-text")
+        command += [str(f) for f in files]
+        t = time.perf_counter()
+        subprocess.run(command, check=True, stdout=subprocess.DEVNULL)
+        elapsed = time.perf_counter() - t
+    # ru_maxrss is in kilobytes on Linux
+    peak = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss * 1024
+    return elapsed, peak
+
+
+def run(args):
+    with tempfile.TemporaryDirectory() as tmp:
+        if args.corpus:
+            corpus_dir = Path(args.corpus)
+        else:
+            corpus_dir = Path(tmp)
+            generate_corpus(corpus_dir, args.files, args.lines, args.depth,
+                            args.density, args.seed)
+        files = corpus_files(corpus_dir)
+        lines = sum(f.read_bytes().count(b"\n") for f in files)
+
+        # keep the fastest of the repeats, the others are noise
+        best = None
+        for _ in range(args.repeat):
+            times, snippets = parse_in_process(files, corpus_dir,
+                                               args.embed_text)
+            if best is None or sum(times.values()) < sum(best.values()):
+                best = times
+        peak = peak_memory_in_process(files, corpus_dir, args.embed_text)
+        e2e = min(run_end_to_end(files, args.jobs, args.embed_text)
+                  for _ in range(args.repeat))
+
+    parse_total = sum(best.values())
+    return {
+        "files": len(files),
+        "lines": lines,
+        "snippets": snippets,
+        "phases": best,
+        "parse_seconds": parse_total,
+        "parse_lines_per_second": lines / parse_total,
+        "parse_peak_bytes": peak,
+        "end_to_end_seconds": e2e[0],
+        "end_to_end_lines_per_second": lines / e2e[0],
+        "end_to_end_peak_rss_bytes": e2e[1],
+        "jobs": args.jobs,
+    }
+
+
+def print_results(results):
+    print(f"{results['files']} files, {results['lines']} lines, "
+          f"{results['snippets']} snippets")
+    print("In process parse:")
+    for phase in PHASES:
+        t = results["phases"][phase]
+        share = 100 * t / results["parse_seconds"]
+        print(f"\t{phase:<10} {t * 1000:10.1f} ms  {share:5.1f}%")
+    print(f"\t{'total':<10} {results['parse_seconds'] * 1000:10.1f} ms  "
+          f"{results['parse_lines_per_second']:,.0f} lines/s")
+    print(f"\tpeak memory {results['parse_peak_bytes'] / 2**20:.1f} MiB")
+    print(f"End to end (main.py -j {results['jobs']}):")
+    print(f"\t{results['end_to_end_seconds'] * 1000:.1f} ms  "
+          f"{results['end_to_end_lines_per_second']:,.0f} lines/s")
+    print(f"\tpeak RSS {results['end_to_end_peak_rss_bytes'] / 2**20:.1f} MiB")
+
+
+def compare(results, baseline, threshold: float):
+    """ Print the throughput changes, returns False on a regression """
+    ok = True
+    for key in ["parse_lines_per_second", "end_to_end_lines_per_second"]:
+        change = 100 * (results[key] / baseline[key] - 1)
+        regressed = change < -threshold
+        ok = ok and not regressed
+        mark = "REGRESSION" if regressed else "ok"
+        print(f"{key}: {baseline[key]:,.0f} -> {results[key]:,.0f} "
+              f"({change:+.1f}%) {mark}")
+    return ok
+
+
+def parse_args(args):
+    argparser = argparse.ArgumentParser(
+        description="Benchmark the snippet parser")
+    argparser.add_argument("--corpus", type=str, default=None,
+                           help="Benchmark the files in this directory instead of a generated corpus")
+    add_corpus_args(argparser)
+    argparser.add_argument("--repeat", type=int, default=3,
+                           help="Runs of each benchmark, the fastest one is reported")
+    argparser.add_argument("-j", "--jobs", type=int, default=1,
+                           help="Jobs for the end to end run")
+    argparser.add_argument("--embed-text", action="store_true", default=False,
+                           help="Parse with --embed-text")
+    argparser.add_argument("--json", type=str, default=None,
+                           help="Also write the results to this JSON file")
+    argparser.add_argument("--baseline", type=str, default=None,
+                           help="Compare against the --json results of an earlier run")
+    argparser.add_argument("--threshold", type=float, default=10.0,
+                           help="Slowdown in percent reported as a regression")
+    return argparser.parse_args(args)
+
+
+if __name__ == "__main__":
+    args = parse_args(sys.argv[1:])
+    results = run(args)
+    print_results(results)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if not compare(results, baseline, args.threshold):
+            sys.exit(1)
@@ -0,0 +1,324 @@
+# Generates a synthetic LLVM-like source tree for benchmarking the
+# snippet parser. The C++ files use the constructs the parser has to
+# deal with (see example.txt and the lit tests): namespaces, classes,
+# out of line and inline functions, multiline declarations, operators,
+# lambdas, nested if/for blocks, braces in strings and comments,
+# #ifdef blocks and macros. TableGen, LLVM IR and CMake files are
+# generated too, with the marker comment style of each language.
+#
+# python3 gen_corpus.py out_dir [--files N] [--lines N] [--depth N]
+#                               [--density N] [--seed N]
+
+import argparse
+import random
+import sys
+from pathlib import Path
+
+
+class Emitter:
+    """
+    Collects the lines of one file and wraps some of the generated
+    blocks in snippet markers.
+    density: snippets per 1000 lines
+    """
+
+    def __init__(self, rng: random.Random, name: str, comment: str,
+                 density: float):
+        self.rng = rng
+        self.name = name
+        self.comment = comment
+        self.density = density
+        self.lines = []
+        self.snippets = 0
+        self.in_snippet = False
+
+    def emit(self, line: str, indent: int = 0):
+        self.lines.append("  " * indent + line)
+
+    def block(self, gen, *args):
+        """
+        Emit the block made by gen(*args), maybe as a snippet.
+        Snippets are never nested.
+        """
+        start = len(self.lines)
+        wrap = not self.in_snippet
+        if wrap:
+            self.in_snippet = True
+        gen(*args)
+        if wrap:
+            self.in_snippet = False
+            size = len(self.lines) - start
+            # chance that a block of this size holds a snippet
+            if self.rng.random() < self.density * size / 1000:
+                snip = f"{self.name}-{self.snippets}"
+                self.snippets += 1
+                kind = self.rng.choice(["", "", " mark", " end",
+                                        " commented"])
+                self.lines.insert(start, f"{self.comment}@s {snip}{kind}")
+                self.lines.append(f"{self.comment}- {snip}")
+
+    def text(self):
+        return "\n".join(self.lines) + "\n"
+
+
+class CppGenerator:
+    def __init__(self, rng: random.Random, out: Emitter, depth: int):
+        self.rng = rng
+        self.out = out
+        self.depth = depth
+        self.counter = 0
+
+    def ident(self, prefix: str):
+        self.counter += 1
+        return f"{prefix}{self.counter}"
+
+    def statement(self, indent: int):
+        r = self.rng.random()
+        if r < 0.15:
+            self.out.emit(f'const char *S = "{{ not a scope }} {self.counter}";', indent)
+        elif r < 0.25:
+            self.out.emit("// a comment with a brace {", indent)
+        elif r < 0.35:
+            self.out.emit(f"unsigned Value = 1'000'000 + {self.counter};", indent)
+        elif r < 0.45:
+            self.out.emit(f"LLVM_DEBUG(dbgs() << \"value \" << Value{self.counter});",
+                          indent)
+        else:
+            self.out.emit(f"Result += compute(Arg, {self.counter});", indent)
+
+    def body(self, indent: int, level: int):
+        for _ in range(self.rng.randint(2, 6)):
+            r = self.rng.random()
+            if level < self.depth and r < 0.2:
+                self.out.emit(f"if (Arg > {self.counter}) {{", indent)
+                self.body(indent + 1, level + 1)
+                if self.rng.random() < 0.4:
+                    self.out.emit("} else if (Arg == 0) {", indent)
+                    self.body(indent + 1, level + 1)
+                self.out.emit("}", indent)
+            elif level < self.depth and r < 0.3:
+                self.out.emit("for (unsigned I = 0; I < Arg; ++I) {", indent)
+                self.body(indent + 1, level + 1)
+                self.out.emit("}", indent)
+            elif level < self.depth and r < 0.35:
+                self.out.emit("auto Lambda = [&](int X) {", indent)
+                self.body(indent + 1, level + 1)
+                self.out.emit("};", indent)
+            else:
+                self.statement(indent)
+
+    def function(self, indent: int, scope: str = ""):
+        name = self.ident("compute")
+        r = self.rng.random()
+        if r < 0.2:
+            self.out.emit(f"bool {scope}{name}(unsigned Arg,", indent)
+            self.out.emit("    const SmallVectorImpl<SDValue> &Ops,", indent)
+            self.out.emit("    SelectionDAG &DAG) const {", indent)
+        elif r < 0.3:
+            self.out.emit(f"bool operator==(const {name} &Other) const {{", indent)
+        else:
+            self.out.emit(f"static unsigned {scope}{name}(unsigned Arg) {{", indent)
+        self.out.emit("unsigned Result = 0;", indent + 1)
+        self.body(indent + 1, 1)
+        self.out.emit("return Result;", indent + 1)
+        self.out.emit("}", indent)
+
+    def declaration(self, indent: int):
+        name = self.ident("decl")
+        if self.rng.random() < 0.5:
+            self.out.emit(f"void {name}(int Param,", indent)
+            self.out.emit("          int Param2);", indent)
+        else:
+            self.out.emit(f"int {name}() {{ return {self.counter}; }}", indent)
+
+    def class_(self, indent: int):
+        name = self.ident("Nova")
+        self.out.emit(f"class {name} : public TargetLowering {{", indent)
+        self.out.emit("public:", indent)
+        for _ in range(self.rng.randint(1, 4)):
+            if self.rng.random() < 0.4:
+                self.out.block(self.declaration, indent + 1)
+            else:
+                self.out.block(self.function, indent + 1)
+        self.out.emit("};", indent)
+
+    def top_level(self, indent: int):
+        r = self.rng.random()
+        if r < 0.3:
+            self.out.block(self.class_, indent)
+        elif r < 0.4:
+            self.out.emit("#ifdef NOVA_DEBUG", indent)
+            self.out.block(self.function, indent, "NovaTargetLowering::")
+            self.out.emit("#endif", indent)
+        elif r < 0.45:
+            self.out.emit(f"#define NOVA_CASE{self.counter}(X) \\", indent)
+            self.out.emit("  case X: { return #X; }", indent)
+        elif r < 0.5:
+            self.out.emit("/* block comment { with braces", indent)
+            self.out.emit("   spanning lines } */", indent)
+        else:
+            self.out.block(self.function, indent, "NovaTargetLowering::")
+        self.out.emit("")
+
+    def file(self, lines: int):
+        self.out.emit("//===- Generated.cpp - Benchmark input -----*- C++ -*-===//")
+        self.out.emit('#include "NovaISelLowering.h"')
+        self.out.emit("")
+        self.out.emit("using namespace llvm;")
+        self.out.emit("namespace llvm {")
+        while len(self.out.lines) < lines:
+            self.top_level(0)
+        self.out.emit("} // namespace llvm")
+
+
+class TableGenGenerator:
+    def __init__(self, rng: random.Random, out: Emitter):
+        self.rng = rng
+        self.out = out
+        self.counter = 0
+
+    def record(self):
+        self.counter += 1
+        r = self.rng.random()
+        if r < 0.3:
+            self.out.emit(f"class NovaInst{self.counter}<bits<6> op, string asm> {{")
+            self.out.emit("  bits<32> Inst;")
+            self.out.emit("  let Inst{31-26} = op;")
+            self.out.emit("}")
+        elif r < 0.5:
+            self.out.emit(f"multiclass NovaArith{self.counter}<string asm> {{")
+            self.out.emit(f'  def rr : NovaInst<0, !strconcat(asm, " $rd")>;')
+            self.out.emit(f'  def ri : NovaInst<1, !strconcat(asm, " $imm")>;')
+            self.out.emit("}")
+        elif r < 0.6:
+            self.out.emit("let isBranch = 1, isTerminator = 1 in {")
+            self.out.emit(f"  def BEQ{self.counter} : NovaInst<4, \"beq\">;")
+            self.out.emit("}")
+        else:
+            self.out.emit(f"def ADD{self.counter} : NovaInst<32, \"add\"> {{")
+            self.out.emit("  let Defs = [AT];")
+            self.out.emit("}")
+        self.out.emit("")
+
+    def file(self, lines: int):
+        self.out.emit("//===- Generated.td - Benchmark input ---------------===//")
+        while len(self.out.lines) < lines:
+            self.out.block(self.record)
+
+
+class IRGenerator:
+    def __init__(self, rng: random.Random, out: Emitter):
+        self.rng = rng
+        self.out = out
+        self.counter = 0
+
+    def function(self):
+        self.counter += 1
+        self.out.emit(f"define i32 @f{self.counter}(i32 %a, i32 %b) {{")
+        self.out.emit("entry:")
+        for i in range(self.rng.randint(2, 10)):
+            self.out.emit(f"  %t{i} = add i32 %a, {i}")
+        self.out.emit("  ret i32 %a")
+        self.out.emit("}")
+        self.out.emit("")
+
+    def file(self, lines: int):
+        self.out.emit("; RUN: llc -march=nova < %s | FileCheck %s")
+        while len(self.out.lines) < lines:
+            self.out.block(self.function)
+
+
+class CMakeGenerator:
+    def __init__(self, rng: random.Random, out: Emitter):
+        self.rng = rng
+        self.out = out
+        self.counter = 0
+
+    def command(self):
+        self.counter += 1
+        self.out.emit(f"add_llvm_component_library(LLVMNova{self.counter}")
+        self.out.emit(f"  NovaFile{self.counter}.cpp")
+        self.out.emit("  )")
+
+    def file(self, lines: int):
+        while len(self.out.lines) < lines:
+            self.out.block(self.command)
+
+
+# (suffix, directory, comment, share of the files)
+FILE_KINDS = [
+    (".cpp", "llvm/lib/Target/Nova", "//", 0.45),
+    (".h", "llvm/include/llvm/CodeGen", "//", 0.3),
+    (".td", "llvm/lib/Target/Nova", "//", 0.15),
+    (".ll", "llvm/test/CodeGen/Nova", ";", 0.07),
+    (".txt", "llvm/lib/Target/Nova", "#", 0.03),
+]
+
+
+def generate_file(rng: random.Random, suffix: str, name: str, comment: str,
+                  lines: int, depth: int, density: float):
+    out = Emitter(rng, name, comment, density)
+    if suffix in [".cpp", ".h"]:
+        CppGenerator(rng, out, depth).file(lines)
+    elif suffix == ".td":
+        TableGenGenerator(rng, out).file(lines)
+    elif suffix == ".ll":
+        IRGenerator(rng, out).file(lines)
+    else:
+        CMakeGenerator(rng, out).file(lines)
+    return out
+
+
+def generate_corpus(out_dir: Path, files: int = 200, lines: int = 2000,
+                    depth: int = 4, density: float = 2.0, seed: int = 0):
+    """
+    Write files source files of about lines lines each under out_dir.
+    Returns the list of written paths.
+    """
+    rng = random.Random(seed)
+    paths = []
+    kinds = [k[:3] for k in FILE_KINDS]
+    weights = [k[3] for k in FILE_KINDS]
+    for i in range(files):
+        suffix, directory, comment = rng.choices(kinds, weights)[0]
+        if suffix == ".txt":
+            path = out_dir / directory / f"Nova{i}" / "CMakeLists.txt"
+        else:
+            path = out_dir / directory / f"Nova{i}{suffix}"
+        # vary the sizes around the requested one
+        file_lines = max(10, int(rng.lognormvariate(0, 0.6) * lines))
+        out = generate_file(rng, suffix, f"snip{i}", comment, file_lines,
+                            depth, density)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(out.text())
+        paths.append(path)
+    return paths
+
+
+def parse_args(args):
+    parser = argparse.ArgumentParser(
+        description="Generate a synthetic LLVM-like tree for the snippet parser benchmarks")
+    parser.add_argument("out_dir", type=str, help="Directory to write the files to")
+    add_corpus_args(parser)
+    return parser.parse_args(args)
+
+
+def add_corpus_args(parser: argparse.ArgumentParser):
+    parser.add_argument("--files", type=int, default=200,
+                        help="Number of files to generate")
+    parser.add_argument("--lines", type=int, default=2000,
+                        help="Median number of lines per file")
+    parser.add_argument("--depth", type=int, default=4,
+                        help="Maximum nesting of blocks inside functions")
+    parser.add_argument("--density", type=float, default=2.0,
+                        help="Snippets per 1000 lines")
+    parser.add_argument("--seed", type=int, default=0,
+                        help="Random seed, the same seed gives the same files")
+
+
+if __name__ == "__main__":
+    args = parse_args(sys.argv[1:])
+    paths = generate_corpus(Path(args.out_dir), args.files, args.lines,
+                            args.depth, args.density, args.seed)
+    total = sum(len(p.read_text().splitlines()) for p in paths)
+    print(f"Wrote {len(paths)} files, {total} lines to {args.out_dir}")
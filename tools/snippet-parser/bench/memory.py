@@ -0,0 +1,116 @@
+# Memory benchmark of the snippet parser on large headers with many
+# snippets. Each header is parsed and only its Snippet objects are kept,
+# as the driver does until the output is written. Reports the peak traced
+# memory of the parse and the memory still held by the snippets (their
+# contexts and context stacks) afterwards.
+#
+# python3 memory.py [--headers N] [--lines N] [--density N] [--depth N]
+#                   [--seed N] [--json results.json] [--baseline old.json]
+
+import argparse
+import gc
+import json
+import random
+import sys
+import tempfile
+import tracemalloc
+from pathlib import Path
+
+BENCH_DIR = Path(__file__).resolve().parent
+sys.path.insert(0, str(BENCH_DIR.parent))
+sys.path.insert(0, str(BENCH_DIR))
+
+import main as parser  # noqa: E402
+from gen_corpus import generate_file  # noqa: E402
+
+
+def write_headers(out_dir: Path, headers: int, lines: int, depth: int,
+                  density: float, seed: int):
+    rng = random.Random(seed)
+    paths = []
+    for i in range(headers):
+        path = out_dir / f"Nova{i}.h"
+        out = generate_file(rng, ".h", f"snip{i}", "//", lines, depth,
+                            density)
+        path.write_text(out.text())
+        paths.append(path)
+    return paths
+
+
+def measure(paths):
+    """
+    Returns the peak traced bytes while parsing, the bytes held
+    by the snippets of all headers afterwards and the number of
+    snippets
+    """
+    gc.collect()
+    tracemalloc.start()
+    kept = []
+    for path in paths:
+        kept.append(parser.FileSnippetReader(path, path.name).snippets)
+    gc.collect()
+    retained, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak, retained, sum(len(snippets) for snippets in kept)
+
+
+def run(args):
+    with tempfile.TemporaryDirectory() as tmp:
+        paths = write_headers(Path(tmp), args.headers, args.lines,
+                              args.depth, args.density, args.seed)
+        lines = sum(p.read_bytes().count(b"\n") for p in paths)
+        peak, retained, snippets = measure(paths)
+    return {
+        "headers": args.headers,
+        "lines": lines,
+        "snippets": snippets,
+        "peak_bytes": peak,
+        "retained_bytes": retained,
+        "retained_bytes_per_snippet": retained / max(1, snippets),
+    }
+
+
+def print_results(results):
+    print(f"{results['headers']} headers, {results['lines']} lines, "
+          f"{results['snippets']} snippets")
+    print(f"\tpeak while parsing  {results['peak_bytes'] / 2**20:8.2f} MiB")
+    print(f"\theld by snippets    {results['retained_bytes'] / 2**20:8.2f} MiB "
+          f"({results['retained_bytes_per_snippet']:.0f} bytes per snippet)")
+
+
+def compare(results, baseline):
+    for key in ["peak_bytes", "retained_bytes"]:
+        change = 100 * (results[key] / baseline[key] - 1)
+        print(f"{key}: {baseline[key]:,} -> {results[key]:,} ({change:+.1f}%)")
+
+
+def parse_args(args):
+    argparser = argparse.ArgumentParser(
+        description="Memory benchmark of the snippet parser on large headers")
+    argparser.add_argument("--headers", type=int, default=4,
+                           help="Number of headers to generate")
+    argparser.add_argument("--lines", type=int, default=20000,
+                           help="Median number of lines per header")
+    argparser.add_argument("--depth", type=int, default=4,
+                           help="Maximum nesting of blocks inside functions")
+    argparser.add_argument("--density", type=float, default=40.0,
+                           help="Snippets per 1000 lines")
+    argparser.add_argument("--seed", type=int, default=0,
+                           help="Random seed, the same seed gives the same headers")
+    argparser.add_argument("--json", type=str, default=None,
+                           help="Also write the results to this JSON file")
+    argparser.add_argument("--baseline", type=str, default=None,
+                           help="Compare against the --json results of an earlier run")
+    return argparser.parse_args(args)
+
+
+if __name__ == "__main__":
+    args = parse_args(sys.argv[1:])
+    results = run(args)
+    print_results(results)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+    if args.baseline:
+        with open(args.baseline) as f:
+            compare(results, json.load(f))
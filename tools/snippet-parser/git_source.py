@@ -0,0 +1,84 @@
+# Read files straight out of the git object database, so snippets can be
+# extracted for any revision of the LLVM repo without checking it out.
+# The repo can even be a bare clone.
+
+import logging
+import subprocess
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+
+class GitError(Exception):
+    pass
+
+
+def changed_blobs(repo_dir: Path, rev: str, base: str = "main"):
+    """
+    Files changed between base and rev, as (path, blob id) pairs
+    of the files in rev. Deleted files are left out.
+    """
+    command = ["git", "diff", "--raw", "--no-abbrev", "-z", base, rev]
+    logger.info(" ".join(command))
+    res = subprocess.run(command, capture_output=True, cwd=repo_dir)
+    if res.returncode != 0:
+        raise GitError(res.stderr.decode().strip())
+    # each entry is ":<mode> <mode> <blob> <blob> <status>\0<path>\0"
+    # with a second path for renames and copies
+    fields = res.stdout.decode().split("\0")
+    files = []
+    i = 0
+    while i < len(fields) and fields[i].startswith(":"):
+        _, _, _, new_blob, status = fields[i][1:].split(" ")
+        if status[0] in "RC":
+            path = fields[i + 2]
+            i += 3
+        else:
+            path = fields[i + 1]
+            i += 2
+        if status[0] == "D":
+            continue
+        files.append((path, new_blob))
+    return files
+
+
+class CatFile:
+    """
+    A long lived `git cat-file --batch` process. Every object
+    is requested and read back over the same pipes.
+    """
+
+    def __init__(self, repo_dir: Path):
+        self.proc = subprocess.Popen(["git", "cat-file", "--batch"],
+                                     stdin=subprocess.PIPE,
+                                     stdout=subprocess.PIPE,
+                                     cwd=repo_dir)
+
+    def read(self, object_name: str):
+        """
+        Contents of object_name (a blob id or <rev>:<path>)
+        """
+        self.proc.stdin.write(object_name.encode() + b"\n")
+        self.proc.stdin.flush()
+        header = self.proc.stdout.readline().decode()
+        if not header:
+            raise GitError("git cat-file exited")
+        parts = header.split()
+        if parts[-1] == "missing" or len(parts) != 3:
+            raise GitError(f"{object_name}: {header.strip()}")
+        size = int(parts[2])
+        data = self.proc.stdout.read(size)
+        # every object is followed by a newline
+        self.proc.stdout.read(1)
+        return data
+
+    def close(self):
+        if self.proc.poll() is None:
+            self.proc.stdin.close()
+            self.proc.wait()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
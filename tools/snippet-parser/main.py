@@ -27,11 +27,30 @@ import re
 from enum import Enum, auto
 import json
 import time
+import hashlib
+import io
+import asyncio
+from array import array
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from snippet_cache import SnippetCache, git_blob_hash, write_atomic
+from git_source import CatFile, GitError, changed_blobs
+from snippet_index import (DEFAULT_INDEX_FILE, SnippetIndex, format_entry,
+                           replace_target)
+from snippet_output import FORMATS, load_snippets, make_writer
+from snippet_manifest import format_summary, read_hashes, write_manifest
+from replace_resolver import (DIFF_CACHE_FILE, DiffCache, ReplaceResolver,
+                              read_lines)
+from tree_walk import walk_tree
+from scope_index import FileIndex, ScopeIndex, ScopeRecorder
+from symbol_index import SymbolIndex
+from snippet_relocate import STATUSES, code_hash, fingerprint, relocate_file
 
 debug = False
 logger = logging.getLogger(__name__)
 load_dotenv()
 LLVM_ROOT_DIR = os.environ.get("LLVM_ROOT_DIR")
+DEFAULT_CACHE_DIR = ".snippet-cache"
+DEFAULT_SCOPES_FILE = ".snippet-scopes.json"
 
 
 class Colors:
@@ -46,6 +65,9 @@ class Colors:
     def error(msg):
         return f"{Colors.RED}{msg}{Colors.ENDC}"
 
+    def warning(msg):
+        return f"{Colors.YELLOW}{msg}{Colors.ENDC}"
+
 
 def generate_lines(filename):
     with open(filename) as f:
@@ -56,20 +78,12 @@ def generate_lines(filename):
 IGNORE_FILES = ['.png']
 
 
-def get_abs_filenames(llvm_dir: Path):
+def get_tree_filenames(llvm_dir: Path):
     """
-    Get relative file paths for the changed files 
-    in the LLVM root tree
+    Paths of every file in the LLVM root tree that the parser
+    has a comment style for, .gitignore'd files left out
     """
-
-    command = "git diff main --name-only".split(" ")
-    logger.info(" ".join(command))
-    res = subprocess.run(command, capture_output=True, cwd=llvm_dir)
-    filenames = res.stdout.decode().strip().split("\n")
-    filenames = [llvm_dir/Path(f) for f in filenames]
-    # filter with suffixes
-    filenames = [f for f in filenames if f.suffix not in IGNORE_FILES]
-    return filenames
+    return [llvm_dir / f for f in walk_tree(llvm_dir, Regexes.all_filext())]
 
 
 def get_reg_start(comment_chars: str):
@@ -77,10 +91,9 @@ def get_reg_start(comment_chars: str):
 
 
 class Regexes:
-    cpp_comments_filext = ['.cpp', '.h', '.td']
-    hash_comments_filext = ['.txt']
-    cpp_prefix = get_reg_start("//")
-    cmake_prefix = get_reg_start("#")
+    @staticmethod
+    def all_filext():
+        return list(LANGUAGES)
     start_suffix = r'@s\s+(?P<name>[^ \s]+)(?P<type>\s+[^\s=]+(=[^=\s]+)?)?\s*$'
     end_suffix = r'-\s+([^ ]+)\s*\n?$'
 
@@ -88,22 +101,39 @@ class Regexes:
     endings = ['{', '(', ',', ')']
     keywords = ['for', 'if', 'while', 'switch']
 
-    multiline_end = re.compile(r'^\s*[^)\n]+\)[^\n]*(;|(\{\}))?$')
-
-    start_regex = re.compile(cpp_prefix + start_suffix)
-    end_regex = re.compile(cpp_prefix + end_suffix)
-
-    td_start_regex = re.compile(cmake_prefix + start_suffix)
-    td_end_regex = re.compile(cmake_prefix + end_suffix)
-
-    ll_start_regex = re.compile(get_reg_start(";") + start_suffix)
-    ll_end_regex = re.compile(get_reg_start(";") + end_suffix)
+    # any marker line, with any comment style
+    any_marker = re.compile(r'^\s*(?://|#|;)(?:@s|-)')
 
     function_pattern = re.compile(
         r'((?:template\s*<.*>\s*)?(?:\w+(?:::\w+)*\s+)+\w+\s*\([^)]*\)(?:\s*const)?(?:\s*noexcept)?(?:\s*override)?(?:\s*final)?(?:\s*=\s*default)?(?:\s*=\s*delete)?)\s*{')
     multiline_function = re.compile(
         r'((?:template\s*<.*>\s*)?(?:\w+(?:::\w+)*\s+)+\w+\s*\([^),]*,)')
     extern_c = re.compile(r'^\s*extern "C" .+\(')
+    # names of the scopes, for the symbol index
+    namespace_name = re.compile(r'(?:inline\s+)?namespace\s+([\w:]+)')
+    # the name is the first identifier after the keyword, the upper
+    # case macros (LLVM_LIBRARY_VISIBILITY) and alignas(), that is
+    # not a template parameter (template <class T>)
+    record_name = re.compile(
+        r'\b(class|struct|union|enum)\s+(?:(?:class|struct)\s+)?'
+        r'(?:(?:[A-Z][A-Z0-9]*_[A-Z0-9_]*|alignas)(?:\([^)]*\))?\s+)*'
+        r'(?!final\b)([A-Za-z_]\w*(?:::[A-Za-z_]\w*)*)(?!\w|\s*[,>=])')
+
+    # characters the C++ lexer stops at in code
+    lexer_token = re.compile(r'[{}();"\'/]')
+    # characters the TableGen lexer stops at, '[' for the '[{' code
+    # fragments
+    td_lexer_token = re.compile(r'[{}<>()\];"/\[]|\bin\b')
+    td_declaration = re.compile(r'(let|def|class|multiclass)\b')
+    td_comment_token = re.compile(r'/\*|\*/')
+    ir_define = re.compile(r'define\b')
+    # an LLVM IR line up to its ';' comment
+    ir_code = re.compile(r'(?:[^;"]|"[^"]*")*')
+    # rest of a string or char literal after the opening quote
+    string_rest = re.compile(r'(?:[^"\\\n]|\\.)*"')
+    char_rest = re.compile(r"(?:[^'\\\n]|\\.)*'")
+    # prefix of a raw string literal, right before its '"'
+    raw_string_prefix = re.compile(r'(?:^|[^\w])(?:u8|[uUL])?R$')
     new_function_pattern = re.compile(
         r'''^(?:\stemplate\s<[^>]+>\s*)? # optional template clause
 (?:[\w:&<>_*\s]+\s+)? # optional return type (and qualifiers/pointers/references)
@@ -116,17 +146,13 @@ class Regexes:
 $''', re.VERBOSE)
 
 
-def get_indent(line: str):
-    return line.find(line.strip())
-
-
 class Context:
-    ONLY_INCLUDE_FILES = ['.cpp', '.h']
-
     class Type(Enum):
         NONE = 20
         AFTER = 12  # this is for top level contexts outside namespaces
         # used to show "after <decl>" contexts.
+        LET = 14  # TableGen let ... in { }
+        MULTICLASS = 13
         NAMESPACE = 11
         CLASS = 10
         ENUM = 9
@@ -136,16 +162,23 @@ class Context:
         ANONYMOUS = 7
         SWITCH = 7
         IF_ELSE = 7
+        DEF = 6  # TableGen record
+
+    # the line is kept as read from the file, the list of lines
+    # already holds it and it is only stripped when printed
+    __slots__ = ("text", "type", "lineno")
 
     def __init__(self, line, type, lineno):
-        self.line = line.strip()
+        self.text = line
         self.type: FileSnippetReader.Context.Type = type
-        self.inner: Context = None
         self.lineno = lineno
-        self.indent = get_indent(line)
+
+    @property
+    def line(self):
+        return self.text.strip()
 
     def copyWith(self, type):
-        return Context(self.line, type, self.lineno)
+        return Context(self.text, type, self.lineno)
 
     def __repr__(self):
         return f"[:{self.lineno}] {self.line}"
@@ -154,16 +187,72 @@ class Context:
     def __lt__(self, other):
         return self.type <= other.type
 
-    def to_dict(self):
-        return {
-            # "content": self.line,
+    def to_dict(self, embed_text=False):
+        d = {
             "type": self.type.name,
             "line": self.lineno
         }
+        if embed_text:
+            d["content"] = self.line
+        return d
+
+
+class ContextStack:
+    """
+    Immutable linked stack of Contexts, iterated from the bottom.
+    push() and remove() return new stacks sharing the contexts
+    below with this one, so the snippets opened in the same scope
+    all hold the same stack.
+    """
+    __slots__ = ("context", "parent", "depth")
+
+    def __init__(self, context: Context = None, parent=None):
+        # the top context, None for the empty stack
+        self.context = context
+        self.parent: ContextStack = parent
+        self.depth = 0 if parent is None else parent.depth + 1
+
+    def push(self, context: Context):
+        return ContextStack(context, self)
+
+    def remove(self, context: Context):
+        """ The stack without context, the ones above it are kept """
+        above = []
+        node = self
+        while node.depth and node.context is not context:
+            above.append(node.context)
+            node = node.parent
+        if not node.depth:
+            return self
+        node = node.parent
+        for c in reversed(above):
+            node = node.push(c)
+        return node
+
+    def __len__(self):
+        return self.depth
+
+    def __iter__(self):
+        contexts = []
+        node = self
+        while node.depth:
+            contexts.append(node.context)
+            node = node.parent
+        return reversed(contexts)
+
+    def __repr__(self):
+        return repr(list(self))
+
+
+EMPTY_CONTEXT_STACK = ContextStack()
 
 
 class Snippet:
-    def __init__(self, name, type: str, filename, start_lineno, end_lineno=None, context_stack=[]):
+    __slots__ = ("name", "type", "filename", "start_lineno", "end_lineno",
+                 "code", "before", "after", "context_stack", "fingerprint")
+
+    def __init__(self, name, type: str, filename, start_lineno, end_lineno=None,
+                 context_stack: ContextStack = EMPTY_CONTEXT_STACK):
         self.name = name
         self.type = type
         if self.type is None:
@@ -173,7 +262,10 @@ class Snippet:
         self.start_lineno = start_lineno
         self.end_lineno = end_lineno
         self.code = ""
+        self.before = []
+        self.after = []
         self.context_stack = context_stack
+        self.fingerprint = None
 
     def __repr__(self):
         s = f"Snippet {self.name} in {self.filename}:{self.start_lineno}-{self.end_lineno}"
@@ -184,21 +276,651 @@ class Snippet:
         self.end_lineno = end_lineno
         return self
 
-    def to_dict(self):
-        return {
+    def read_code(self, lines):
+        """
+        Fill in the code between the markers and the fingerprint
+        from the lines of the file
+        """
+        self.code = "".join(lines[self.start_lineno:self.end_lineno - 1])
+        self.fingerprint = fingerprint(lines, self.start_lineno, self.end_lineno,
+                                       [c.lineno for c in self.context_stack])
+
+    def embed(self, lines):
+        """
+        Fill in the code between the markers and the lines around
+        the snippet from the lines of the file
+        """
+        self.read_code(lines)
+        self.before = surrounding_lines(lines, self.start_lineno - 2, -1)
+        self.after = surrounding_lines(lines, self.end_lineno, 1)
+
+    def to_dict(self, embed_text=False):
+        d = {
             "id": self.name,
             "filename": self.filename,
             "start_lineno": self.start_lineno,
             "end_lineno": self.end_lineno,
-            "context_stack": [c.to_dict() for c in self.context_stack],
+            "context_stack": [c.to_dict(embed_text) for c in self.context_stack],
             "type": self.type
         }
+        if embed_text:
+            d["code"] = self.code
+            d["before"] = self.before
+            d["after"] = self.after
+        # tells the outputs apart where only the code changed
+        d["hash"] = code_hash(self.code)
+        if self.fingerprint is not None:
+            d["fingerprint"] = self.fingerprint
+        return d
+
+
+# Lines kept on each side of a snippet with --embed-text, the
+# largest beforeContext/afterContext used by CodeSnippet.astro
+EMBED_SURROUNDING_LINES = 5
+
+
+def surrounding_lines(lines, i, step):
+    """
+    Up to EMBED_SURROUNDING_LINES lines from the 0 indexed line i,
+    going in the direction of step and skipping marker lines, in
+    file order and without their newline. Same as the surrounding
+    context read in src/util/read-snippet.ts.
+    """
+    res = []
+    while len(res) < EMBED_SURROUNDING_LINES and 0 <= i < len(lines):
+        if not Regexes.any_marker.match(lines[i]):
+            res.append(lines[i].rstrip("\n"))
+        i += step
+    if step < 0:
+        res.reverse()
+    return res
+
+
+class LineTable:
+    """
+    Per line columns of a file, built in one pass over its lines
+    before the walk, so the context trackers read offsets instead
+    of stripping and slicing every line again. Indexed by the 1
+    based line number, a blank line has first == 0.
+    indent: offset of the first non blank character
+    end: offset after the last non blank character
+    first, last: those two characters, as code points
+    comment: offset of the first '//' (the line length if there
+    is none), a comment unless a string or a block comment
+    starts before it
+    """
+    __slots__ = ("indent", "end", "first", "last", "comment")
+
+    def __init__(self, lines, count: int = None):
+        if count is None or count > len(lines):
+            count = len(lines)
+        # line 0 does not exist
+        self.indent = indent = array("I", [0])
+        self.end = end = array("I", [0])
+        self.first = first = array("I", [0])
+        self.last = last = array("I", [0])
+        self.comment = comment = array("I", [0])
+        for i in range(count):
+            line = lines[i]
+            body = line.strip()
+            if body:
+                # the first non blank character, nothing before it is
+                start = line.find(body[0])
+                indent.append(start)
+                end.append(start + len(body))
+                first.append(ord(body[0]))
+                last.append(ord(body[-1]))
+            else:
+                indent.append(0)
+                end.append(0)
+                first.append(0)
+                last.append(0)
+            c = line.find("//")
+            comment.append(len(line) if c == -1 else c)
+
+
+# first and last characters of the lines classify_line can give a
+# context type for, see CppContextTracker.classify
+CLASSIFY_FIRST = frozenset(map(ord, "cnesu"))
+CLASSIFY_LAST = frozenset(map(ord, "{(,)"))
+
+
+class ContextTracker:
+    """
+    Base of the context trackers of the languages. Their consume()
+    is called with every line of the file, in order, and keeps
+    context_stack up to date. columns is the LineTable of the
+    file, set by the reader before the first line.
+    """
+
+    def __init__(self, filepath: Path, profile: bool = False):
+        self.filepath = filepath
+        # time the classification of declaration lines
+        self.profile = profile
+        self.classify_time = 0.0
+        self.classify_calls = 0
+        self.context_stack = EMPTY_CONTEXT_STACK
+        self.columns: LineTable = None
+        # (lineno, code, message) of the code the tracker could not follow
+        self.warnings = []
+
+    def warn(self, lineno: int, code: str, message: str):
+        logger.warning(f"Error: {message} at line {lineno}\nFile: {self.filepath}")
+        self.warnings.append((lineno, code, message))
+
+    def remove_context(self, context: Context):
+        # the top one, unless a scope was left open inside it
+        self.context_stack = self.context_stack.remove(context)
+
+
+class CppContextTracker(ContextTracker):
+    """
+    Tracks the context stack of C++ code, one line at a time.
+    The lines are lexed with a small state machine that skips
+    comments, string/char literals and preprocessor directives,
+    so every '{' is matched with its own '}'.
+
+    A line that starts a declaration is classified (classify_line),
+    and the context waits for the '{' that opens its body. The
+    context is pushed with that scope and popped when the scope
+    closes. A ';' before the '{' means it was only a declaration.
+    The lines in between are not classified again.
+    """
+
+    # lexer states carried from one line to the next
+    CODE = 0
+    BLOCK_COMMENT = 1
+    RAW_STRING = 2
+    DIRECTIVE = 3  # continuation line of a preprocessor directive
+
+    def __init__(self, filepath: Path, profile: bool = False):
+        super().__init__(filepath, profile)
+        self.state = CppContextTracker.CODE
+        self.raw_string_end = None
+        self.paren_depth = 0
+        # one (context or None, enclosing paren depth) per open '{'
+        self.scopes = []
+        # context of the declaration whose '{' is not seen yet
+        self.pending: Context = None
+        # one context or None per open #if
+        self.conditionals = []
+
+    def consume(self, line: str, lineno: int):
+        start = self.skip_state(line, 0)
+        if start is None:
+            return
+        columns = self.columns
+        if start == 0:
+            first = columns.first[lineno]
+            decl_start = columns.indent[lineno]
+            if first == 0 or decl_start == columns.comment[lineno]:
+                # blank or only a comment
+                return
+            if first == ord("#"):
+                self.consume_directive(
+                    line, line[decl_start:columns.end[lineno]], lineno)
+                return
+        else:
+            decl_start = self.skip_spaces(line, start)
+        events, code_end = self.lex(line, start)
+        # closing braces before the declaration, as in '} else {'
+        i = 0
+        while i < len(events) and events[i][0] == decl_start \
+                and events[i][1] in '};':
+            self.apply_event(events[i][1], lineno)
+            i += 1
+            decl_start = self.skip_spaces(line, decl_start + 1)
+        if self.paren_depth == 0 and start == 0 \
+                and not self.continues_pending(line, lineno, decl_start):
+            context_type = self.classify(line, lineno, decl_start, code_end)
+            if context_type:
+                self.pending = Context(line, context_type, lineno)
+        for _, c in events[i:]:
+            self.apply_event(c, lineno)
+
+    def continues_pending(self, line: str, lineno: int, decl_start: int):
+        """
+        The line is the rest of the pending declaration, as the member
+        initializer list of a constructor, and is not classified again:
+        it is indented deeper or starts with ':' or ','. A line at the
+        same indentation starts a new declaration, so a macro without
+        a ';' does not hold on to the next one.
+        """
+        if self.pending is None:
+            return False
+        return line.startswith((":", ","), decl_start) \
+            or decl_start > self.columns.indent[self.pending.lineno]
+
+    def classify(self, line: str, lineno: int, decl_start: int,
+                 code_end: int):
+        """
+        classify_line of the code between decl_start and code_end,
+        the lines it cannot give a type for are told apart by
+        their first and last characters without slicing them
+        """
+        end = self.columns.end[lineno]
+        if code_end < end:
+            # before a trailing comment
+            end = code_end
+            while end > decl_start and line[end - 1].isspace():
+                end -= 1
+        if decl_start >= end:
+            return None
+        if ord(line[decl_start]) not in CLASSIFY_FIRST \
+                and ord(line[end - 1]) not in CLASSIFY_LAST:
+            return None
+        if not self.profile:
+            return classify_line(line[decl_start:end])
+        t = time.perf_counter()
+        context_type = classify_line(line[decl_start:end])
+        self.classify_time += time.perf_counter() - t
+        self.classify_calls += 1
+        return context_type
+
+    def skip_spaces(self, line: str, i: int):
+        while i < len(line) and line[i].isspace():
+            i += 1
+        return i
+
+    def skip_state(self, line: str, i: int):
+        """
+        Skip the part of line that continues the state of the
+        previous line. Returns where the code starts, or None
+        if the whole line is still in that state.
+        """
+        if self.state == CppContextTracker.BLOCK_COMMENT:
+            end = line.find("*/", i)
+            if end == -1:
+                return None
+            self.state = CppContextTracker.CODE
+            return end + 2
+        elif self.state == CppContextTracker.RAW_STRING:
+            end = line.find(self.raw_string_end, i)
+            if end == -1:
+                return None
+            self.state = CppContextTracker.CODE
+            return end + len(self.raw_string_end)
+        elif self.state == CppContextTracker.DIRECTIVE:
+            if not line.rstrip().endswith("\\"):
+                self.state = CppContextTracker.CODE
+            return None
+        return i
+
+    def lex(self, line: str, i: int):
+        """
+        Lex the code in line from i.
+        Returns the list of (offset, char) for the '{', '}', '(', ')'
+        and ';' in the code, and the offset where a trailing line
+        comment starts (or the line length).
+        """
+        events = []
+        while True:
+            m = Regexes.lexer_token.search(line, i)
+            if m is None:
+                return events, len(line)
+            i = m.start()
+            c = line[i]
+            if c == "/":
+                if line.startswith("//", i):
+                    return events, i
+                if line.startswith("/*", i):
+                    self.state = CppContextTracker.BLOCK_COMMENT
+                    comment_start = i
+                    i = self.skip_state(line, i + 2)
+                    if i is None:
+                        return events, comment_start
+                    continue
+                i += 1
+            elif c == '"':
+                paren = line.find("(", i)
+                if paren != -1 and Regexes.raw_string_prefix.search(line, 0, i):
+                    self.raw_string_end = ")" + line[i + 1:paren] + '"'
+                    self.state = CppContextTracker.RAW_STRING
+                    i = self.skip_state(line, paren + 1)
+                    if i is None:
+                        return events, len(line)
+                    continue
+                m = Regexes.string_rest.match(line, i + 1)
+                if m is None:
+                    # unterminated, the rest of the line is the string
+                    return events, len(line)
+                i = m.end()
+            elif c == "'":
+                if self.is_digit_separator(line, i):
+                    i += 1
+                    continue
+                m = Regexes.char_rest.match(line, i + 1)
+                i = i + 1 if m is None else m.end()
+            else:
+                events.append((i, c))
+                i += 1
+
+    def is_digit_separator(self, line: str, i: int):
+        """ The ' at i is inside a number like 1'000 """
+        j = i
+        while j > 0 and (line[j - 1].isalnum() or line[j - 1] in "_'."):
+            j -= 1
+        return j < i and line[j].isdigit()
+
+    def apply_event(self, c: str, lineno: int):
+        if c == "{":
+            context = self.pending
+            self.pending = None
+            if context:
+                self.context_stack = self.context_stack.push(context)
+            self.scopes.append((context, self.paren_depth))
+            self.paren_depth = 0
+        elif c == "}":
+            self.pending = None
+            if not self.scopes:
+                self.warn(lineno, "unmatched-brace", "unmatched }")
+                return
+            context, self.paren_depth = self.scopes.pop()
+            if context:
+                self.remove_context(context)
+        elif c == "(":
+            self.paren_depth += 1
+        elif c == ")":
+            self.paren_depth = max(0, self.paren_depth - 1)
+        elif c == ";" and self.paren_depth == 0:
+            # a declaration without a body
+            self.pending = None
+
+    def consume_directive(self, line: str, stripped: str, lineno: int):
+        if stripped.endswith("\\"):
+            self.state = CppContextTracker.DIRECTIVE
+        directive = stripped[1:].lstrip()
+        if stripped.startswith("#ifdef"):
+            context = Context(line, Context.Type.ANONYMOUS, lineno)
+            self.context_stack = self.context_stack.push(context)
+            self.conditionals.append(context)
+        elif directive.startswith("if"):
+            self.conditionals.append(None)
+        elif directive.startswith("endif") and self.conditionals:
+            context = self.conditionals.pop()
+            if context:
+                self.remove_context(context)
+
+
+def classify_line(line: str):
+    """
+    Context type of the declaration that starts on line
+    (stripped, without comments), None if it does not start one.
+    """
+    if not line:
+        return None
+    elif line.startswith("class") or (line.endswith("{") and "class " in line):
+        return Context.Type.CLASS
+    elif line.startswith("namespace"):
+        return Context.Type.NAMESPACE
+    elif line.startswith("enum"):
+        return Context.Type.ENUM
+    elif line.startswith("struct") or (line.endswith("{") and "struct " in line):
+        return Context.Type.STRUCT
+    elif line.startswith("union"):
+        return Context.Type.UNION
+    # check for function
+    f_match = Regexes.new_function_pattern.match(line)
+    if f_match:
+        fname = f_match.group("name")
+        if fname not in Regexes.keywords and line[-1] in Regexes.endings:
+            return Context.Type.FUNCTION
+    elif Regexes.extern_c.match(line):
+        return Context.Type.FUNCTION
+    elif line.endswith("{"):
+        till_open_paren = line.find("(")
+        if till_open_paren > 0:
+            words = line[:till_open_paren].split()
+            if words[-1] not in Regexes.keywords:
+                return Context.Type.ANONYMOUS
+    return None
+
+
+def declared_name(context: Context):
+    """
+    (type, name) of what a C++ context declares, the name as it is
+    written (it may be qualified). The name is None for an anonymous
+    namespace, and None is returned for the other contexts.
+    """
+    line = context.text.split("//", 1)[0].strip()
+    if context.type == Context.Type.NAMESPACE:
+        m = Regexes.namespace_name.match(line)
+        return "NAMESPACE", m.group(1) if m else None
+    if context.type in (Context.Type.CLASS, Context.Type.STRUCT):
+        m = Regexes.record_name.search(line)
+        return (m.group(1).upper(), m.group(2)) if m else None
+    if context.type == Context.Type.FUNCTION:
+        m = Regexes.new_function_pattern.match(line)
+        return ("FUNCTION", m.group("name").lstrip("*&")) if m else None
+    return None
+
+
+class TableGenContextTracker(ContextTracker):
+    """
+    Tracks the let, multiclass, class and def scopes of TableGen
+    code. Comments (block comments nest in TableGen), strings and
+    [{ }] code fragments are skipped, so the braces of the C++ in
+    them do not count.
+
+    A declaration waits for its body '{' as in CppContextTracker,
+    and a ';' first means it had none (a 'let X = 1;' field is
+    one of those). The braces of values, as in 'Inst{31-26}' or
+    'Foo<{0, 1}>', come before the 'in' of a let or inside <>,
+    () or [], and are not scopes.
+    """
+
+    CODE = 0
+    BLOCK_COMMENT = 1
+    CODE_FRAGMENT = 2
+
+    DECLARATIONS = {
+        "let": Context.Type.LET,
+        "multiclass": Context.Type.MULTICLASS,
+        "class": Context.Type.CLASS,
+        "def": Context.Type.DEF,
+    }
+
+    def __init__(self, filepath: Path, profile: bool = False):
+        super().__init__(filepath, profile)
+        self.state = TableGenContextTracker.CODE
+        self.comment_depth = 0
+        # open <, ( and [ in the code
+        self.nesting = 0
+        # one context or None per open '{'
+        self.scopes = []
+        self.pending: Context = None
+        # the 'in' of the pending let was seen
+        self.let_in = False
+
+    def consume(self, line: str, lineno: int):
+        i = self.skip_state(line, 0)
+        if i is None:
+            return
+        columns = self.columns
+        if i == 0:
+            decl_start = columns.indent[lineno]
+            if columns.first[lineno] == 0 or decl_start == columns.comment[lineno]:
+                # blank or only a comment
+                return
+        else:
+            decl_start = len(line) - len(line[i:].lstrip())
+        m = Regexes.td_declaration.match(line, decl_start)
+        if m and self.nesting == 0:
+            self.pending = Context(
+                line, TableGenContextTracker.DECLARATIONS[m.group(1)], lineno)
+            self.let_in = False
+            i = m.end()
+        while True:
+            m = Regexes.td_lexer_token.search(line, i)
+            if m is None:
+                return
+            i = m.start()
+            c = m.group()
+            if c == "/":
+                if line.startswith("//", i):
+                    return
+                if line.startswith("/*", i):
+                    self.state = TableGenContextTracker.BLOCK_COMMENT
+                    self.comment_depth = 1
+                    i = self.skip_state(line, i + 2)
+                    if i is None:
+                        return
+                    continue
+            elif c == '"':
+                m = Regexes.string_rest.match(line, i + 1)
+                if m is None:
+                    return
+                i = m.end()
+                continue
+            elif c == "[" and line.startswith("[{", i):
+                self.state = TableGenContextTracker.CODE_FRAGMENT
+                i = self.skip_state(line, i + 2)
+                if i is None:
+                    return
+                continue
+            else:
+                self.apply_event(c, lineno)
+            i = m.end()
+
+    def skip_state(self, line: str, i: int):
+        """
+        Skip the comment or code fragment continued from the
+        previous line. Returns where the code starts, or None if
+        the whole line is still in it.
+        """
+        if self.state == TableGenContextTracker.BLOCK_COMMENT:
+            while self.comment_depth:
+                m = Regexes.td_comment_token.search(line, i)
+                if m is None:
+                    return None
+                self.comment_depth += 1 if m.group() == "/*" else -1
+                i = m.end()
+            self.state = TableGenContextTracker.CODE
+        elif self.state == TableGenContextTracker.CODE_FRAGMENT:
+            end = line.find("}]", i)
+            if end == -1:
+                return None
+            self.state = TableGenContextTracker.CODE
+            return end + 2
+        return i
+
+    def apply_event(self, c: str, lineno: int):
+        if c == "{":
+            context = None
+            if self.pending and self.nesting == 0 and (
+                    self.let_in or self.pending.type != Context.Type.LET):
+                context = self.pending
+                self.pending = None
+                self.context_stack = self.context_stack.push(context)
+            self.scopes.append(context)
+        elif c == "}":
+            if not self.scopes:
+                self.warn(lineno, "unmatched-brace", "unmatched }")
+                return
+            context = self.scopes.pop()
+            if context:
+                self.remove_context(context)
+        elif c in "<([":
+            self.nesting += 1
+        elif c in ">)]":
+            self.nesting = max(0, self.nesting - 1)
+        elif c == ";" and self.nesting == 0:
+            self.pending = None
+        elif c == "in" and self.nesting == 0:
+            self.let_in = True
+
+
+class IRContextTracker(ContextTracker):
+    """
+    Tracks the define bodies of LLVM IR. The body opens with the
+    '{' that ends the (possibly multi line) define header and
+    closes with the '}' line, the braces of the struct types and
+    constants in between are not scopes.
+    """
+
+    def __init__(self, filepath: Path, profile: bool = False):
+        super().__init__(filepath, profile)
+        self.pending: Context = None
+        self.function: Context = None
+
+    def consume(self, line: str, lineno: int):
+        columns = self.columns
+        first = columns.first[lineno]
+        if self.function is not None:
+            if first == ord("}") and columns.indent[lineno] == 0:
+                self.remove_context(self.function)
+                self.function = None
+            return
+        if first != ord("d") and self.pending is None:
+            return
+        code = Regexes.ir_code.match(line).group().strip()
+        if Regexes.ir_define.match(code):
+            self.pending = Context(line, Context.Type.FUNCTION, lineno)
+        if self.pending is not None and code.endswith("{"):
+            self.function = self.pending
+            self.pending = None
+            self.context_stack = self.context_stack.push(self.function)
+
+
+class Language:
+    """
+    The scanner bundle of a language, compiled once when it is
+    registered: the marker regexes for its line comments, the
+    bytes prefilter for the marker lines and the context tracker
+    (None if the scopes of the language are not tracked).
+    """
+    __slots__ = ("name", "start_regex", "end_regex", "prefilter", "tracker")
+
+    def __init__(self, name: str, comment: str, tracker=None):
+        self.name = name
+        prefix = get_reg_start(re.escape(comment))
+        self.start_regex = re.compile(prefix + Regexes.start_suffix)
+        self.end_regex = re.compile(prefix + Regexes.end_suffix)
+        # Bytes level search for lines that may be markers, run over
+        # the whole file before decoding it. This matches every line
+        # the start and end regexes match (and a few more).
+        self.prefilter = re.compile(
+            rb'^[^\S\n]*' + re.escape(comment.encode()) + rb'(?:@s|-)',
+            re.MULTILINE)
+        self.tracker = tracker
+
+    def __repr__(self):
+        return f"Language({self.name})"
+
+
+# file suffix -> Language
+LANGUAGES = {}
+
+
+def register_language(language: Language, suffixes):
+    for suffix in suffixes:
+        LANGUAGES[suffix] = language
+
+
+def language_for(filepath: Path, report_path: str):
+    language = LANGUAGES.get(filepath.suffix)
+    if language is None:
+        raise SnippetError(f"Unknown file extension {filepath.suffix}",
+                           report_path, 0, "unknown-extension")
+    return language
+
+
+register_language(Language("C++", "//", CppContextTracker), [".cpp", ".h"])
+register_language(Language("TableGen", "//", TableGenContextTracker), [".td"])
+register_language(Language("CMake", "#"), [".txt"])
+register_language(Language("LLVM IR", ";", IRContextTracker), [".ll"])
+register_language(Language("Assembly", ";"), [".s"])
 
 
 class Statistics:
     def __init__(self):
         self.snippets = 0
         self.files = 0
+        self.cached_files = 0
+        # seconds spent listing, parsing and writing out
+        self.run_phases = {"list": 0.0, "parse": 0.0, "write": 0.0}
+        # FileSnippetReader.profile_dict() of each parsed file
+        self.file_profiles = []
 
     def addSnippet(self):
         self.snippets += 1
@@ -209,15 +931,97 @@ class Statistics:
     def print(self):
         print(f"Statistics:")
         print(f"\t{self.snippets} snippets from {self.files} files.")
+        if self.cached_files:
+            print(f"\t{self.cached_files} files were unchanged (cached).")
+
+    def add_run_time(self, phase: str, start: float):
+        """ Add the time since start to phase, returns the current time """
+        now = time.perf_counter()
+        self.run_phases[phase] += now - start
+        return now
+
+    def profile_dict(self, top: int = 10):
+        phases = {}
+        counts = {}
+        for file_profile in self.file_profiles:
+            for phase, t in file_profile["phases"].items():
+                phases[phase] = phases.get(phase, 0.0) + t
+            for name, n in file_profile["counts"].items():
+                counts[name] = counts.get(name, 0) + n
+        slowest = sorted(self.file_profiles,
+                         key=lambda p: p["seconds"], reverse=True)
+        return {
+            "snippets": self.snippets,
+            "files": self.files,
+            "cached_files": self.cached_files,
+            "run_phases": self.run_phases,
+            # summed over all parsed files. "context" is part of
+            # "walk" and "classify" is part of "context"
+            "phases": phases,
+            "counts": counts,
+            "slowest": [{"filename": p["filename"], "seconds": p["seconds"]}
+                        for p in slowest[:top]],
+            "per_file": self.file_profiles,
+        }
+
+    def write_profile(self, filename: str, top: int = 10):
+        with open(filename, "w") as f:
+            json.dump(self.profile_dict(top), f, indent=2)
 
 
 STATS = Statistics()
 
 
+class SnippetError(Exception):
+    """
+    A marker error in a file. The command line reports it and
+    exits, the server (server.py) returns it as a diagnostic and
+    --check collects every one of them.
+    code: short name of the kind of error
+    """
+
+    def __init__(self, message: str, filename: str, lineno: int, code: str):
+        # all the arguments are in args, so it can be pickled back
+        # from the worker processes
+        super().__init__(message, filename, lineno, code)
+        self.message = message
+        self.filename = filename
+        self.lineno = lineno
+        self.code = code
+
+    def __str__(self):
+        return f"{self.filename}:{self.lineno}: {self.message}"
+
+    def to_dict(self):
+        return {
+            "file": self.filename,
+            "line": self.lineno,
+            "code": self.code,
+            "message": self.message,
+        }
+
+
+def diagnostic(filename: str, lineno: int, code: str, message: str,
+               severity: str = "error"):
+    """ A diagnostic of --check, a SnippetError.to_dict() with its severity """
+    return {"file": filename, "line": lineno, "code": code, "message": message,
+            "severity": severity}
+
+
 class FileSnippetReader:
-    def __init__(self, filepath: Path, relative_filepath_str: str = None):
+    def __init__(self, filepath: Path, relative_filepath_str: str = None,
+                 data: bytes = None, embed_text: bool = False,
+                 profile: bool = False, scopes: bool = False,
+                 check: bool = False):
         """
         relative_filepath_str: Path to print in the JSON
+        data: contents of the file, read from filepath if None
+        embed_text: add the snippet text to the JSON
+        profile: also time the context tracking of each line
+        scopes: record the scopes of the whole file in scope_recorder,
+        for the scope index
+        check: record the marker errors and the tracker warnings in
+        diagnostics and go on, instead of raising the first error
         """
         self.filepath = filepath
         self.relative_filepath_str = relative_filepath_str
@@ -226,13 +1030,36 @@ class FileSnippetReader:
         # This points to the next line.
         # Current line is at self.i - 1, use self.peek_line() instead though.
         self.i = 0
-        self.context_stack: List[Context] = []
         self.last_context: Context = None
         self.char_i = 0
-        self.snippets = self.extract_file_snippets(filepath)
+        self.embed_text = embed_text
+        # seconds spent in each phase of extract_file_snippets
+        self.times = {"read": 0.0, "scan": 0.0, "decode": 0.0, "walk": 0.0}
+        self.counts = {"lines": 0, "lines_scanned": 0,
+                       "marker_candidates": 0, "marker_matches": 0}
+        self.profile = profile
+        if profile:
+            self.times["context"] = 0.0
+            self.times["classify"] = 0.0
+        self.scope_recorder = ScopeRecorder() if scopes else None
+        self.diagnostics = [] if check else None
+        self.language = language_for(filepath, self.relative_filepath_str)
+        self.tracker: ContextTracker = None
+        if self.language.tracker is not None:
+            self.tracker = self.language.tracker(filepath, profile)
+        self.snippets = self.extract_file_snippets(filepath, data)
+        if check and self.tracker is not None:
+            for lineno, code, message in self.tracker.warnings:
+                self.diagnostics.append(diagnostic(
+                    self.relative_filepath_str, lineno, code, message, "warning"))
 
     def to_dict(self):
-        return [s.to_dict() for s in self.snippets]
+        for s in self.snippets:
+            if self.embed_text:
+                s.embed(self.lines)
+            else:
+                s.read_code(self.lines)
+        return [s.to_dict(self.embed_text) for s in self.snippets]
 
     def peek_line(self):
         return self.lines[self.i-1]
@@ -258,78 +1085,161 @@ class FileSnippetReader:
             return Context("", Context.Type.NONE, 0)
         return self.last_context.copyWith(Context.Type.AFTER)
 
-    def get_regex(self, start: bool):
-        if self.filepath.suffix in Regexes.cpp_comments_filext:
-            return Regexes.start_regex if start else Regexes.end_regex
-        elif self.filepath.suffix in Regexes.hash_comments_filext:
-            return Regexes.td_start_regex if start else Regexes.td_end_regex
-        elif self.filepath.suffix in ['.ll', '.s']:
-            return Regexes.ll_start_regex if start else Regexes.ll_end_regex
-        else:
-            # throw error
-            logger.fatal(Colors.error(
-                f"Error: Unknown file extension {self.filepath.suffix}"))
-            sys.exit(1)
-
-    def extract_file_snippets(self, filepath: Path):
+    def scan_markers(self, data: bytes):
+        """
+        Find the marker lines of the whole file in one pass
+        over the buffer. Returns {lineno: (start_match, end_match)}
+        for the lines that match the start or end regexes.
+        """
+        start_regex = self.language.start_regex
+        end_regex = self.language.end_regex
+        markers = {}
+        lineno = 1
+        pos = 0
+        for candidate in self.language.prefilter.finditer(data):
+            self.counts["marker_candidates"] += 1
+            lineno += data.count(b'\n', pos, candidate.start())
+            pos = candidate.start()
+            line_end = data.find(b'\n', pos)
+            if line_end == -1:
+                line_end = len(data)
+            else:
+                line_end += 1
+            line = data[pos:line_end].decode()
+            start_match = start_regex.match(line)
+            end_match = end_regex.match(line)
+            if start_match or end_match:
+                markers[lineno] = (start_match, end_match)
+        self.counts["marker_matches"] = len(markers)
+        return markers
+
+    def extract_file_snippets(self, filepath: Path, data: bytes = None):
         """
         filepath: full path to the file
+        data: contents of the file, read from filepath if None
         """
         snippets: List[Snippet] = []
         stack: List[Snippet] = []
         current_context: str = None
-        with open(filepath, 'r') as f:
-            self.lines = f.readlines()
-            # begin loop
-            self.i = 0
-            while not self.is_at_end():
-                line = self.consume_line()
-                lineno = self.clineno()
-                self.consume_context()
-                self.print_context()
-                # continue
-                # end header
-                start_match = self.get_regex(start=True).match(line)
-                end_match = self.get_regex(start=False).match(line)
-                if start_match:
-                    the_context = self.context_stack.copy()
-                    if the_context.__len__() == 0:
-                        the_context.append(self.get_last_after_context())
-                    stack.append(Snippet(name=start_match.group("name"),
-                                         type=start_match.group("type"),
-                                         filename=self.relative_filepath_str,
-                                         start_lineno=lineno,
-                                         end_lineno=None,
-                                         context_stack=the_context))
-                elif end_match:
-                    if not stack:
-                        logger.error(
-                            f"{Colors.RED}Error: line {lineno}: Found end snippet without start")
-                        logger.error(f"Snippet name: {end_match.group(1)}")
-                        logger.error(
-                            f"Snippet file: {self.filepath}{Colors.ENDC}")
-                        sys.exit(1)
-                    end_line = lineno
-                    top_snip = stack[-1]
-                    if end_match.group(1).strip() != top_snip.name:
-                        logger.error(
-                            f"{Colors.RED}Error: line {lineno}: Found end snippet without start")
-                        logger.error(f"Snippet name: '{end_match.group(1)}'")
-                        logger.error(
-                            f"Previous snippet name: '{top_snip.name}'")
-                        logger.error(
-                            f"Snippet file: {self.filepath}{Colors.ENDC}")
-                        sys.exit(1)
-                    snippets.append(stack.pop().withEndLine(end_line))
-
-                # self.print_context()
-            if stack:
-                logger.error(
-                    f"{Colors.RED}Error: line {self.clineno()}: Found start snippet without end")
-                logger.error(f"Snippet name: '{stack[-1].name}'")
-                logger.error(f"Snippet file: {self.filepath}{Colors.ENDC}")
-                sys.exit(1)
+        t = time.perf_counter()
+        if data is None:
+            with open(filepath, 'rb') as f:
+                data = f.read()
+        t = self.add_time("read", t)
+        if b'\r' in data:
+            # line numbers are counted on '\n' below
+            data = data.replace(b'\r\n', b'\n').replace(b'\r', b'\n')
+        markers = self.scan_markers(data)
+        last_lineno = max(markers, default=0)
+        t = self.add_time("scan", t)
+        if debug or self.scope_recorder is not None:
+            # the context dump and the scopes need every line
+            last_lineno = None
+        elif last_lineno == 0:
+            # no markers, nothing else to do for this file
+            self.lines = []
             return snippets
+        # same as reading the file in text mode
+        self.lines = io.StringIO(data.decode(), newline=None).readlines()
+        t = self.add_time("decode", t)
+        # begin loop
+        self.i = 0
+        track_context = self.tracker is not None
+        if track_context:
+            self.tracker.columns = LineTable(self.lines, last_lineno)
+        scopes = self.scope_recorder if track_context else None
+        scope_stack = EMPTY_CONTEXT_STACK
+        # nothing after the last marker can change the snippets
+        while not self.is_at_end() and (last_lineno is None
+                                        or self.i < last_lineno):
+            self.consume_line()
+            lineno = self.clineno()
+            if track_context and self.profile:
+                t_line = time.perf_counter()
+                self.consume_context()
+                self.times["context"] += time.perf_counter() - t_line
+            elif track_context:
+                self.consume_context()
+            if scopes is not None and self.tracker.context_stack is not scope_stack:
+                scope_stack = self.tracker.context_stack
+                scopes.add(lineno, scope_stack)
+            self.print_context()
+            # continue
+            # end header
+            marker = markers.get(lineno)
+            if marker is None:
+                continue
+            start_match, end_match = marker
+            if start_match:
+                # shared with the tracker, it is never modified
+                the_context = self.context_stack
+                if the_context.__len__() == 0:
+                    the_context = the_context.push(
+                        self.get_last_after_context())
+                stack.append(Snippet(name=start_match.group("name"),
+                                     type=start_match.group("type"),
+                                     filename=self.relative_filepath_str,
+                                     start_lineno=lineno,
+                                     end_lineno=None,
+                                     context_stack=the_context))
+            elif end_match:
+                name = end_match.group(1).strip()
+                if not stack:
+                    self.error(f"Found end snippet without start: '{name}'",
+                               lineno, "end-without-start")
+                    continue
+                end_line = lineno
+                top_snip = stack[-1]
+                if name != top_snip.name:
+                    self.error(f"Found end snippet without start: '{name}' "
+                               f"(the open snippet is '{top_snip.name}')",
+                               lineno, "mismatched-end")
+                    # check mode: close the snippets left open inside
+                    # it, an end that matches nothing is skipped
+                    if name not in [s.name for s in stack]:
+                        continue
+                    while stack[-1].name != name:
+                        stack.pop()
+                snippets.append(stack.pop().withEndLine(end_line))
+
+            # self.print_context()
+        self.add_time("walk", t)
+        self.counts["lines"] = len(self.lines)
+        self.counts["lines_scanned"] = self.i
+        for snippet in reversed(stack):
+            self.error(f"Found start snippet without end: '{snippet.name}'",
+                       snippet.start_lineno, "start-without-end")
+        return snippets
+
+    def error(self, message: str, lineno: int, code: str):
+        """ Raise the marker error, in check mode record it instead """
+        if self.diagnostics is None:
+            raise SnippetError(message, self.relative_filepath_str, lineno, code)
+        self.diagnostics.append(diagnostic(self.relative_filepath_str, lineno,
+                                           code, message))
+
+    def profile_dict(self):
+        if self.profile and self.tracker is not None:
+            self.times["classify"] = self.tracker.classify_time
+            self.counts["classified_lines"] = self.tracker.classify_calls
+        return {
+            "filename": self.relative_filepath_str,
+            "seconds": sum(self.times[p] for p in ["read", "scan", "decode", "walk"]),
+            "phases": self.times,
+            "counts": self.counts,
+        }
+
+    def add_time(self, phase: str, start: float):
+        """ Add the time since start to phase, returns the current time """
+        now = time.perf_counter()
+        self.times[phase] += now - start
+        return now
+
+    @property
+    def context_stack(self):
+        if self.tracker is None:
+            return EMPTY_CONTEXT_STACK
+        return self.tracker.context_stack
 
     def print_context(self):
         if not debug:
@@ -340,180 +1250,762 @@ class FileSnippetReader:
             print(indent + c.__repr__())
         print("===end context===")
 
-    def is_ending_brace(self, line):
-        line = line.strip()
-        comments = line.split("//")
-        if len(comments) > 2:
-            return False
-        line = comments[0]
-        return line.strip().startswith("}")
+    def consume_context(self):
+        self.tracker.consume(self.peek_line(), self.clineno())
+        context_stack = self.tracker.context_stack
+        if context_stack.depth:
+            self.last_context = context_stack.context
 
-    def ends_with_open_brace(self, line):
-        line = line.strip()
-        comments = line.split("//")
-        if len(comments) > 2:
-            return False
-        line = comments[0]
-        return line.strip().endswith("{")
 
-    def consume_context(self):
-        if self.filepath.suffix not in Context.ONLY_INCLUDE_FILES:
-            return
+class FileJob:
+    """
+    A file to parse.
+    relative_filepath_str: Path to print in the JSON
+    blob: git object id of the file contents, if known
+    data: contents of the file, read from filepath if None
+    embed_text: add the snippet text to the JSON
+    profile: also time the context tracking of each line
+    read_time: seconds spent reading data before the parse
+    """
 
-        # attempt to read the context
-        # context can be a function or enum or class
-        # line = self.lines[self.i]
-        class_regex = re.compile(r'^\s*(template<.+>)?\s?class')
-        class_forward = re.compile(
-            r'^\s*(template<.+>\s?)?class\s+[\w_\d]+\s*;')
-        struct_regex = re.compile(r'^\s*(template<.+>)?\s+struct')
-        if not self.is_at_end():
-            line = self.peek_line().strip()
-            # check for class
-            context_type = None
-            if line.startswith("//"):
-                return
-            elif line.startswith("#ifdef"):
-                context_type = Context.Type.ANONYMOUS
-            elif line.startswith("class") or (line.endswith("{") and "class " in line):
-                # ignore forward declarations
-                if class_forward.match(line):
-                    return
-                context_type = Context.Type.CLASS
-            elif line.startswith("namespace"):
-                context_type = Context.Type.NAMESPACE
-            elif line.startswith("enum"):
-                context_type = Context.Type.ENUM
-            elif line.startswith("struct") or (line.endswith("{") and "struct " in line):
-                context_type = Context.Type.STRUCT
-            elif line.startswith("union"):
-                context_type = Context.Type.UNION
-            else:
-                # check for function
-                f_match = Regexes.new_function_pattern.match(line)
-                if f_match:
-                    # get the ?P capture group
-                    fname = f_match.group("name")
-                    if fname not in Regexes.keywords and line[-1] in Regexes.endings:
-                        # print("\t== found function at line", self.clineno(), self.filepath)
-                        # print("\t== ?P name: ", f_match.group("name"))
-                        context_type = Context.Type.FUNCTION
-                elif Regexes.extern_c.match(line):
-                    # or Regexes.multiline_function.match(line):
-                    context_type = Context.Type.FUNCTION
-                    # print("\t== found function at line", self.clineno(), self.filepath)
-                elif self.ends_with_open_brace(line):
-                    till_open_paren = line.find("(")
-                    if till_open_paren > 0:
-                        # print("Found open paren substr: ", line[:till_open_paren].strip() == "for")
-                        func_name = line[:till_open_paren].strip()
-                        if func_name not in Regexes.keywords:
-                            context_type = Context.Type.ANONYMOUS
-            if context_type:
-                # print("found a context: ", line)
-                self.context_stack.append(
-                    Context(self.peek_line(), context_type, self.clineno()))
+    def __init__(self, filepath: Path, relative_filepath_str: str = None,
+                 blob: str = None, data: bytes = None,
+                 embed_text: bool = False, profile: bool = False):
+        self.filepath = filepath
+        self.relative_filepath_str = relative_filepath_str
+        self.blob = blob
+        self.data = data
+        self.embed_text = embed_text
+        self.profile = profile
+        self.read_time = 0.0
+
+    def cache_variant(self):
+        """ Outputs with different options are cached separately """
+        return "embed" if self.embed_text else ""
+
+    def report_path(self):
+        """ The filename the snippets are reported with """
+        if self.relative_filepath_str is None:
+            return self.filepath.absolute().as_posix()
+        return self.relative_filepath_str
+
+
+def parse_file(job: FileJob):
+    """
+    Parse a single file. This is the unit of work handed to
+    the worker processes, so it must stay a top level function.
+    Returns the snippet dicts and the profile of the file.
+    """
+    reader = FileSnippetReader(job.filepath, job.relative_filepath_str,
+                               job.data, job.embed_text, job.profile)
+    return reader.to_dict(), reader.profile_dict()
+
+
+def add_read_time(job: FileJob, file_profile):
+    """ Count the read of job.data before the parse in its profile """
+    file_profile["phases"]["read"] += job.read_time
+    file_profile["seconds"] += job.read_time
+
+
+# the modules besides main.py whose code goes into the cached data:
+# the fingerprints of the snippets, the recorded scopes and symbols
+SALT_MODULES = {
+    "snippets": ["snippet_relocate.py"],
+    "scopes": ["scope_index.py"],
+    "symbols": ["scope_index.py", "symbol_index.py"],
+}
+
+
+def parser_salt(kind: str = "snippets"):
+    """
+    Salt of the cached data of kind, changes whenever the parser
+    source or one of the SALT_MODULES of kind changes
+    """
+    sha = hashlib.sha1(Path(__file__).read_bytes())
+    for module in SALT_MODULES[kind]:
+        sha.update(Path(__file__).with_name(module).read_bytes())
+    return sha.hexdigest()
+
+
+class ParseOptions:
+    """
+    How the files are parsed.
+    jobs: number of worker processes, 0 for one per CPU.
+    cache: files whose contents are in the cache are not parsed again.
+    embed_text: add the snippet text to the JSON
+    profile: time the context tracking of each line
+    on_file: called with the snippet dicts of each file as soon
+    as it is parsed, in order
+    """
+
+    def __init__(self, jobs: int = 1, cache: SnippetCache = None,
+                 embed_text: bool = False, profile: bool = False,
+                 on_file=None):
+        self.jobs = jobs
+        self.cache = cache
+        self.embed_text = embed_text
+        self.profile = profile
+        self.on_file = on_file
 
-                if self.has_same_line_body(line):
-                    # print("empty body")
-                    self.context_stack.pop()
+
+def lookup_file_job(job: FileJob, cache: SnippetCache):
+    """ The cached snippets of job, None if they are not cached """
+    if cache is None:
+        return None
+    if job.blob is None:
+        job.blob = cache.blob_for_file(job.filepath)
+    return cache.get(job.blob, job.report_path(), job.cache_variant())
+
+
+def read_file_job(job: FileJob, cat_file: CatFile = None):
+    """
+    Read the contents of job into job.data, from git by its blob id
+    with cat_file
+    """
+    t = time.perf_counter()
+    if cat_file is not None:
+        job.data = cat_file.read(job.blob)
+    else:
+        with open(job.filepath, "rb") as f:
+            job.data = f.read()
+    job.read_time = time.perf_counter() - t
+
+
+def iter_file_snippets(file_jobs, options: ParseOptions,
+                       cat_file: CatFile = None):
+    """
+    Parse all FileJobs in file_jobs and yield the list of snippet
+    dicts of each file, in the same order as file_jobs, as soon as
+    that file is done.
+    cat_file: read the files from git by their blob ids instead of
+    from the disk.
+    """
+    jobs = options.jobs
+    cache = options.cache
+    if jobs == 0:
+        jobs = os.cpu_count() or 1
+    # the context dump is printed per line, keep it in order
+    if debug:
+        jobs = 1
+        cache = None
+    for job in file_jobs:
+        job.embed_text = options.embed_text
+        job.profile = options.profile
+    t = time.perf_counter()
+    cached = [lookup_file_job(job, cache) for job in file_jobs]
+    pending_jobs = [job for job, c in zip(file_jobs, cached) if c is None]
+    if cat_file is not None:
+        # without it the workers read the files from the disk
+        for job in pending_jobs:
+            read_file_job(job, cat_file)
+    pool = None
+    if jobs > 1 and len(pending_jobs) > 1:
+        chunksize = max(1, len(pending_jobs) // (jobs * 4))
+        pool = ProcessPoolExecutor(max_workers=jobs)
+        # map() yields results in submission order, so the
+        # output is the same as the serial run
+        parsed = pool.map(parse_file, pending_jobs, chunksize=chunksize)
+    else:
+        parsed = map(parse_file, pending_jobs)
+    try:
+        for job, file_snippets in zip(file_jobs, cached):
+            if file_snippets is None:
+                file_snippets, file_profile = next(parsed)
+                add_read_time(job, file_profile)
+                STATS.file_profiles.append(file_profile)
+                job.data = None
+                if cache is not None:
+                    cache.put(job.blob, job.report_path(), file_snippets,
+                              job.cache_variant())
+            STATS.add_run_time("parse", t)
+            yield file_snippets
+            t = time.perf_counter()
+    finally:
+        if pool is not None:
+            pool.shutdown(cancel_futures=True)
+    if cache is not None:
+        cache.save()
+        STATS.cached_files += len(file_jobs) - len(pending_jobs)
+    STATS.add_run_time("parse", t)
+
+
+def parse_file_jobs(file_jobs, options: ParseOptions,
+                    cat_file: CatFile = None):
+    """
+    Same as iter_file_snippets, as a list
+    """
+    return list(iter_file_snippets(file_jobs, options, cat_file))
+
+
+def extract_snippets(file_jobs, options: ParseOptions,
+                     cat_file: CatFile = None):
+    """
+    Parse the files in file_jobs. The snippets of each file are
+    passed to options.on_file as soon as they are available, or
+    returned all in one list if there is no on_file.
+    """
+    all_snippets = []
+    for file_snippets in iter_file_snippets(file_jobs, options, cat_file):
+        STATS.snippets += len(file_snippets)
+        if options.on_file is not None:
+            options.on_file(file_snippets)
+        else:
+            all_snippets.extend(file_snippets)
+    return all_snippets
+
+
+def scope_reader(job: FileJob):
+    """
+    The reader of job recording its scopes, None if a marker error
+    stops it: the file is left out of the index and the extraction
+    reports the error.
+    """
+    try:
+        return FileSnippetReader(job.filepath, job.relative_filepath_str,
+                                 job.data, scopes=True)
+    except SnippetError:
+        return None
+
+
+def scan_scopes(job: FileJob):
+    """
+    The scope index entry of a file. Handed to the worker
+    processes like parse_file.
+    """
+    reader = scope_reader(job)
+    if reader is None:
+        return None
+    return reader.scope_recorder.to_dict(len(reader.lines))
+
+
+def scan_symbols(job: FileJob):
+    """
+    The symbol index entry of a C++ file, from the scopes its
+    tracker opened. Handed to the worker processes like parse_file.
+    """
+    reader = scope_reader(job)
+    if reader is None:
+        return None
+    recorder = reader.scope_recorder
+    contexts = {span: context for context, span in recorder.span_of.items()}
+    symbols = []
+    seen = set()
+    # per node, the qualified name of the scope it is in, None
+    # inside a function (nodes only point to earlier nodes)
+    inside = []
+    for span, parent in recorder.nodes:
+        enclosing = inside[parent] if parent != -1 else ""
+        declared = declared_name(contexts[span])
+        if enclosing is None or declared is None:
+            local = enclosing is None or contexts[span].type in \
+                (Context.Type.FUNCTION, Context.Type.ANONYMOUS)
+            inside.append(None if local else enclosing)
+            continue
+        type, name = declared
+        if type != "NAMESPACE" and span not in seen:
+            seen.add(span)
+            symbols.append([enclosing, name, type, contexts[span].lineno])
+        if type == "FUNCTION":
+            inside.append(None)
+        elif name is None:
+            # anonymous namespace
+            inside.append(enclosing)
+        else:
+            inside.append(f"{enclosing}::{name}" if enclosing else name)
+    return {"symbols": symbols}
+
+
+def update_file_index(file_index: FileIndex, file_jobs, options: ParseOptions,
+                      scan):
+    """
+    Set the entries of the files of file_jobs whose contents
+    changed since they were indexed to scan(job), or drop them when
+    scan(job) is None. Returns the number of files scanned.
+    """
+    pending_jobs = []
+    blobs = {}
+    for job in file_jobs:
+        try:
+            if options.cache is not None:
+                blob = options.cache.blob_for_file(job.filepath)
             else:
-                # check for end of context
-                if self.is_ending_brace(line):
-                    if self.context_stack.__len__() > 0:
-                        current_indent = get_indent(self.peek_line())
-                        while len(self.context_stack) > 0:
-                            top = self.context_stack[-1]
-                            if top.indent == current_indent:
-                                self.context_stack.pop()
-                                break
-                            elif top.indent > current_indent:
-                                self.context_stack.pop()
-                                # print(
-                                #     f"\t===popped for line:{self.clineno()}, {top.line}")
-                            else:
-                                logger.warning(
-                                    f"Error: unmatched }} at line {self.clineno()}")
-                                logger.warning(f"in file: {self.filepath}")
-                                logger.warning(
-                                    f"This may be due to a nested block. Currently this script does not handle them.")
-                                break
-                        # top = self.context_stack[-1]
-                        # if top.indent == self.peek_line().find(self.peek_line().strip()):
-                        #     self.context_stack.pop()
-                        #     print(
-                        #         f"\t===popped for line:{self.clineno()}, {top.line}")
-                    else:
-                        logger.warning(f"Error: unmatched }} at line {self.clineno()}\nFile: {self.filepath}")
-                        # sys.exit(1)
-        if len(self.context_stack) > 0:
-            self.last_context = self.context_stack[-1]
+                with open(job.filepath, "rb") as f:
+                    job.data = f.read()
+                blob = git_blob_hash(job.data)
+        except OSError:
+            # deleted since it was listed
+            continue
+        if file_index.blob(job.report_path()) != blob:
+            blobs[job.report_path()] = blob
+            pending_jobs.append(job)
+        else:
+            job.data = None
+    jobs = options.jobs or os.cpu_count() or 1
+    if jobs > 1 and len(pending_jobs) > 1:
+        with ProcessPoolExecutor(max_workers=jobs) as pool:
+            entries = list(pool.map(scan, pending_jobs,
+                                    chunksize=max(1, len(pending_jobs) // (jobs * 4))))
+    else:
+        entries = [scan(job) for job in pending_jobs]
+    for job, entry in zip(pending_jobs, entries):
+        job.data = None
+        if entry is None:
+            file_index.remove_file(job.report_path())
+        else:
+            file_index.set_file(job.report_path(), blobs[job.report_path()], entry)
+    return len(pending_jobs)
+
+
+def check_file(job: FileJob):
+    """
+    The diagnostics of a file and its snippet dicts, for the
+    checks across files. Handed to the worker processes like
+    parse_file.
+    """
+    try:
+        reader = FileSnippetReader(job.filepath, job.relative_filepath_str,
+                                   job.data, check=True)
+    except SnippetError as e:
+        return [diagnostic(e.filename, e.lineno, e.code, e.message)], []
+    except (OSError, UnicodeDecodeError) as e:
+        return [diagnostic(job.report_path(), 0, "unreadable-file", str(e))], []
+    return reader.diagnostics, [s.to_dict() for s in reader.snippets]
+
+
+def check_files(file_jobs, jobs: int = None):
+    """
+    Every diagnostic of the files of file_jobs: their marker errors,
+    the braces the trackers could not match, the duplicate ids and
+    the replace= targets that are missing or form a cycle. Sorted by
+    file and line. jobs: worker processes, all CPUs if 0 or None
+    """
+    jobs = jobs or os.cpu_count() or 1
+    if jobs > 1 and len(file_jobs) > 1:
+        with ProcessPoolExecutor(max_workers=jobs) as pool:
+            results = list(pool.map(check_file, file_jobs,
+                                    chunksize=max(1, len(file_jobs) // (jobs * 4))))
+    else:
+        results = [check_file(job) for job in file_jobs]
+    diagnostics = []
+    # the index only keeps the ids, it is never saved
+    index = SnippetIndex(Path(DEFAULT_INDEX_FILE))
+    resolver = ReplaceResolver()
+    for file_diagnostics, snippets in results:
+        diagnostics += file_diagnostics
+        index.add_snippets(snippets)
+        resolver.add_file(snippets)
+    for d in index.diagnostics():
+        diagnostics.append(diagnostic(d["file"], d["line"], d["code"],
+                                      d["message"], "warning"))
+    for snippet in resolver.pending:
+        problem = resolver.check_chain(snippet)
+        # the missing targets are already reported by the index
+        if problem is not None and problem[0] == "replace-cycle":
+            diagnostics.append(diagnostic(snippet["filename"], snippet["start_lineno"],
+                                          problem[0], problem[1], "warning"))
+    diagnostics.sort(key=lambda d: (d["file"], d["line"]))
+    return diagnostics
+
+
+def format_diagnostic(d):
+    """ Compiler style, file:line: severity: message [code] """
+    return f"{d['file']}:{d['line']}: {d['severity']}: {d['message']} [{d['code']}]"
+
+
+# files read at the same time by the pipeline
+PIPELINE_READ_THREADS = 8
+# files read and parsed together, handing the files one by
+# one to the threads and processes costs more than it saves
+PIPELINE_BATCH_FILES = 16
+# batches listed but not written out yet, per parse job
+PIPELINE_BATCHES_PER_JOB = 4
+
+
+def dir_file_job(llvm_dir: Path, relative_filepath_str: str):
+    """ The FileJob of a file of the LLVM tree, None if it is ignored """
+    filepath = llvm_dir / relative_filepath_str
+    if filepath.suffix in IGNORE_FILES:
+        return None
+    return FileJob(filepath, relative_filepath_str)
+
+
+async def list_dir_file_jobs(llvm_dir: Path, full_tree: bool = False):
+    """
+    Async version of get_dir_file_jobs. The files changed from
+    main are yielded while git is still finding the others.
+    """
+    if full_tree:
+        loop = asyncio.get_running_loop()
+        filepaths = await loop.run_in_executor(None, get_tree_filenames, llvm_dir)
+        for file in filepaths:
+            yield FileJob(file, file.relative_to(llvm_dir).as_posix())
         return
+    command = ["git", "diff", "main", "--name-only", "-z"]
+    logger.info(" ".join(command))
+    proc = await asyncio.create_subprocess_exec(
+        *command, cwd=llvm_dir, stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE)
+    rest = b""
+    while True:
+        chunk = await proc.stdout.read(1 << 16)
+        if not chunk:
+            break
+        names = (rest + chunk).split(b"\0")
+        rest = names.pop()
+        for name in names:
+            job = dir_file_job(llvm_dir, name.decode())
+            if job is not None:
+                yield job
+    err = await proc.stderr.read()
+    if await proc.wait() != 0:
+        raise GitError(err.decode().strip())
+
+
+async def list_file_jobs(file_jobs):
+    for job in file_jobs:
+        yield job
+
+
+async def collect_file_jobs(file_jobs):
+    return [job async for job in file_jobs]
+
+
+def load_file_job(job: FileJob, cache: SnippetCache):
+    """
+    The cached snippets of job, or None after reading its
+    contents into job.data
+    """
+    cached = lookup_file_job(job, cache)
+    if cached is None:
+        read_file_job(job)
+    return cached
+
+
+def load_file_jobs(file_jobs, cache: SnippetCache):
+    return [load_file_job(job, cache) for job in file_jobs]
+
+
+def parse_files(file_jobs):
+    return [parse_file(job) for job in file_jobs]
 
-    def lookahead_multiline_decl(self):
-        """Current line is a multiline function declaration
-        and ends with a ','. This function will consume
-        next lines till ';' or '{' is found.
-        Returns if the function is a multiline function.
-        """
-        # to restore if we fail
-        orig_i = self.i
-        line_endings = [',', '(', '"']
-        while not self.is_at_end():
-            next_line = self.consume_line().strip()
-            is_still_multiline = False
-            for e in line_endings:
-                if next_line.endswith(e):
-                    is_still_multiline = True
-                    break
-            if is_still_multiline:
-                continue
-            elif Regexes.multiline_end.match(next_line):
-                return True
-            elif next_line.endswith('{'):
-                return False
-            else:
-                logger.warning(Colors.error(
-                    f"Error: multiline decl ends abruptly at line {self.clineno()}"))
-                logger.warning(f"File: {self.filepath}")
-                # sys.exit(1)
-        return False
-
-    def has_same_line_body(self, line: str):
-        """ Must have {.*} on the same line
-            or ends with a ';' (for multiline function decls)
-        """
-        if line.endswith(','):
-            # print("found multiline function")
-            return self.lookahead_multiline_decl()
-        i = 0
-        stack_length = 0
-        body_length = 0
-        brace_count = 0
-        for i in range(0, len(line)):
-            if line[i] == '{':
-                stack_length += 1
-                brace_count += 1
-            elif line[i] == '}':
-                stack_length -= 1
-            else:
-                if stack_length > 0:
-                    body_length += 1
-        return stack_length == 0 and brace_count > 0
 
+def put_file_jobs(file_jobs, parsed, cache: SnippetCache):
+    for job, (file_snippets, _) in zip(file_jobs, parsed):
+        cache.put(job.blob, job.report_path(), file_snippets,
+                  job.cache_variant())
 
-def extract_all_snippets_from_dir(llvm_dir: Path):
-    filepaths = get_abs_filenames(llvm_dir)
+
+async def process_file_jobs(file_jobs, cache: SnippetCache,
+                            read_pool, parse_pool):
+    """
+    Read and parse a batch of jobs. Returns the snippet dicts and
+    the profile of each file, the profile is None for cache hits.
+    """
+    loop = asyncio.get_running_loop()
+    cached = await loop.run_in_executor(read_pool, load_file_jobs,
+                                        file_jobs, cache)
+    pending_jobs = [job for job, c in zip(file_jobs, cached) if c is None]
+    parsed = []
+    if pending_jobs:
+        parsed = await loop.run_in_executor(parse_pool, parse_files,
+                                            pending_jobs)
+        for job, (_, file_profile) in zip(pending_jobs, parsed):
+            job.data = None
+            # read on a thread of the pipeline, not by the parser
+            add_read_time(job, file_profile)
+        if cache is not None:
+            await loop.run_in_executor(read_pool, put_file_jobs,
+                                       pending_jobs, parsed, cache)
+    parsed = iter(parsed)
+    return [(c, None) if c is not None else next(parsed) for c in cached]
+
+
+def write_files(on_file, batch_snippets):
+    for file_snippets in batch_snippets:
+        on_file(file_snippets)
+
+
+async def extract_pipeline(file_jobs, options: ParseOptions):
+    """
+    Same as extract_snippets, with the listing, the file reads,
+    the parsing and the output overlapped: each file is read on a
+    thread as soon as it is listed and parsed on the worker
+    processes (a thread with one job) as soon as it is read, and
+    the results are passed to options.on_file in listing order.
+    At most PIPELINE_BATCHES_PER_JOB batches of files per job are
+    in flight, so a slow consumer holds back the listing and the
+    reads.
+    file_jobs: async iterator of FileJobs
+    """
+    jobs = options.jobs
+    if jobs == 0:
+        jobs = os.cpu_count() or 1
+    loop = asyncio.get_running_loop()
+    in_flight = asyncio.Queue(maxsize=PIPELINE_BATCHES_PER_JOB * jobs)
     all_snippets = []
-    STATS.files = len(filepaths)
-    for file in filepaths:
-        rel_path = file.relative_to(llvm_dir).as_posix()
-        fileReader = FileSnippetReader(file, rel_path)
-        all_snippets.extend(fileReader.to_dict())
+    if jobs > 1:
+        parse_pool = ProcessPoolExecutor(max_workers=jobs)
+    else:
+        parse_pool = ThreadPoolExecutor(max_workers=1)
+
+    async def produce():
+        batch = []
+        async for job in file_jobs:
+            job.embed_text = options.embed_text
+            job.profile = options.profile
+            batch.append(job)
+            if len(batch) == PIPELINE_BATCH_FILES:
+                await in_flight.put(asyncio.ensure_future(process_file_jobs(
+                    batch, options.cache, read_pool, parse_pool)))
+                batch = []
+        if batch:
+            await in_flight.put(asyncio.ensure_future(process_file_jobs(
+                batch, options.cache, read_pool, parse_pool)))
+        await in_flight.put(None)
+
+    async def consume():
+        while True:
+            task = await in_flight.get()
+            if task is None:
+                break
+            batch_snippets = []
+            for file_snippets, file_profile in await task:
+                STATS.files += 1
+                STATS.snippets += len(file_snippets)
+                if file_profile is None:
+                    STATS.cached_files += 1
+                else:
+                    STATS.file_profiles.append(file_profile)
+                batch_snippets.append(file_snippets)
+            if options.on_file is not None:
+                await loop.run_in_executor(read_pool, write_files,
+                                           options.on_file, batch_snippets)
+            else:
+                for file_snippets in batch_snippets:
+                    all_snippets.extend(file_snippets)
+
+    with ThreadPoolExecutor(max_workers=PIPELINE_READ_THREADS) as read_pool:
+        try:
+            await asyncio.gather(produce(), consume())
+        finally:
+            parse_pool.shutdown(cancel_futures=True)
+    if options.cache is not None:
+        options.cache.save()
+    return all_snippets
+
+
+def run_pipeline(file_jobs, options: ParseOptions):
+    """
+    Run extract_pipeline. The listing is part of the pipeline,
+    so its time is counted in the "parse" phase.
+    """
+    t = time.perf_counter()
+    all_snippets = asyncio.run(extract_pipeline(file_jobs, options))
+    STATS.add_run_time("parse", t)
+    return all_snippets
+
+
+def get_dir_file_jobs(llvm_dir: Path, full_tree: bool = False):
+    """
+    Same as list_dir_file_jobs, as a list
+    full_tree: all the files of the tree instead of the
+    ones changed from main
+    """
+    t = time.perf_counter()
+    file_jobs = asyncio.run(collect_file_jobs(list_dir_file_jobs(llvm_dir, full_tree)))
+    STATS.add_run_time("list", t)
+    return file_jobs
+
+
+def extract_all_snippets_from_dir(llvm_dir: Path, options: ParseOptions,
+                                  full_tree: bool = False):
+    if debug:
+        # the context dump of each file must not be interleaved
+        file_jobs = get_dir_file_jobs(llvm_dir, full_tree)
+        all_snippets = extract_snippets(file_jobs, options)
+        STATS.files = len(file_jobs)
+        return all_snippets
+    return run_pipeline(list_dir_file_jobs(llvm_dir, full_tree), options)
 
-    STATS.snippets += len(all_snippets)
+
+def get_rev_file_jobs(llvm_dir: Path, rev: str):
+    """
+    Jobs for the files changed in the revision rev, read from
+    the git objects instead of the working tree
+    """
+    file_jobs = [FileJob(Path(f), f, blob)
+                 for f, blob in changed_blobs(llvm_dir, rev)]
+    # filter with suffixes
+    return [job for job in file_jobs
+            if job.filepath.suffix not in IGNORE_FILES]
+
+
+def extract_all_snippets_from_revs(llvm_dir: Path, revs,
+                                   options: ParseOptions):
+    """
+    Snippets of each revision in revs, as {rev: snippets}.
+    A file with the same blob in several revisions is parsed once.
+    """
+    t = time.perf_counter()
+    rev_jobs = {rev: get_rev_file_jobs(llvm_dir, rev) for rev in revs}
+    STATS.add_run_time("list", t)
+    if len(revs) == 1:
+        file_jobs = rev_jobs[revs[0]]
+        with CatFile(llvm_dir) as cat_file:
+            all_snippets = extract_snippets(file_jobs, options, cat_file)
+        STATS.files = len(file_jobs)
+        return {revs[0]: all_snippets}
+    unique_jobs = {}
+    for file_jobs in rev_jobs.values():
+        for job in file_jobs:
+            unique_jobs.setdefault((job.relative_filepath_str, job.blob), job)
+    shared = sum(len(file_jobs) for file_jobs in rev_jobs.values()) \
+        - len(unique_jobs)
+    logger.info(f"{shared} files are shared between the revisions")
+    with CatFile(llvm_dir) as cat_file:
+        parsed = parse_file_jobs(list(unique_jobs.values()), options,
+                                 cat_file)
+    results = dict(zip(unique_jobs.keys(), parsed))
+    all_snippets = {}
+    for rev, file_jobs in rev_jobs.items():
+        all_snippets[rev] = []
+        for job in file_jobs:
+            all_snippets[rev].extend(
+                results[(job.relative_filepath_str, job.blob)])
+        STATS.snippets += len(all_snippets[rev])
+    STATS.files = len(unique_jobs)
     return all_snippets
 
+
+def file_stat(path: Path):
+    """ (mtime, size) of path, None if it does not exist """
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return (st.st_mtime_ns, st.st_size)
+
+
+class SnippetWatcher:
+    """
+    Keeps the snippets of every file in memory and, on each poll,
+    parses again only the files whose mtime or size changed. The
+    output is rewritten (atomically) when something changed.
+    list_jobs: returns the FileJobs to watch
+    """
+    # seconds between two listings of the files to watch, the
+    # files already known are checked on every poll
+    RELIST_INTERVAL = 5.0
+
+    def __init__(self, list_jobs, options: ParseOptions, output: str,
+                 format: str, index: SnippetIndex = None,
+                 make_resolver=None, manifest: Path = None):
+        self.list_jobs = list_jobs
+        self.options = options
+        self.output = output
+        self.format = format
+        self.index = index
+        self.manifest = manifest
+        # returns a new ReplaceResolver, or None
+        self.make_resolver = make_resolver
+        self.file_jobs = []
+        self.listed_time = 0
+        # report path -> file_stat() when it was parsed
+        self.stats = {}
+        # report path -> snippet dicts
+        self.snippets = {}
+        # report paths parsed or removed since the last write
+        self.dirty = set()
+
+    def load(self):
+        """ Parse all the files, with the cache and the jobs of options """
+        self.file_jobs = self.list_jobs()
+        self.listed_time = time.monotonic()
+        for job in self.file_jobs:
+            self.stats[job.report_path()] = file_stat(job.filepath)
+        parsed = iter_file_snippets(self.file_jobs, self.options)
+        for job, file_snippets in zip(self.file_jobs, parsed):
+            self.snippets[job.report_path()] = file_snippets
+        self.dirty.update(self.snippets)
+        STATS.files = len(self.file_jobs)
+        STATS.snippets = sum(len(snips) for snips in self.snippets.values())
+
+    def poll(self):
+        """
+        Parse the changed files again. Returns the number of
+        files that changed.
+        """
+        if time.monotonic() - self.listed_time > self.RELIST_INTERVAL:
+            self.file_jobs = self.list_jobs()
+            self.listed_time = time.monotonic()
+        changed = 0
+        watched = set()
+        for job in self.file_jobs:
+            path = job.report_path()
+            watched.add(path)
+            stat = file_stat(job.filepath)
+            if stat == self.stats.get(path):
+                continue
+            self.stats[path] = stat
+            changed += 1
+            self.dirty.add(path)
+            if stat is None:
+                self.snippets[path] = []
+                continue
+            job.embed_text = self.options.embed_text
+            try:
+                self.snippets[path], _ = parse_file(job)
+            except (OSError, SnippetError) as e:
+                # a marker error while the file is being edited,
+                # keep the last good snippets of the file
+                print(Colors.error(f"Error: {e}"))
+                print(Colors.error(f"Keeping the previous snippets of {path}"))
+        for path in self.snippets.keys() - watched:
+            del self.snippets[path]
+            del self.stats[path]
+            changed += 1
+            self.dirty.add(path)
+        return changed
+
+    def write(self):
+        """ Returns True if the output changed """
+        if self.index is not None:
+            # the files not watched keep their entries
+            self.index.replace_files({path: self.snippets.get(path, [])
+                                      for path in self.dirty})
+        self.dirty = set()
+        problems = []
+        resolver = self.make_resolver() if self.make_resolver else None
+        if resolver is not None:
+            for job in self.file_jobs:
+                resolver.add_file(self.snippets.get(job.report_path(), []))
+            problems = resolver.resolve()
+        writer = make_writer(self.format, self.output)
+        for job in self.file_jobs:
+            writer.add_file(self.snippets.get(job.report_path(), []))
+        close_output(writer, self.manifest)
+        if self.index is not None:
+            save_index(self.index, problems)
+        else:
+            report_problems(problems)
+        return writer.changed
+
+    def run(self, interval: float):
+        self.load()
+        printWritten(self.output, self.write())
+        print(f"Watching {len(self.file_jobs)} files, Ctrl-C to stop")
+        try:
+            while True:
+                time.sleep(interval)
+                t = time.perf_counter()
+                changed = self.poll()
+                if changed and self.write():
+                    print(f"Updated {self.output} ({changed} files changed) in "
+                          f"{(time.perf_counter() - t) * 1000:.1f} ms")
+        except KeyboardInterrupt:
+            pass
+
+
 def parse_args(args):
     parser = argparse.ArgumentParser(
         description="Snippet parser for the LLVM codebase"
@@ -521,30 +2013,124 @@ def parse_args(args):
 
     parser.add_argument("-o", "--output", type=str,
                         default="-", help='Output JSON filename')
-    parser.add_argument("input", nargs="?", type=str,
-                        help="Path to the input file. If not provided, the LLVM code will be taken.")
+    parser.add_argument("input", nargs="*", type=str,
+                        help="Paths to the input files. If not provided, the LLVM code will be taken.")
     parser.add_argument("-d", "--dump-contexts", action="store_true",
                         help="Enable debug mode", default=False)
     parser.add_argument("-v", "--verbose", action="store_true",
                         help="Enable logging", default=False)
     parser.add_argument("--diff", action="store_true", help="Print the diff file list that would be scanned otherwise",
                         default=False)
+    parser.add_argument("--all", action="store_true", default=False,
+                        help="Scan every file of the LLVM tree (minus the .gitignore'd ones) "
+                        "instead of the files changed from main")
+    parser.add_argument("-j", "--jobs", type=int, default=None,
+                        help="Number of files to parse in parallel (0 uses all CPUs, "
+                        "default: 1, all CPUs for --check)")
+    parser.add_argument("--cache-dir", type=str, default=None,
+                        help=f"Directory of the parsed file cache (default: {DEFAULT_CACHE_DIR} "
+                        "for the LLVM tree, input files are only cached when this is given)")
+    parser.add_argument("--no-cache", action="store_true", default=False,
+                        help="Parse every file again, ignoring the cache")
+    parser.add_argument("--embed-text", action="store_true", default=False,
+                        help="Add the code, the surrounding lines and the context lines of each "
+                        "snippet to the JSON, so it can be rendered without the LLVM sources")
+    parser.add_argument("--index", type=str, default=None,
+                        help=f"Snippet id index updated by the run (default: {DEFAULT_INDEX_FILE} "
+                        "for the LLVM tree, input files only update it when this is given)")
+    parser.add_argument("--no-index", action="store_true", default=False,
+                        help="Do not update the snippet id index")
+    parser.add_argument("--manifest", type=str, default=None,
+                        help="Manifest of the snippet ids added, removed and modified in the "
+                        "output by the run (default: the output name with .manifest.json)")
+    parser.add_argument("--no-manifest", action="store_true", default=False,
+                        help="Do not write the manifest")
+    parser.add_argument("--query", type=str, default=None, metavar="ID",
+                        help="Print where the snippet ID is defined, from the index")
+    parser.add_argument("--list", action="store_true", default=False,
+                        help="Print every snippet id in the index with its location and type")
+    parser.add_argument("--format", choices=FORMATS, default="json",
+                        help="json: list of snippets (default), ndjson: one snippet per line, "
+                        "written as soon as each file is parsed, compact: filenames and "
+                        "context stacks stored once in shared tables")
+    parser.add_argument("--watch", action="store_true", default=False,
+                        help="Keep running, parse the files again when they change "
+                        "and rewrite the output")
+    parser.add_argument("--watch-interval", type=float, default=0.5,
+                        help="Seconds between two checks for changed files in --watch mode")
+    parser.add_argument("--profile", type=str, default=None,
+                        help="Write a JSON profile of the run (time per phase and per file, "
+                        "lines scanned, marker matches) to this file")
+    parser.add_argument("--profile-top", type=int, default=10,
+                        help="Number of slowest files listed in the profile")
+    parser.add_argument("--scopes", type=str, default=None,
+                        help="Record the scopes of the parsed files (their start and end lines) "
+                        "in this scope index, only the files that changed are parsed again")
+    parser.add_argument("--symbols", type=str, default=None, metavar="FILE",
+                        help="Link the contexts of out-of-line definitions (Class::method) to "
+                        "the class that declares them, with this index of the C++ scopes of "
+                        "the tree. Only the files that changed since it was saved are scanned")
+    parser.add_argument("--context-at", type=str, default=None, metavar="FILE:LINE",
+                        help=f"Print the context stack at FILE:LINE from the scope index "
+                        f"(--scopes, default: {DEFAULT_SCOPES_FILE})")
+    parser.add_argument("--check", action="store_true", default=False,
+                        help="Only check the files: report every marker error, unmatched "
+                        "brace, duplicate id and bad replace= target instead of stopping "
+                        "at the first error, and write no output. Exits with 1 on errors")
+    parser.add_argument("--diagnostics-format", choices=["text", "json"], default="text",
+                        help="How --check prints the diagnostics: text, one "
+                        "file:line: severity: message [code] line each (default), or json")
+    parser.add_argument("--relocate", type=str, default=None, metavar="SNIPPETS",
+                        help="Find the snippets of this earlier output again in the current "
+                        "files with their fingerprints, without parsing the files, and write "
+                        "them with their new lines to the output. Exits with 1 if a snippet "
+                        "could not be found")
+    parser.add_argument("--relocate-report", type=str, default=None, metavar="FILE",
+                        help="With --relocate, also write the unchanged, moved, edited and "
+                        "lost snippets to this JSON file")
+    parser.add_argument("--rev", type=str, action="append", default=None,
+                        help="Read the LLVM files of this git revision from the git objects "
+                        "instead of the working tree (the repo may be a bare clone). "
+                        "Can be given more than once, the output is then keyed by revision, "
+                        "or written to one file per revision if the output name has {rev}")
     return parser.parse_args(args)
 
 
-def writeOut(snippets: dict, filename: str):
-    # if filename is -, write to stdout
-    if filename == "-":
-        print(json.dumps(snippets, indent=2))
+def writeOut(snippets, filename: str, format: str = "json"):
+    """
+    snippets: list of snippet dicts, or {rev: snippets} for json
+    """
+    writer = make_writer(format, filename)
+    if isinstance(snippets, dict):
+        writer.snippets = snippets
     else:
-        with open(filename, "w") as f:
-            json.dump(snippets, f, indent=2)
-        print(f"Written to {filename}")
-        STATS.print()
-        print(f"{Colors.BLUE}\tin {time.time() - START_TIME} seconds.")
+        writer.add_file(snippets)
+    writer.close()
+    printWritten(filename, writer.changed)
+
 
-def main(llvm_dir_path: Path):
-    all_snippets = extract_all_snippets_from_dir(llvm_dir_path)
+def printWritten(filename: str, changed: bool = True):
+    # nothing else may go to stdout with the JSON
+    if filename == "-":
+        return
+    if changed:
+        print(f"Written to {filename}")
+    else:
+        print(f"{filename} is unchanged, not written")
+    STATS.print()
+    print(f"{Colors.BLUE}\tin {time.time() - START_TIME} seconds.")
+
+
+def main(llvm_dir_path: Path, options: ParseOptions, revs=None,
+         full_tree: bool = False):
+    if revs:
+        all_snippets = extract_all_snippets_from_revs(llvm_dir_path, revs,
+                                                      options)
+        if len(revs) == 1:
+            return all_snippets[revs[0]]
+        return all_snippets
+    all_snippets = extract_all_snippets_from_dir(llvm_dir_path, options,
+                                                 full_tree)
     return all_snippets
     # fileReader = FileSnippetReader(Path(llvm_dir_path))
     # print(fileReader.to_dict())
@@ -569,26 +2155,545 @@ def driver():
     logging.basicConfig(level=level)
 
     if args.diff:
-        print(get_abs_filenames(LLVM_ROOT_DIR))
+        try:
+            if args.rev is not None:
+                for rev in args.rev:
+                    print([job.relative_filepath_str
+                           for job in get_rev_file_jobs(Path(LLVM_ROOT_DIR), rev)])
+            else:
+                print([job.relative_filepath_str
+                       for job in get_dir_file_jobs(Path(LLVM_ROOT_DIR), args.all)])
+        except GitError as e:
+            print(Colors.error(f"Error: {e}"))
+            return 1
         return 0
 
+    if args.query is not None or args.list:
+        return query_index(args)
+    if args.context_at is not None:
+        return query_scopes(args)
+    if args.relocate is not None:
+        return relocate(args)
+    if args.check:
+        return check(args)
+    for flag, value in [("--scopes", args.scopes), ("--symbols", args.symbols)]:
+        if value is not None and (args.rev is not None or args.watch):
+            print(Colors.error(f"Error: {flag} reads the working tree once, it cannot be "
+                               "used with --rev or --watch"))
+            return 1
+
     # logging.info(args)
     global debug
     debug = args.dump_contexts
-    all_snips = {}
-    if args.input is not None:
-        all_snips = FileSnippetReader(Path(args.input)).to_dict()
-        # writeOut(snippets.to_dict(), args.output)
+    cache_dir = args.cache_dir
+    if cache_dir is None and not args.input:
+        cache_dir = DEFAULT_CACHE_DIR
+    cache = None
+    if cache_dir is not None and not args.no_cache:
+        cache = SnippetCache(Path(cache_dir), parser_salt())
+    jobs = 1 if args.jobs is None else args.jobs
+    options = ParseOptions(jobs, cache, args.embed_text,
+                           args.profile is not None)
+    index = open_index(args)
+    if args.watch:
+        return watch(args, options, index,
+                     lambda: open_resolver(args, index, cache))
+    resolver = open_resolver(args, index, cache)
+    try:
+        symbols = open_symbols(args, options)
+    except GitError as e:
+        print(Colors.error(f"Error: {e}"))
+        return 1
+    writer = None
+    if args.rev is None or len(args.rev) == 1:
+        # stream the snippets to the output as the files are parsed
+        writer = make_writer(args.format, args.output)
+
+        def on_file(snippets):
+            if symbols is not None:
+                resolve_contexts(snippets, symbols)
+            if index is not None:
+                index.add_snippets(snippets)
+            if resolver is not None:
+                resolver.add_file(snippets)
+                if writer.streams:
+                    # written once they are resolved
+                    snippets = [s for s in snippets
+                                if replace_target(s["type"]) is None]
+            writer.add_file(snippets)
+        options.on_file = on_file
+    elif args.format != "json" and "{rev}" not in args.output:
+        print(Colors.error(f"Error: --format {args.format} with more than one "
+                           "--rev needs {rev} in the output name"))
+        return 1
+    try:
+        all_snips = extract(args, options)
+    except SnippetError as e:
+        if writer is not None:
+            writer.abort()
+        print(Colors.error(f"Error: {e}"), file=sys.stderr)
+        return 1
+    except BaseException:
+        if writer is not None:
+            writer.abort()
+        raise
+    if all_snips is None:
+        if writer is not None:
+            writer.abort()
+        return 1
+
+    t = time.perf_counter()
+    problems = []
+    if resolver is not None:
+        problems = resolver.resolve()
+        if writer.streams:
+            writer.add_file(resolver.pending)
+    if writer is not None:
+        manifest = close_output(writer, manifest_path(args))
+        printWritten(args.output, writer.changed)
+        if manifest is not None:
+            print(f"Manifest {manifest_path(args)}: {format_summary(manifest)}")
+    elif "{rev}" in args.output:
+        for rev, snips in all_snips.items():
+            writeOut(snips, args.output.format(rev=rev.replace("/", "-")),
+                     args.format)
     else:
-        if LLVM_ROOT_DIR:
-            all_snips = main(Path(LLVM_ROOT_DIR))
+        writeOut(all_snips, args.output)
+    if index is not None:
+        save_index(index, problems)
+    else:
+        report_problems(problems)
+    if symbols is not None:
+        save_symbols(args, symbols)
+    if args.scopes is not None:
+        save_scopes(args, options)
+    STATS.add_run_time("write", t)
+    if args.profile is not None:
+        STATS.write_profile(args.profile, args.profile_top)
+    return 0
+
+
+def manifest_path(args):
+    """ Where the manifest of the output goes, None for no manifest """
+    if args.no_manifest or args.output == "-" or \
+            (args.rev is not None and len(args.rev) > 1):
+        return None
+    if args.manifest is not None:
+        return Path(args.manifest)
+    return Path(args.output).with_suffix(".manifest.json")
+
+
+def close_output(writer, manifest: Path = None):
+    """
+    Close writer and write the manifest of the snippet ids that
+    changed in its output. Returns the manifest, None without one.
+    """
+    if manifest is None:
+        writer.close()
+        return None
+    old = read_hashes(writer.filename)
+    writer.close()
+    new = read_hashes(writer.filename) if writer.changed else old
+    return write_manifest(manifest, writer.filename, writer.changed, old, new)
+
+
+def report_problems(problems):
+    # the index and the resolver report the same missing targets
+    for message in dict.fromkeys(problems):
+        print(Colors.warning(f"Warning: {message}"), file=sys.stderr)
+
+
+def save_index(index: SnippetIndex, problems=[]):
+    """
+    Report problems, the duplicate ids and dangling replace=
+    of index, and save it
+    """
+    report_problems(problems + index.problems())
+    index.save()
+
+
+def open_resolver(args, index: SnippetIndex, cache: SnippetCache):
+    """ The ReplaceResolver of this run, None for --rev """
+    if args.rev is not None:
+        return None
+    root = None if args.input else LLVM_ROOT_DIR
+    if cache is None or debug:
+        return ReplaceResolver(root, index)
+    return ReplaceResolver(root, index,
+                           DiffCache(cache.cache_dir / DIFF_CACHE_FILE),
+                           cache.blob_for_file)
+
+
+def query_index(args):
+    index_file = args.index or DEFAULT_INDEX_FILE
+    if not Path(index_file).exists():
+        print(Colors.error(f"Error: no snippet index at {index_file}, run the parser first"))
+        return 1
+    index = SnippetIndex(Path(index_file)).load()
+    if args.list:
+        for entries in sorted(index.ids().items()):
+            for entry in entries[1]:
+                print(format_entry(entry))
+        return 0
+    entries = index.query(args.query)
+    if not entries:
+        print(Colors.error(f"Error: no snippet with id '{args.query}'"))
+        return 1
+    for entry in entries:
+        print(format_entry(entry))
+    return 0
+
+
+def save_scopes(args, options: ParseOptions):
+    scope_index = ScopeIndex(Path(args.scopes), parser_salt("scopes")).load()
+    if args.input:
+        file_jobs = [FileJob(Path(f)) for f in args.input]
+    else:
+        file_jobs = get_dir_file_jobs(Path(LLVM_ROOT_DIR), args.all)
+        if args.all:
+            # a run over the whole tree replaces the index
+            scope_index.retain(job.report_path() for job in file_jobs)
+    # only the languages whose scopes are tracked
+    file_jobs = [job for job in file_jobs if job.filepath.suffix in LANGUAGES
+                 and LANGUAGES[job.filepath.suffix].tracker is not None]
+    updated = update_file_index(scope_index, file_jobs, options, scan_scopes)
+    scope_index.save()
+    if args.output != "-":
+        print(f"Scopes of {updated} files updated in {args.scopes}")
+
+
+def open_symbols(args, options: ParseOptions):
+    """
+    The symbol index of --symbols, None without it. The C++ files of
+    the run that changed since it was saved are scanned again first,
+    the other files when a lookup needs them. It is saved after the
+    run, with save_symbols().
+    """
+    if args.symbols is None:
+        return None
+    symbols = SymbolIndex(Path(args.symbols), parser_salt("symbols"))
+    symbols.refresh = lambda filename: refresh_symbols(symbols, filename, options)
+    symbols.discover = lambda filename: index_includes(symbols, filename, options)
+    symbols.load()
+    if args.input:
+        file_jobs = [FileJob(Path(f)) for f in args.input]
+    elif LLVM_ROOT_DIR:
+        file_jobs = get_dir_file_jobs(Path(LLVM_ROOT_DIR), args.all)
+        if args.all:
+            # a run over the whole tree replaces the index
+            symbols.retain(job.report_path() for job in file_jobs)
+    else:
+        file_jobs = []
+    file_jobs = [job for job in file_jobs if job.filepath.suffix in LANGUAGES
+                 and LANGUAGES[job.filepath.suffix].tracker is CppContextTracker]
+    symbols.updated = update_file_index(symbols, file_jobs, options, scan_symbols)
+    symbols.checked.update(job.report_path() for job in file_jobs)
+    return symbols
+
+
+def refresh_symbols(symbols: SymbolIndex, filename: str, options: ParseOptions):
+    """
+    Scan filename again if it changed since it was indexed, drop it
+    if it is gone. Returns True if its entry changed.
+    """
+    # input files are indexed by their absolute path
+    job = FileJob(Path(LLVM_ROOT_DIR or ".") / filename, filename)
+    if not job.filepath.exists():
+        symbols.retain(set(symbols.files) - {filename})
+        return True
+    updated = update_file_index(symbols, [job], ParseOptions(1, options.cache),
+                                scan_symbols)
+    symbols.updated += updated
+    return updated > 0
+
+
+# the headers a C++ file includes with quotes
+INCLUDE_RE = re.compile(rb'^[ \t]*#[ \t]*include[ \t]*"([^"]+)"', re.M)
+
+
+def included_headers(filename: str):
+    """
+    The names of the files the quoted #includes of filename point
+    to, looked for next to it and then in the include directory of
+    each of its parent directories, up to the LLVM tree
+    """
+    root = Path(LLVM_ROOT_DIR or ".").absolute()
+    path = root / filename
+    try:
+        includes = INCLUDE_RE.findall(path.read_bytes())
+    except OSError:
+        return []
+    dirs = [path.parent]
+    for parent in path.parents:
+        dirs.append(parent / "include")
+        if parent == root:
+            break
+    headers = []
+    for include in includes:
+        for d in dirs:
+            header = Path(os.path.normpath(d / include.decode()))
+            if header.is_file():
+                break
         else:
-            print("Error: LLVM_ROOT_DIR is not set in the environment")
+            continue
+        if Path(filename).is_absolute():
+            # input files are indexed by their absolute path
+            headers.append(header.as_posix())
+        elif header.is_relative_to(root):
+            headers.append(header.relative_to(root).as_posix())
+    return headers
+
+
+def index_includes(symbols: SymbolIndex, filename: str, options: ParseOptions):
+    """
+    Index the headers filename includes that are not indexed or
+    changed since. Returns True if it scanned any.
+    """
+    file_jobs = [FileJob(Path(LLVM_ROOT_DIR or ".") / header, header)
+                 for header in included_headers(filename)
+                 if header not in symbols.checked]
+    file_jobs = [job for job in file_jobs if job.filepath.suffix in LANGUAGES
+                 and LANGUAGES[job.filepath.suffix].tracker is CppContextTracker]
+    updated = update_file_index(symbols, file_jobs, ParseOptions(1, options.cache),
+                                scan_symbols)
+    symbols.checked.update(job.report_path() for job in file_jobs)
+    symbols.updated += updated
+    return updated > 0
+
+
+def save_symbols(args, symbols: SymbolIndex):
+    for name, (filename, lineno) in sorted(symbols.unresolved.items(),
+                                           key=lambda item: item[1]):
+        print(Colors.warning(f"Warning: {filename}:{lineno}: no declaration of {name} "
+                             "is indexed, run with --symbols and --all to index every "
+                             "header"), file=sys.stderr)
+    symbols.save()
+    if args.output != "-":
+        print(f"Symbols of {symbols.updated} files updated in {args.symbols}")
+
+
+def resolve_contexts(snippets, symbols: SymbolIndex):
+    """
+    Add "declared_in", the scope that declares its qualified name,
+    to the contexts of the snippet dicts that have one
+    """
+    for snippet in snippets:
+        for context in snippet["context_stack"]:
+            scope = symbols.declaring_scope(snippet["filename"], context["line"])
+            if scope is not None:
+                context["declared_in"] = scope
+
+
+def query_scopes(args):
+    scopes_file = args.scopes or DEFAULT_SCOPES_FILE
+    filename, _, lineno = args.context_at.rpartition(":")
+    if not filename or not lineno.isdigit():
+        print(Colors.error(f"Error: --context-at needs FILE:LINE, not '{args.context_at}'"))
+        return 1
+    if not Path(scopes_file).exists():
+        print(Colors.error(f"Error: no scope index at {scopes_file}, run the parser "
+                           "with --scopes first"))
+        return 1
+    scope_index = ScopeIndex(Path(scopes_file), parser_salt("scopes")).load()
+    if scope_index.blob(filename) is None:
+        # input files are indexed by their absolute path
+        filename = Path(filename).absolute().as_posix()
+    if scope_index.blob(filename) is None:
+        print(Colors.error(f"Error: {filename} is not in the scope index {scopes_file}"))
+        return 1
+    # the other names are relative to the LLVM tree
+    path = Path(LLVM_ROOT_DIR or ".") / filename
+    try:
+        blob = git_blob_hash(path.read_bytes())
+    except OSError as e:
+        print(Colors.error(f"Error: cannot read {path}: {e.strerror}"))
+        return 1
+    contexts = scope_index.context_at(filename, int(lineno), blob)
+    if contexts is None:
+        print(Colors.error(f"Error: {filename} changed since it was indexed, run the "
+                           "parser with --scopes again"))
+        return 1
+    if not contexts:
+        print(f"{filename}:{lineno} is at the top level")
+    for c in contexts:
+        print(f"{c['type']}\t{filename}:{c['line']}\t{c['start']}-{c['end'] - 1}")
+    return 0
+
+
+def check(args):
+    """ Print the diagnostics of every file, with no output written """
+    if args.rev is not None or args.watch:
+        print(Colors.error("Error: --check reads the working tree once, it cannot be "
+                           "used with --rev or --watch"))
+        return 1
+    if args.input:
+        file_jobs = [FileJob(Path(f)) for f in args.input]
+    elif LLVM_ROOT_DIR:
+        try:
+            file_jobs = get_dir_file_jobs(Path(LLVM_ROOT_DIR), args.all)
+        except GitError as e:
+            print(Colors.error(f"Error: {e}"))
             return 1
+    else:
+        print("Error: LLVM_ROOT_DIR is not set in the environment")
+        return 1
+    diagnostics = check_files(file_jobs, args.jobs)
+    errors = sum(d["severity"] == "error" for d in diagnostics)
+    warnings = len(diagnostics) - errors
+    if args.diagnostics_format == "json":
+        print(json.dumps({"files": len(file_jobs), "errors": errors,
+                          "warnings": warnings, "diagnostics": diagnostics},
+                         indent=2))
+    else:
+        for d in diagnostics:
+            print(format_diagnostic(d))
+        print(f"{errors} errors, {warnings} warnings in {len(file_jobs)} files")
+    return 1 if errors else 0
 
-    writeOut(all_snips, args.output)
+
+def relocate(args):
+    """
+    Anchor the snippets of an earlier output in the current contents
+    of their files, from their fingerprints
+    """
+    try:
+        snippets = load_snippets(args.relocate)
+    except (OSError, ValueError) as e:
+        print(Colors.error(f"Error: cannot read {args.relocate}: {e}"))
+        return 1
+    by_file = {}
+    for snippet in snippets:
+        by_file.setdefault(snippet["filename"], []).append(snippet)
+    results = {status: [] for status in STATUSES}
+    writer = make_writer(args.format, args.output)
+    for filename, file_snippets in by_file.items():
+        path = Path(filename)
+        if not path.is_absolute() and LLVM_ROOT_DIR is not None:
+            path = Path(LLVM_ROOT_DIR) / filename
+        try:
+            lines = read_lines(path)
+        except (OSError, UnicodeDecodeError):
+            file_results = [("lost", s, None) for s in file_snippets]
+        else:
+            file_results = relocate_file(file_snippets, lines)
+        kept = []
+        for status, old, new in file_results:
+            results[status].append((old, new))
+            if new is None:
+                continue
+            if "code" in new:
+                # written with --embed-text
+                start, end = new["start_lineno"], new["end_lineno"]
+                new["code"] = "".join(lines[start:end - 1])
+                new["before"] = surrounding_lines(lines, start - 2, -1)
+                new["after"] = surrounding_lines(lines, end, 1)
+            kept.append(new)
+        writer.add_file(kept)
+    manifest = close_output(writer, manifest_path(args))
+
+    out = sys.stderr if args.output == "-" else sys.stdout
+    for status, color in [("moved", str), ("edited", Colors.warning),
+                          ("lost", Colors.error)]:
+        for old, new in results[status]:
+            where = f"{old['filename']}:{old['start_lineno']}-{old['end_lineno']}"
+            if new is not None:
+                where += f" -> {new['start_lineno']}-{new['end_lineno']}"
+            print(color(f"{status}\t{old['id']}\t{where}"), file=out)
+    print(", ".join(f"{len(results[status])} {status}" for status in STATUSES),
+          file=out)
+    if results["edited"]:
+        print(Colors.warning("The context stacks of the edited snippets may be stale, "
+                             "parse their files again"), file=out)
+    if args.relocate_report is not None:
+        write_atomic(Path(args.relocate_report), json.dumps({
+            status: [{"id": old["id"], "filename": old["filename"],
+                      "old": [old["start_lineno"], old["end_lineno"]],
+                      "new": [new["start_lineno"], new["end_lineno"]]
+                      if new is not None else None}
+                     for old, new in results[status]]
+            for status in STATUSES}, indent=2))
+    if args.output != "-":
+        print(f"Written to {args.output}" if writer.changed
+              else f"{args.output} is unchanged, not written")
+        if manifest is not None:
+            print(f"Manifest {manifest_path(args)}: {format_summary(manifest)}")
+    return 1 if results["lost"] else 0
+
+
+def open_index(args):
+    """
+    The index updated by this run, None if there is none. A run
+    over the LLVM tree rebuilds it, input files replace their
+    own entries.
+    """
+    index_file = args.index
+    if index_file is None and not args.input:
+        index_file = DEFAULT_INDEX_FILE
+    if index_file is None or args.no_index or args.rev is not None:
+        return None
+    index = SnippetIndex(Path(index_file)).load()
+    if args.input:
+        index.remove_files(FileJob(Path(f)).report_path() for f in args.input)
+    else:
+        index.clear()
+    return index
+
+
+def watch(args, options: ParseOptions, index: SnippetIndex = None,
+          make_resolver=None):
+    if args.rev is not None:
+        print(Colors.error("Error: --watch reads the working tree, it cannot be used with --rev"))
+        return 1
+    if args.output == "-":
+        print(Colors.error("Error: --watch needs an output file"))
+        return 1
+    if args.input:
+        file_jobs = [FileJob(Path(f)) for f in args.input]
+
+        def list_jobs():
+            return file_jobs
+    elif LLVM_ROOT_DIR:
+        def list_jobs():
+            return get_dir_file_jobs(Path(LLVM_ROOT_DIR), args.all)
+    else:
+        print("Error: LLVM_ROOT_DIR is not set in the environment")
+        return 1
+    try:
+        SnippetWatcher(list_jobs, options, args.output, args.format, index,
+                       make_resolver, manifest_path(args)).run(args.watch_interval)
+    except (SnippetError, GitError) as e:
+        print(Colors.error(f"Error: {e}"), file=sys.stderr)
+        return 1
     return 0
 
 
+def extract(args, options: ParseOptions):
+    """
+    Extract the snippets of the input files or of the LLVM tree.
+    Returns None on errors.
+    """
+    all_snips = []
+    if args.input:
+        file_jobs = [FileJob(Path(f)) for f in args.input]
+        if debug:
+            all_snips = extract_snippets(file_jobs, options)
+            STATS.files = len(args.input)
+        else:
+            all_snips = run_pipeline(list_file_jobs(file_jobs), options)
+        # writeOut(snippets.to_dict(), args.output)
+    else:
+        if LLVM_ROOT_DIR:
+            try:
+                all_snips = main(Path(LLVM_ROOT_DIR), options, args.rev,
+                                 args.all)
+            except GitError as e:
+                print(Colors.error(f"Error: {e}"))
+                return None
+        else:
+            print("Error: LLVM_ROOT_DIR is not set in the environment")
+            return None
+    return all_snips
+
+
 if __name__ == "__main__":
     sys.exit(driver())
@@ -0,0 +1,197 @@
+# Resolves the replace=<id> snippets once all the snippets of a run are
+# known, so the site does not have to look up the replaced snippet and
+# diff it on every page. Each replace= snippet gets
+#   "replaces": {"id": "<id>", "removed": "<code of <id>>",
+#                "diff": ["@@ -1,3 +1,4 @@", " same", "-old", "+new", ...]}
+# where diff is the unified line diff from <id> to the snippet. Targets
+# that are not defined and replace= cycles are reported instead.
+#
+# Only the replace= snippet dicts are kept until the end of the run, the
+# others are kept as their small index entries and the code of a target is
+# read back from its file, so streaming the output of a large tree does
+# not hold every snippet.
+#
+# Diffs are cached in <cache_dir>/replace-diffs.json, keyed by the git blob
+# hashes of the two files, so unchanged pairs are never diffed again.
+
+import difflib
+import hashlib
+import io
+import json
+from pathlib import Path
+
+from snippet_cache import write_atomic
+from snippet_index import index_entry, location, replace_target
+
+DIFF_CACHE_FILE = "replace-diffs.json"
+MAX_DIFF_CACHE_ENTRIES = 4096
+
+
+def read_lines(path: Path):
+    """ Lines of path, read the way FileSnippetReader reads them """
+    data = path.read_bytes()
+    if b'\r' in data:
+        data = data.replace(b'\r\n', b'\n').replace(b'\r', b'\n')
+    return io.StringIO(data.decode(), newline=None).readlines()
+
+
+class DiffCache:
+    """ replace= resolutions keyed by the blob hashes of both files """
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        # the cache is dropped when this module changes
+        self.salt = hashlib.sha1(Path(__file__).read_bytes()).hexdigest()
+        self.diffs = {}
+        self.used = {}
+        try:
+            with open(self.path) as f:
+                data = json.load(f)
+            if data.get("salt") == self.salt:
+                self.diffs = data["diffs"]
+        except (OSError, ValueError, KeyError):
+            pass
+
+    def key(self, source_blob: str, source_id: str, target_blob: str,
+            target_id: str):
+        key = f"{source_blob}\0{source_id}\0{target_blob}\0{target_id}"
+        return hashlib.sha1(key.encode()).hexdigest()
+
+    def get(self, key: str):
+        resolved = self.diffs.get(key)
+        if resolved is not None:
+            self.used[key] = resolved
+        return resolved
+
+    def put(self, key: str, resolved):
+        self.used[key] = resolved
+
+    def save(self):
+        # the ones of this run, then the most recent older ones
+        diffs = dict(self.used)
+        for key, resolved in reversed(list(self.diffs.items())):
+            if len(diffs) >= MAX_DIFF_CACHE_ENTRIES:
+                break
+            diffs.setdefault(key, resolved)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        write_atomic(self.path, json.dumps({"salt": self.salt, "diffs": diffs}))
+
+
+class ReplaceResolver:
+    """
+    Collects the snippets of a run with add_file() and adds the
+    "replaces" field to the replace= snippet dicts in resolve().
+    root: directory the snippet filenames are relative to
+    index: SnippetIndex used for the ids not seen in this run
+    diff_cache: DiffCache, with blob_for_file(path) giving the
+    blob hash of a file
+    """
+
+    def __init__(self, root: Path = None, index=None,
+                 diff_cache: DiffCache = None, blob_for_file=None):
+        self.root = Path(root or ".")
+        self.index = index
+        self.diff_cache = diff_cache
+        self.blob_for_file = blob_for_file
+        # id -> index entry, the first one for duplicate ids
+        self.snippets = {}
+        # the replace= snippet dicts
+        self.pending = []
+        # path -> lines
+        self.file_lines = {}
+
+    def add_file(self, snippets):
+        for snippet in snippets:
+            if snippet["id"] not in self.snippets:
+                self.snippets[snippet["id"]] = index_entry(snippet)
+            if replace_target(snippet["type"]) is not None:
+                self.pending.append(snippet)
+
+    def lookup(self, snippet_id: str):
+        snippet = self.snippets.get(snippet_id)
+        if snippet is None and self.index is not None:
+            entries = self.index.query(snippet_id)
+            if entries:
+                snippet = entries[0]
+        return snippet
+
+    def path(self, snippet):
+        return self.root / snippet["filename"]
+
+    def code(self, snippet):
+        """ The lines between the markers of a snippet dict or entry """
+        if "code" in snippet:
+            return snippet["code"]
+        path = self.path(snippet)
+        lines = self.file_lines.get(path)
+        if lines is None:
+            lines = self.file_lines[path] = read_lines(path)
+        return "".join(lines[snippet["start_lineno"]:snippet["end_lineno"] - 1])
+
+    def check_chain(self, snippet):
+        """
+        Follow the replace= targets from snippet. Returns the
+        (code, message) of a missing target or a cycle, None if
+        the chain ends on a snippet that replaces nothing.
+        """
+        ids = [snippet["id"]]
+        current = snippet
+        target = replace_target(snippet["type"])
+        while target is not None:
+            target_snippet = self.lookup(target)
+            if target_snippet is None:
+                return ("undefined-replace",
+                        f"Snippet '{current['id']}' at {location(current)} "
+                        f"replaces '{target}', which is not defined")
+            if target in ids:
+                cycle = " -> ".join(ids[ids.index(target):] + [target])
+                return "replace-cycle", f"replace= cycle: {cycle}"
+            ids.append(target)
+            current = target_snippet
+            target = replace_target(target_snippet["type"])
+        return None
+
+    def resolve_pair(self, snippet, target_snippet):
+        removed = self.code(target_snippet)
+        diff = difflib.unified_diff(removed.splitlines(),
+                                    self.code(snippet).splitlines(),
+                                    lineterm="")
+        # without the ---/+++ file headers
+        return {"removed": removed, "diff": list(diff)[2:]}
+
+    def resolve_cached(self, snippet, target_snippet):
+        if self.diff_cache is None:
+            return self.resolve_pair(snippet, target_snippet)
+        key = self.diff_cache.key(
+            self.blob_for_file(self.path(snippet)), snippet["id"],
+            self.blob_for_file(self.path(target_snippet)),
+            target_snippet["id"])
+        resolved = self.diff_cache.get(key)
+        if resolved is None:
+            resolved = self.resolve_pair(snippet, target_snippet)
+            self.diff_cache.put(key, resolved)
+        return resolved
+
+    def resolve(self):
+        """
+        Resolve the pending replace= snippets.
+        Returns the messages of the ones that could not be.
+        """
+        problems = []
+        for snippet in self.pending:
+            # from an earlier resolve() of the same dicts
+            snippet.pop("replaces", None)
+            problem = self.check_chain(snippet)
+            if problem is not None:
+                problems.append(problem[1])
+                continue
+            target = replace_target(snippet["type"])
+            target_snippet = self.lookup(target)
+            try:
+                snippet["replaces"] = {
+                    "id": target, **self.resolve_cached(snippet, target_snippet)}
+            except OSError as e:
+                problems.append(f"Cannot resolve replace= of '{snippet['id']}': {e}")
+        if self.diff_cache is not None:
+            self.diff_cache.save()
+        return problems
@@ -0,0 +1,154 @@
+# Interval index of the scopes (namespaces, classes, functions, TableGen
+# records...) of the parsed files, so the context stack at any line can be
+# looked up without parsing the file again. It is saved as
+#   {"salt": "<parser salt>", "files": {"<filename>": {
+#       "blob": "<git blob hash of the file>",
+#       "spans": [[start, end, "FUNCTION", line], ...],
+#       "lines": [12, 14, 30, ...],
+#       "stacks": [0, 1, -1, ...],
+#       "nodes": [[span, parent], ...]}}}
+# A span is a scope that is open from line start to line end - 1, line is
+# the line of its declaration (the "line" of the context_stack entries).
+# The context stack only changes on the lines of "lines": from lines[k]
+# until the next one it is node stacks[k] (-1 for the empty stack). The
+# nodes form a linked stack like ContextStack, a node is the span on top
+# and the node below it. The stack at a line is then one binary search
+# followed by the walk down its nodes.
+
+import bisect
+import json
+from pathlib import Path
+
+from snippet_cache import write_atomic
+
+
+class ScopeRecorder:
+    """
+    Builds the index entry of a file from the context stacks its
+    tracker goes through, given with add() in line order.
+    """
+
+    def __init__(self):
+        self.spans = []
+        # Context -> index of its span
+        self.span_of = {}
+        self.nodes = []
+        # ContextStack -> index of its node
+        self.node_of = {}
+        self.lines = []
+        self.stacks = []
+        self.open = set()
+
+    def add(self, lineno: int, context_stack):
+        """ context_stack is the stack from lineno on """
+        contexts = set(context_stack)
+        for context in contexts - self.open:
+            self.span_of[context] = len(self.spans)
+            self.spans.append([lineno, None, context.type.name,
+                               context.lineno])
+        for context in self.open - contexts:
+            self.spans[self.span_of[context]][1] = lineno
+        self.open = contexts
+        self.lines.append(lineno)
+        self.stacks.append(self.node(context_stack))
+
+    def node(self, context_stack):
+        """ Index of the node of context_stack, added with its parents """
+        new = []
+        while context_stack.depth and context_stack not in self.node_of:
+            new.append(context_stack)
+            context_stack = context_stack.parent
+        parent = self.node_of[context_stack] if context_stack.depth else -1
+        for stack in reversed(new):
+            self.nodes.append([self.span_of[stack.context], parent])
+            self.node_of[stack] = parent = len(self.nodes) - 1
+        return parent
+
+    def to_dict(self, line_count: int):
+        """ The index entry, the scopes still open end after line_count """
+        for span in self.spans:
+            if span[1] is None:
+                span[1] = line_count + 1
+        return {
+            "spans": self.spans,
+            "lines": self.lines,
+            "stacks": self.stacks,
+            "nodes": self.nodes,
+        }
+
+
+def context_at(entry, lineno: int):
+    """
+    The context stack at lineno in a file, bottom first, as
+    {"type", "line", "start", "end"} dicts
+    """
+    k = bisect.bisect_right(entry["lines"], lineno) - 1
+    node = entry["stacks"][k] if k >= 0 else -1
+    contexts = []
+    while node != -1:
+        span, node = entry["nodes"][node]
+        start, end, type, line = entry["spans"][span]
+        contexts.append({"type": type, "line": line, "start": start,
+                         "end": end})
+    contexts.reverse()
+    return contexts
+
+
+class FileIndex:
+    """
+    Entries of files, saved with the git blob hash of the contents
+    they were built from, so only the files that changed are scanned
+    again.
+    salt: the entries saved with another salt (by another version
+    of the parser) are dropped
+    """
+
+    def __init__(self, path: Path, salt: str = ""):
+        self.path = Path(path)
+        self.salt = salt
+        # filename -> entry
+        self.files = {}
+
+    def load(self):
+        try:
+            with open(self.path) as f:
+                data = json.load(f)
+            self.files = data["files"] if data.get("salt") == self.salt else {}
+        except (OSError, ValueError, KeyError, AttributeError):
+            self.files = {}
+        return self
+
+    def blob(self, filename: str):
+        """ Blob hash of filename when it was indexed, None if it is not """
+        entry = self.files.get(filename)
+        return entry["blob"] if entry is not None else None
+
+    def set_file(self, filename: str, blob: str, entry):
+        self.files[filename] = {"blob": blob, **entry}
+
+    def remove_file(self, filename: str):
+        self.files.pop(filename, None)
+
+    def retain(self, filenames):
+        """ Drop the files not in filenames """
+        filenames = set(filenames)
+        for filename in list(self.files):
+            if filename not in filenames:
+                del self.files[filename]
+
+    def save(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        write_atomic(self.path, json.dumps(
+            {"salt": self.salt, "files": self.files}, separators=(",", ":")))
+
+
+class ScopeIndex(FileIndex):
+    def context_at(self, filename: str, lineno: int, blob: str):
+        """
+        The context stack at filename:lineno, None for a file that is
+        not indexed or was indexed from contents other than blob
+        """
+        entry = self.files.get(filename)
+        if entry is None or entry["blob"] != blob:
+            return None
+        return context_at(entry, lineno)
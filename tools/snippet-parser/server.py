@@ -0,0 +1,232 @@
+# Long lived snippet parser, for the Astro dev server. Spawning main.py
+# for every refresh pays the interpreter startup, the .env loading and the
+# regex compilation each time; this process pays them once and keeps the
+# parsed files in memory.
+#
+# It speaks JSON-RPC 2.0 over stdin/stdout, one message per line:
+#   -> {"jsonrpc": "2.0", "id": 1, "method": "snippets_for_file",
+#       "params": {"path": "llvm/lib/Target/Nova/NovaISelLowering.cpp"}}
+#   <- {"jsonrpc": "2.0", "id": 1,
+#       "result": {"snippets": [...], "diagnostics": []}}
+# Methods:
+#   snippets_for_file {path}  the snippet dicts of a file, path is relative
+#                             to the LLVM tree (or absolute)
+#   snippet {id}              {"snippet": <the snippet dict or null>,
+#                              "diagnostics": [...]}, the file of the id is
+#                             found through the snippet id index
+#   ids {}                    {"ids": [...]}, every id known
+#   shutdown {}               stops the server
+#
+# A file is parsed again only when its mtime or size changed. Marker errors
+# never stop the server, they are returned as diagnostics
+#   {"file": ..., "line": ..., "code": "mismatched-end", "message": ...}
+# next to the last good snippets of the file.
+#
+# python3 server.py [--root DIR] [--index FILE] [--embed-text]
+
+import argparse
+import inspect
+import json
+import sys
+from pathlib import Path
+
+import main as parser
+from snippet_index import DEFAULT_INDEX_FILE, SnippetIndex
+
+# JSON-RPC error codes
+PARSE_ERROR = -32700
+INVALID_REQUEST = -32600
+METHOD_NOT_FOUND = -32601
+INVALID_PARAMS = -32602
+INTERNAL_ERROR = -32603
+
+
+class RpcError(Exception):
+    def __init__(self, code: int, message: str):
+        super().__init__(message)
+        self.code = code
+        self.message = message
+
+
+def diagnostic(filename: str, code: str, message: str, lineno: int = 0):
+    return {"file": filename, "line": lineno, "code": code, "message": message}
+
+
+class SnippetServer:
+    """
+    root: the directory relative paths are taken from
+    index_path: snippet id index written by main.py, read again
+    whenever it changes
+    """
+
+    def __init__(self, root: Path, index_path: Path = None,
+                 embed_text: bool = False):
+        self.root = Path(root)
+        self.index_path = index_path
+        self.index = None
+        self.index_stat = None
+        self.embed_text = embed_text
+        # report path -> (file_stat(), snippets, diagnostics)
+        self.files = {}
+        # id -> report path, for the parsed files
+        self.ids = {}
+        self.stopped = False
+        self.methods = {
+            "snippets_for_file": self.snippets_for_file,
+            "snippet": self.snippet,
+            "ids": self.all_ids,
+            "shutdown": self.shutdown,
+        }
+
+    def file_job(self, path: str):
+        if Path(path).is_absolute():
+            return parser.FileJob(Path(path))
+        return parser.FileJob(self.root / path, path)
+
+    def parse(self, path: str):
+        """ (stat, snippets, diagnostics) of path, parsed if it changed """
+        job = self.file_job(path)
+        report_path = job.report_path()
+        stat = parser.file_stat(job.filepath)
+        known = self.files.get(report_path)
+        if known is not None and known[0] == stat:
+            return known
+        # keep the last good snippets when the file is broken
+        snippets = known[1] if known is not None else []
+        diagnostics = []
+        if stat is None:
+            snippets = []
+            diagnostics.append(diagnostic(report_path, "missing-file",
+                                          "No such file"))
+        else:
+            job.embed_text = self.embed_text
+            try:
+                snippets, _ = parser.parse_file(job)
+            except parser.SnippetError as e:
+                diagnostics.append(e.to_dict())
+            except (OSError, UnicodeDecodeError) as e:
+                diagnostics.append(diagnostic(report_path, "unreadable-file",
+                                              str(e)))
+        for snippet in snippets:
+            self.ids[snippet["id"]] = report_path
+        entry = (stat, snippets, diagnostics)
+        self.files[report_path] = entry
+        return entry
+
+    def current_index(self):
+        """ The id index, loaded again if main.py rewrote it """
+        if self.index_path is None:
+            return None
+        stat = parser.file_stat(self.index_path)
+        if stat != self.index_stat:
+            self.index_stat = stat
+            self.index = SnippetIndex(self.index_path).load()
+        return self.index
+
+    def snippets_for_file(self, path: str):
+        _, snippets, diagnostics = self.parse(path)
+        return {"snippets": snippets, "diagnostics": diagnostics}
+
+    def snippet(self, id: str):
+        paths = []
+        if id in self.ids:
+            paths.append(self.ids[id])
+        index = self.current_index()
+        if index is not None:
+            paths += [e["filename"] for e in index.query(id)
+                      if e["filename"] not in paths]
+        for path in paths:
+            _, snippets, diagnostics = self.parse(path)
+            for snippet in snippets:
+                if snippet["id"] == id:
+                    return {"snippet": snippet, "diagnostics": diagnostics}
+        # it moved out of the files it was known in
+        self.ids.pop(id, None)
+        return {"snippet": None,
+                "diagnostics": [diagnostic("", "unknown-id",
+                                           f"No snippet with id '{id}'")]}
+
+    def all_ids(self):
+        ids = set(self.ids)
+        index = self.current_index()
+        if index is not None:
+            ids.update(index.ids())
+        return {"ids": sorted(ids)}
+
+    def shutdown(self):
+        self.stopped = True
+        return {}
+
+    def call(self, method: str, params):
+        handler = self.methods.get(method)
+        if handler is None:
+            raise RpcError(METHOD_NOT_FOUND, f"Unknown method '{method}'")
+        if not isinstance(params, dict):
+            raise RpcError(INVALID_PARAMS, "params must be an object")
+        try:
+            inspect.signature(handler).bind(**params)
+        except TypeError as e:
+            raise RpcError(INVALID_PARAMS, str(e))
+        return handler(**params)
+
+    def handle_line(self, line: str):
+        """ The response to one request line, None for notifications """
+        try:
+            request = json.loads(line)
+        except ValueError as e:
+            return error_response(None, PARSE_ERROR, str(e))
+        if not isinstance(request, dict) or "method" not in request:
+            return error_response(request.get("id") if isinstance(request, dict)
+                                  else None, INVALID_REQUEST, "Not a request")
+        request_id = request.get("id")
+        try:
+            result = self.call(request["method"], request.get("params", {}))
+        except RpcError as e:
+            response = error_response(request_id, e.code, e.message)
+        except Exception as e:
+            # a bug in the parser, answer and keep serving
+            response = error_response(request_id, INTERNAL_ERROR,
+                                      f"{type(e).__name__}: {e}")
+        else:
+            response = {"jsonrpc": "2.0", "id": request_id, "result": result}
+        if "id" not in request:
+            return None
+        return response
+
+
+def error_response(request_id, code: int, message: str):
+    return {"jsonrpc": "2.0", "id": request_id,
+            "error": {"code": code, "message": message}}
+
+
+def serve(server: SnippetServer, stdin=sys.stdin, stdout=sys.stdout):
+    for line in stdin:
+        if not line.strip():
+            continue
+        response = server.handle_line(line)
+        if response is not None:
+            stdout.write(json.dumps(response) + "\n")
+            stdout.flush()
+        if server.stopped:
+            break
+
+
+def parse_args(args):
+    argparser = argparse.ArgumentParser(
+        description="Snippet parser server, JSON-RPC over stdin/stdout")
+    argparser.add_argument("--root", type=str, default=parser.LLVM_ROOT_DIR,
+                           help="Directory the file paths are relative to "
+                           "(default: LLVM_ROOT_DIR)")
+    argparser.add_argument("--index", type=str, default=DEFAULT_INDEX_FILE,
+                           help=f"Snippet id index to find ids in (default: {DEFAULT_INDEX_FILE})")
+    argparser.add_argument("--embed-text", action="store_true", default=False,
+                           help="Add the code and the context lines to the snippets, "
+                           "as main.py --embed-text does")
+    return argparser.parse_args(args)
+
+
+if __name__ == "__main__":
+    args = parse_args(sys.argv[1:])
+    server = SnippetServer(Path(args.root or "."), Path(args.index),
+                           args.embed_text)
+    serve(server)
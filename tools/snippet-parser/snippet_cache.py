@@ -0,0 +1,152 @@
+# On-disk cache for the snippet parser.
+# Every parsed file is stored as the FileSnippetReader.to_dict() output,
+# keyed by the git blob hash of the file contents and its relative path.
+# The layout is:
+#   <cache_dir>/index.json      salt, stat info per file and LRU times
+#   <cache_dir>/entries/<key>.json
+# The salt is derived from the parser source, so any change to the parser
+# (a regex, the context rules...) invalidates every entry.
+
+import hashlib
+import json
+import logging
+import os
+import time
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_ENTRIES = 4096
+
+
+def git_blob_hash(data: bytes):
+    """ Same object id that `git hash-object` gives for data """
+    h = hashlib.sha1(b"blob %d\0" % len(data))
+    h.update(data)
+    return h.hexdigest()
+
+
+def write_atomic(path: Path, text: str):
+    """ Write to a temporary file and rename it over path """
+    tmp_path = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    with open(tmp_path, "w") as f:
+        f.write(text)
+    os.replace(tmp_path, path)
+
+
+class SnippetCache:
+    def __init__(self, cache_dir: Path, salt: str,
+                 max_entries: int = DEFAULT_MAX_ENTRIES):
+        self.cache_dir = Path(cache_dir)
+        self.entries_dir = self.cache_dir / "entries"
+        self.index_path = self.cache_dir / "index.json"
+        self.salt = salt
+        self.max_entries = max_entries
+        # absolute path -> {"mtime_ns", "size", "blob"}
+        self.files = {}
+        # entry key -> last used time
+        self.entries = {}
+        self.hits = 0
+        self.misses = 0
+        self.load()
+
+    def load(self):
+        try:
+            with open(self.index_path) as f:
+                index = json.load(f)
+        except (OSError, ValueError):
+            index = None
+        if index is None or index.get("salt") != self.salt:
+            if index is not None:
+                logger.info("Parser changed, dropping the snippet cache")
+            self.clear()
+            return
+        self.files = index.get("files", {})
+        self.entries = index.get("entries", {})
+
+    def clear(self):
+        self.files = {}
+        self.entries = {}
+        if self.entries_dir.is_dir():
+            for entry in self.entries_dir.iterdir():
+                entry.unlink()
+
+    def entry_key(self, blob: str, rel_path: str, variant: str):
+        key = f"{blob}\0{rel_path}\0{variant}"
+        return hashlib.sha1(key.encode()).hexdigest()
+
+    def entry_path(self, key: str):
+        return self.entries_dir / f"{key}.json"
+
+    def blob_for_file(self, filepath: Path):
+        """
+        The blob hash of filepath. The file is only read when its
+        mtime or size changed since the last time it was seen.
+        """
+        st = os.stat(filepath)
+        path_key = str(filepath)
+        known = self.files.get(path_key)
+        if known and known["mtime_ns"] == st.st_mtime_ns \
+                and known["size"] == st.st_size:
+            return known["blob"]
+        with open(filepath, "rb") as f:
+            blob = git_blob_hash(f.read())
+        self.files[path_key] = {
+            "mtime_ns": st.st_mtime_ns,
+            "size": st.st_size,
+            "blob": blob,
+        }
+        return blob
+
+    def get(self, blob: str, rel_path: str, variant: str = ""):
+        """
+        The cached snippet dicts, or None on a miss.
+        variant: parser options that change the snippet dicts
+        """
+        key = self.entry_key(blob, rel_path, variant)
+        if key not in self.entries:
+            self.misses += 1
+            return None
+        try:
+            with open(self.entry_path(key)) as f:
+                snippets = json.load(f)
+        except (OSError, ValueError):
+            del self.entries[key]
+            self.misses += 1
+            return None
+        self.entries[key] = time.time()
+        self.hits += 1
+        return snippets
+
+    def put(self, blob: str, rel_path: str, snippets, variant: str = ""):
+        key = self.entry_key(blob, rel_path, variant)
+        self.entries_dir.mkdir(parents=True, exist_ok=True)
+        write_atomic(self.entry_path(key), json.dumps(snippets))
+        self.entries[key] = time.time()
+
+    def evict(self):
+        """ Drop the least recently used entries over max_entries """
+        # the stat info is only a shortcut to the blob hash, keep
+        # the most recently added files
+        if len(self.files) > self.max_entries:
+            self.files = dict(list(self.files.items())[-self.max_entries:])
+        excess = len(self.entries) - self.max_entries
+        if excess <= 0:
+            return
+        oldest = sorted(self.entries, key=self.entries.get)[:excess]
+        for key in oldest:
+            del self.entries[key]
+            try:
+                self.entry_path(key).unlink()
+            except OSError:
+                pass
+        logger.info(f"Evicted {len(oldest)} snippet cache entries")
+
+    def save(self):
+        self.evict()
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        write_atomic(self.index_path, json.dumps({
+            "salt": self.salt,
+            "files": self.files,
+            "entries": self.entries,
+        }))
@@ -0,0 +1,133 @@
+# Persistent index of the snippet ids, so `main.py --query <id>` and
+# `main.py --list` can answer without parsing anything. It is saved as
+#   {"files": {"<filename>": [<entry>, ...], ...}}
+# with one entry per snippet of the file:
+#   {"id": "sel-dag", "filename": "llvm/lib/...", "start_lineno": 217,
+#    "end_lineno": 230, "type": "replace=sel-dag-old",
+#    "replaces": "sel-dag-old"}
+# Each run replaces the entries of the files it parsed, a run over the
+# whole LLVM tree drops the files it did not list.
+
+import json
+from pathlib import Path
+
+from snippet_cache import write_atomic
+
+DEFAULT_INDEX_FILE = ".snippet-ids.json"
+
+
+def replace_target(snippet_type: str):
+    """ The id in a replace=<id> type, None for the other types """
+    if snippet_type.startswith("replace="):
+        return snippet_type[len("replace="):]
+    return None
+
+
+class SnippetIndex:
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        # filename -> entries
+        self.files = {}
+        # files whose entries were replaced in this run
+        self.updated = set()
+
+    def load(self):
+        try:
+            with open(self.path) as f:
+                self.files = json.load(f)["files"]
+        except (OSError, ValueError, KeyError):
+            self.files = {}
+        return self
+
+    def clear(self):
+        self.files = {}
+
+    def remove_files(self, filenames):
+        for filename in filenames:
+            self.files.pop(filename, None)
+
+    def add_snippets(self, snippets):
+        """ Add the snippet dicts of a parsed file """
+        for snippet in snippets:
+            filename = snippet["filename"]
+            if filename not in self.updated:
+                self.updated.add(filename)
+                self.files[filename] = []
+            self.files[filename].append(index_entry(snippet))
+
+    def replace_files(self, file_snippets):
+        """
+        Replace the entries of the files of {filename: snippet dicts},
+        the other files keep theirs
+        """
+        self.remove_files(file_snippets)
+        self.updated -= file_snippets.keys()
+        for snippets in file_snippets.values():
+            self.add_snippets(snippets)
+
+    def ids(self):
+        """ {id: entries}, in file and line order """
+        ids = {}
+        for filename in sorted(self.files):
+            for entry in self.files[filename]:
+                ids.setdefault(entry["id"], []).append(entry)
+        return ids
+
+    def query(self, snippet_id: str):
+        return self.ids().get(snippet_id, [])
+
+    def problems(self):
+        """ Messages for the duplicate ids and dangling replace= targets """
+        return [d["message"] for d in self.diagnostics()]
+
+    def diagnostics(self):
+        """
+        The duplicate ids and dangling replace= targets, as
+        {"file", "line", "code", "message"} dicts. A duplicate id is
+        reported at its second definition.
+        """
+        ids = self.ids()
+        diagnostics = []
+        for snippet_id, entries in sorted(ids.items()):
+            if len(entries) > 1:
+                places = ", ".join(location(e) for e in entries)
+                diagnostics.append(diagnostic(
+                    entries[1], "duplicate-id",
+                    f"Snippet id '{snippet_id}' is defined {len(entries)} times: {places}"))
+            for entry in entries:
+                target = entry["replaces"]
+                if target is not None and target not in ids:
+                    diagnostics.append(diagnostic(
+                        entry, "undefined-replace",
+                        f"Snippet '{snippet_id}' at {location(entry)} replaces "
+                        f"'{target}', which is not defined"))
+        return diagnostics
+
+    def save(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        write_atomic(self.path, json.dumps({"files": self.files}))
+
+
+def index_entry(snippet):
+    """ The entry of a snippet dict, without its contexts and code """
+    return {
+        "id": snippet["id"],
+        "filename": snippet["filename"],
+        "start_lineno": snippet["start_lineno"],
+        "end_lineno": snippet["end_lineno"],
+        "type": snippet["type"],
+        "replaces": replace_target(snippet["type"]),
+    }
+
+
+def location(entry):
+    return f"{entry['filename']}:{entry['start_lineno']}-{entry['end_lineno']}"
+
+
+def diagnostic(entry, code: str, message: str):
+    return {"file": entry["filename"], "line": entry["start_lineno"],
+            "code": code, "message": message}
+
+
+def format_entry(entry):
+    return f"{entry['id']}\t{location(entry)}\t{entry['type']}"
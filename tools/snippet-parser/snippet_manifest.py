@@ -0,0 +1,61 @@
+# Manifest of what a run changed in the snippets output, so the docs build
+# only re-renders the pages that use those snippets. It is saved as
+#   {"output": "snippets.json", "written": true,
+#    "added": [{"id": "sel-dag", "hash": "<sha1>"}, ...],
+#    "removed": [{"id": "old-snip", "hash": "<sha1>"}, ...],
+#    "modified": [{"id": "lower", "old_hash": "<sha1>", "hash": "<sha1>"}, ...]}
+# "written" is false when the output was already the same and was left
+# untouched. The hash of an id covers its whole snippet dicts (lines,
+# context stack, type, replaces and the "hash" of the code), so a page
+# is re-rendered whenever anything it shows from the snippet changed.
+
+import hashlib
+import json
+from pathlib import Path
+
+from snippet_cache import write_atomic
+from snippet_output import load_snippets
+
+
+def snippet_hashes(snippets):
+    """ {id: hash} of a list of snippet dicts """
+    dicts = {}
+    for snippet in snippets:
+        dicts.setdefault(snippet["id"], []).append(snippet)
+    return {
+        snippet_id: hashlib.sha1(json.dumps(
+            same_id, sort_keys=True, separators=(",", ":")).encode()).hexdigest()
+        for snippet_id, same_id in dicts.items()
+    }
+
+
+def read_hashes(filename: str):
+    """ {id: hash} of an output file, empty if there is none """
+    try:
+        return snippet_hashes(load_snippets(filename))
+    except (OSError, ValueError, KeyError, TypeError):
+        return {}
+
+
+def compare(old, new):
+    """ The added, removed and modified ids between two {id: hash} """
+    return {
+        "added": [{"id": i, "hash": new[i]} for i in sorted(new.keys() - old.keys())],
+        "removed": [{"id": i, "hash": old[i]} for i in sorted(old.keys() - new.keys())],
+        "modified": [{"id": i, "old_hash": old[i], "hash": new[i]}
+                     for i in sorted(old.keys() & new.keys()) if old[i] != new[i]],
+    }
+
+
+def write_manifest(path: Path, output: str, written: bool, old, new):
+    """ Returns the manifest written to path """
+    manifest = {"output": output, "written": written, **compare(old, new)}
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    write_atomic(path, json.dumps(manifest, indent=2))
+    return manifest
+
+
+def format_summary(manifest):
+    return (f"{len(manifest['added'])} added, {len(manifest['removed'])} removed, "
+            f"{len(manifest['modified'])} modified")
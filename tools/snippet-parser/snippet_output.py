@@ -0,0 +1,197 @@
+# Output formats of the snippet parser.
+#
+# json     the list of snippet dicts (the default, what snippets.json has
+#          always been)
+# ndjson   one snippet dict per line, written as soon as its file is parsed
+# compact  one JSON object where the filenames and context stacks are
+#          stored once, in tables, and referred to by index:
+#          {
+#            "format": "compact",
+#            "files": ["llvm/lib/Target/Nova/NovaISelLowering.cpp", ...],
+#            "context_stacks": [[{"type": "NAMESPACE", "line": 53}], ...],
+#            "fields": ["id", "filename", "start_lineno", ...],
+#            "snippets": [["sel-dag", 0, 217, 230, 0, "add"], ...]
+#          }
+#          "filename" and "context_stack" values are indices into "files"
+#          and "context_stacks". "fields" has every key of the snippets,
+#          a row has null for the keys its snippet does not have.
+#
+# src/util/snippet-formats.ts reads all three back into the json view.
+#
+# Files are written to a temporary file that is renamed over the output
+# when the writer is closed, so readers never see a half written file.
+# If the new output is the same as the file already there, the file is left
+# untouched, so watchers of the output (the Astro dev server) do not rebuild.
+
+import filecmp
+import json
+import os
+import sys
+
+FORMATS = ["json", "ndjson", "compact"]
+
+
+class SnippetWriter:
+    """
+    Base of the writers of the formats. They receive the snippet
+    dicts one file at a time with add_file() and write them to
+    filename ("-" for stdout) in close().
+    """
+
+    # snippets are written by add_file(), not only in close()
+    streams = False
+
+    def __init__(self, filename: str):
+        self.filename = filename
+        self.tmp_filename = None
+        self.f = None
+        # set by close(), False if the output was already the same
+        self.changed = True
+
+    def open(self):
+        if self.f is not None:
+            return self.f
+        if self.filename == "-":
+            self.f = sys.stdout
+        else:
+            self.tmp_filename = f"{self.filename}.{os.getpid()}.tmp"
+            self.f = open(self.tmp_filename, "w")
+        return self.f
+
+    def write_all(self):
+        """ Write what was buffered by add_file() """
+        pass
+
+    def close(self):
+        self.write_all()
+        f = self.open()
+        if f is sys.stdout:
+            f.flush()
+            return
+        f.close()
+        if os.path.exists(self.filename) and \
+                filecmp.cmp(self.tmp_filename, self.filename, shallow=False):
+            self.changed = False
+            os.unlink(self.tmp_filename)
+            return
+        os.replace(self.tmp_filename, self.filename)
+
+    def abort(self):
+        """ Drop the output, the previous file is left as it was """
+        if self.f is not None and self.f is not sys.stdout:
+            self.f.close()
+            os.unlink(self.tmp_filename)
+
+
+class JsonWriter(SnippetWriter):
+    def __init__(self, filename: str):
+        super().__init__(filename)
+        self.snippets = []
+
+    def add_file(self, snippets):
+        self.snippets.extend(snippets)
+
+    def write_all(self):
+        f = self.open()
+        if f is sys.stdout:
+            f.write(json.dumps(self.snippets, indent=2) + "\n")
+        else:
+            json.dump(self.snippets, f, indent=2)
+
+
+class NdjsonWriter(SnippetWriter):
+    streams = True
+
+    def add_file(self, snippets):
+        f = self.open()
+        for snippet in snippets:
+            f.write(json.dumps(snippet, separators=(",", ":")) + "\n")
+        f.flush()
+
+
+class CompactWriter(SnippetWriter):
+    def __init__(self, filename: str):
+        super().__init__(filename)
+        self.files = []
+        self.file_index = {}
+        self.context_stacks = []
+        self.context_stack_index = {}
+        # the rows are built in write_all(), once the fields are known:
+        # resolve() adds "replaces" to dicts added before it
+        self.snippets = []
+
+    def intern(self, value, table, index, key):
+        i = index.get(key)
+        if i is None:
+            i = index[key] = len(table)
+            table.append(value)
+        return i
+
+    def add_file(self, snippets):
+        self.snippets.extend(snippets)
+
+    def row(self, snippet, fields):
+        row = []
+        for field in fields:
+            value = snippet.get(field)
+            if field == "filename" and value is not None:
+                value = self.intern(value, self.files, self.file_index, value)
+            elif field == "context_stack" and value is not None:
+                key = json.dumps(value, sort_keys=True)
+                value = self.intern(value, self.context_stacks,
+                                    self.context_stack_index, key)
+            row.append(value)
+        return row
+
+    def write_all(self):
+        # every key of the snippets, in the order they first appear
+        fields = list(dict.fromkeys(k for snippet in self.snippets for k in snippet))
+        rows = [self.row(snippet, fields) for snippet in self.snippets]
+        json.dump({
+            "format": "compact",
+            "files": self.files,
+            "context_stacks": self.context_stacks,
+            "fields": fields,
+            "snippets": rows,
+        }, self.open(), separators=(",", ":"))
+
+
+def make_writer(format: str, filename: str):
+    if format == "ndjson":
+        return NdjsonWriter(filename)
+    elif format == "compact":
+        return CompactWriter(filename)
+    return JsonWriter(filename)
+
+
+def expand_compact(data):
+    """ The list of snippet dicts of a compact output """
+    snippets = []
+    for row in data["snippets"]:
+        # null is a key the snippet does not have
+        snippet = {field: value for field, value in zip(data["fields"], row)
+                   if value is not None}
+        if "filename" in snippet:
+            snippet["filename"] = data["files"][snippet["filename"]]
+        if "context_stack" in snippet:
+            snippet["context_stack"] = \
+                data["context_stacks"][snippet["context_stack"]]
+        snippets.append(snippet)
+    return snippets
+
+
+def load_snippets(filename: str):
+    """ Read an output file of any format as the list of snippet dicts """
+    with open(filename) as f:
+        text = f.read()
+    stripped = text.lstrip()
+    if stripped.startswith("["):
+        return json.loads(text)
+    if stripped.startswith("{"):
+        try:
+            data = json.loads(text)
+        except ValueError:
+            data = None
+        if isinstance(data, dict) and data.get("format") == "compact":
+            return expand_compact(data)
+    return [json.loads(line) for line in text.splitlines() if line.strip()]
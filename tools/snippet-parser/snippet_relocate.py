@@ -0,0 +1,179 @@
+# Fingerprints of the snippets, to find them again in new contents of their
+# files without parsing the files (after a rebase on a newer LLVM moved the
+# lines around). Every snippet dict has
+#   "fingerprint": {"start": "<hash>", "end": "<hash>",
+#                   "before": "<hash>", "after": "<hash>",
+#                   "context": ["<hash>", ...]}
+# start and end are the hashes of the two marker lines, before and after
+# of the FINGERPRINT_LINES lines around the markers and context of the
+# declaration line of each context of the context stack. Lines are hashed
+# without their leading and trailing whitespace, so a reindented marker is
+# still found. The body is the "hash" of the code the snippet already has.
+#
+# relocate_file() looks the start markers up in an index of the line
+# hashes of the new file, pairs each with the next end marker and compares
+# the body. A snippet is then
+#   unchanged  at the same lines, with the same body
+#   moved      with the same body at other lines
+#   edited     its markers are there but the body changed, its context
+#              stack may be stale until the file is parsed again
+#   lost       no start marker with its hash, or the file is gone
+
+import bisect
+import hashlib
+
+# lines hashed on each side of the markers
+FINGERPRINT_LINES = 3
+
+STATUSES = ["unchanged", "moved", "edited", "lost"]
+
+
+def code_hash(code: str):
+    """ The "hash" of a snippet, of the code between its markers """
+    return hashlib.sha1(code.encode()).hexdigest()
+
+
+def line_hash(line: str):
+    return hashlib.blake2b(line.strip().encode(), digest_size=8).hexdigest()
+
+
+def lines_hash(lines):
+    return line_hash("\n".join(line.strip() for line in lines))
+
+
+def fingerprint(lines, start_lineno: int, end_lineno: int, context_lines):
+    """
+    The fingerprint of the snippet between the 1 based marker lines
+    start_lineno and end_lineno of lines, context_lines are the
+    declaration lines of its context stack
+    """
+    return {
+        "start": line_hash(lines[start_lineno - 1]),
+        "end": line_hash(lines[end_lineno - 1]),
+        "before": lines_hash(lines[max(0, start_lineno - 1 - FINGERPRINT_LINES):
+                                   start_lineno - 1]),
+        "after": lines_hash(lines[end_lineno:end_lineno + FINGERPRINT_LINES]),
+        "context": [line_hash(lines[line - 1]) if 0 < line <= len(lines) else ""
+                    for line in context_lines],
+    }
+
+
+class LineHashIndex:
+    """
+    line hash -> the sorted line numbers of the lines with that hash,
+    built the first time a line is looked up
+    """
+
+    def __init__(self, lines):
+        self.lines = lines
+        self.index = None
+
+    def hash_at(self, lineno: int):
+        if 0 < lineno <= len(self.lines):
+            return line_hash(self.lines[lineno - 1])
+        return None
+
+    def find(self, h: str):
+        if self.index is None:
+            self.index = {}
+            for lineno, line in enumerate(self.lines, 1):
+                self.index.setdefault(line_hash(line), []).append(lineno)
+        return self.index.get(h, [])
+
+
+def relocate_file(snippets, lines):
+    """
+    Anchor the snippet dicts of a file in its new lines. Returns a
+    (status, old, new) per snippet, new is the updated dict, None
+    when the snippet is lost.
+    """
+    index = LineHashIndex(lines)
+    used = set()
+    results = []
+    for snippet in snippets:
+        found = anchor(snippet, index, used)
+        if found is None:
+            results.append(("lost", snippet, None))
+            continue
+        start, end = found
+        used.add(start)
+        status, new = relocated(snippet, index, start, end)
+        results.append((status, snippet, new))
+    return results
+
+
+def body_hash(lines, start: int, end: int):
+    return code_hash("".join(lines[start:end - 1]))
+
+
+def anchor(snippet, index: LineHashIndex, used):
+    """ The (start, end) marker lines of snippet in the new lines, or None """
+    fp = snippet.get("fingerprint")
+    if fp is None:
+        return None
+    old_start, old_end = snippet["start_lineno"], snippet["end_lineno"]
+    # most snippets did not move, try there before indexing the file
+    if old_start not in used and index.hash_at(old_start) == fp["start"] \
+            and index.hash_at(old_end) == fp["end"] \
+            and body_hash(index.lines, old_start, old_end) == snippet["hash"]:
+        return old_start, old_end
+    best = None
+    best_score = None
+    ends = index.find(fp["end"])
+    for start in index.find(fp["start"]):
+        if start in used:
+            continue
+        k = bisect.bisect_right(ends, start)
+        if k == len(ends):
+            continue
+        end = ends[k]
+        lines = index.lines
+        score = (body_hash(lines, start, end) == snippet["hash"],
+                 (lines_hash(lines[max(0, start - 1 - FINGERPRINT_LINES):start - 1])
+                  == fp["before"])
+                 + (lines_hash(lines[end:end + FINGERPRINT_LINES]) == fp["after"]),
+                 -abs(start - old_start))
+        if best_score is None or score > best_score:
+            best, best_score = (start, end), score
+    return best
+
+
+def relocated(snippet, index: LineHashIndex, start: int, end: int):
+    """ (status, the dict of snippet moved to the marker lines start and end) """
+    new = dict(snippet)
+    new["start_lineno"] = start
+    new["end_lineno"] = end
+    delta = start - snippet["start_lineno"]
+    fp = snippet["fingerprint"]
+    context_stack = []
+    for context, h in zip(snippet["context_stack"], fp["context"]):
+        context = dict(context)
+        context["line"] = relocate_context_line(index, context["line"], h,
+                                                delta, start)
+        context_stack.append(context)
+    new["context_stack"] = context_stack
+    new["hash"] = body_hash(index.lines, start, end)
+    new["fingerprint"] = fingerprint(index.lines, start, end,
+                                     [c["line"] for c in context_stack])
+    if new["hash"] != snippet["hash"]:
+        return "edited", new
+    if start == snippet["start_lineno"] and end == snippet["end_lineno"]:
+        return "unchanged", new
+    return "moved", new
+
+
+def relocate_context_line(index: LineHashIndex, line: int, h: str,
+                          delta: int, start: int):
+    """
+    The new declaration line of a context of a snippet now starting at
+    start: moved with the snippet, left in place, or the closest line
+    above the snippet with the same hash
+    """
+    if not h or line <= 0:
+        return line
+    for candidate in (line + delta, line):
+        if index.hash_at(candidate) == h:
+            return candidate
+    linenos = index.find(h)
+    k = bisect.bisect_right(linenos, start) - 1
+    return linenos[k] if k >= 0 else line + delta
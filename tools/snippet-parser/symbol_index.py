@@ -0,0 +1,165 @@
+# Index of the C++ scopes declared across the files, so a snippet in an
+# out-of-line definition such as
+#   SDValue MipsTargetLowering::LowerReturn(...) {
+# in a .cpp is linked to the class declared in its .h. It is saved as
+#   {"salt": "<parser salt>", "files": {"<filename>": {
+#       "blob": "<git blob hash of the file>",
+#       "symbols": [["llvm", "MipsTargetLowering", "CLASS", 259],
+#                   ["", "MipsTargetLowering::LowerReturn", "FUNCTION", 120],
+#                   ...]}}}
+# with one symbol per class, struct, union, enum and function body of the
+# file that is not local to a function: the namespaces and classes around
+# it, its name as written and the line of its declaration.
+#
+# A context of a snippet is found by its file and line. When its name is
+# qualified, the scope that qualifies it is looked up the way C++ does,
+# from the innermost enclosing scope outwards. The .cpp files of LLVM
+# mostly say `using namespace llvm;` instead of opening the namespace, so
+# a name found nowhere that way is taken from the only scope of the files
+# whose name ends with it.
+#
+# The files a run parses are brought up to date before their snippets are
+# resolved. The entries of the other files (the headers, on runs over the
+# files changed from main) are checked against their file the first time a
+# lookup lands in one of them, and scanned again through refresh if the
+# file changed. A name found nowhere has the headers its file includes
+# indexed through discover, and is looked up again; if it is still not
+# found, and is not a namespace, it is kept in unresolved for a warning.
+
+from scope_index import FileIndex
+
+# the symbol types that declare a scope
+SCOPE_TYPES = {"CLASS", "STRUCT", "UNION", "ENUM"}
+
+
+def qualify(enclosing: str, name: str):
+    return f"{enclosing}::{name}" if enclosing else name
+
+
+class SymbolIndex(FileIndex):
+    """
+    refresh: called with a filename whose entry is about to be used,
+    scans the file again if it changed since it was indexed and
+    returns True if it did
+    discover: called with a filename a name could not be resolved in,
+    indexes the headers it includes and returns True if it scanned any
+    """
+
+    def __init__(self, path, salt: str = "", refresh=None, discover=None):
+        super().__init__(path, salt)
+        self.refresh = refresh
+        self.discover = discover
+        # files known to be up to date in this run
+        self.checked = set()
+        # files whose headers were looked for in this run
+        self.discovered = set()
+        # scope name as written -> (filename, line) of the first
+        # definition qualified with it that no scope was found for
+        self.unresolved = {}
+        # files scanned in this run
+        self.updated = 0
+        self.drop_lookups()
+
+    def drop_lookups(self):
+        # qualified name -> [(filename, type, line)] of the scopes
+        self.scopes = None
+        # last component of the name -> qualified names of the scopes
+        self.last_names = None
+        # last components of the names of the namespaces
+        self.namespaces = None
+        # filename -> {line: symbol}, filled on demand
+        self.sites = {}
+
+    def set_file(self, filename: str, blob: str, entry):
+        super().set_file(filename, blob, entry)
+        self.drop_lookups()
+
+    def remove_file(self, filename: str):
+        super().remove_file(filename)
+        self.drop_lookups()
+
+    def retain(self, filenames):
+        super().retain(filenames)
+        self.drop_lookups()
+
+    def build_lookups(self):
+        self.scopes = {}
+        self.last_names = {}
+        enclosings = set()
+        for filename in sorted(self.files):
+            for enclosing, name, type, line in self.files[filename]["symbols"]:
+                enclosings.add(enclosing)
+                if type not in SCOPE_TYPES:
+                    continue
+                qualified = qualify(enclosing, name)
+                sites = self.scopes.setdefault(qualified, [])
+                if not sites:
+                    last = qualified.rsplit("::", 1)[-1]
+                    self.last_names.setdefault(last, []).append(qualified)
+                sites.append((filename, type, line))
+        # the scopes around a symbol that are not classes
+        self.namespaces = set()
+        for enclosing in enclosings:
+            parts = enclosing.split("::") if enclosing else []
+            for k in range(1, len(parts) + 1):
+                if "::".join(parts[:k]) not in self.scopes:
+                    self.namespaces.add(parts[k - 1])
+
+    def symbol_at(self, filename: str, lineno: int):
+        """ The symbol declared on filename:lineno, None if there is none """
+        sites = self.sites.get(filename)
+        if sites is None:
+            entry = self.files.get(filename)
+            symbols = entry["symbols"] if entry is not None else []
+            sites = self.sites[filename] = {s[3]: s for s in symbols}
+        return sites.get(lineno)
+
+    def lookup(self, name: str, enclosing: str):
+        """ The qualified name of the scope name refers to from enclosing """
+        if self.scopes is None:
+            self.build_lookups()
+        if name.startswith("::"):
+            name = name[2:]
+            return name if name in self.scopes else None
+        parts = enclosing.split("::") if enclosing else []
+        for k in range(len(parts), -1, -1):
+            qualified = qualify("::".join(parts[:k]), name)
+            if qualified in self.scopes:
+                return qualified
+        candidates = [q for q in self.last_names.get(name.rsplit("::", 1)[-1], [])
+                      if q.endswith("::" + name)]
+        return candidates[0] if len(candidates) == 1 else None
+
+    def declaring_scope(self, filename: str, lineno: int):
+        """
+        {"name", "type", "file", "line"} of the scope that declares
+        the qualified name of the symbol on filename:lineno, None if
+        it is not qualified or the scope is unknown
+        """
+        symbol = self.symbol_at(filename, lineno)
+        if symbol is None or "::" not in symbol[1]:
+            return None
+        enclosing, name = symbol[0], symbol[1]
+        scope_name = name.rsplit("::", 1)[0]
+        qualified = self.lookup(scope_name, enclosing)
+        if qualified is None:
+            if scope_name.rsplit("::", 1)[-1] in self.namespaces:
+                return None
+            if self.discover is not None and filename not in self.discovered:
+                self.discovered.add(filename)
+                if self.discover(filename):
+                    return self.declaring_scope(filename, lineno)
+            self.unresolved.setdefault(scope_name, (filename, lineno))
+            return None
+        site_file, type, line = self.scopes[qualified][0]
+        if not self.is_current(site_file):
+            # look it up again in the new entry
+            return self.declaring_scope(filename, lineno)
+        return {"name": qualified, "type": type, "file": site_file, "line": line}
+
+    def is_current(self, filename: str):
+        """ False if the entry of filename was stale and is now replaced """
+        if filename in self.checked or self.refresh is None:
+            return True
+        self.checked.add(filename)
+        return not self.refresh(filename)
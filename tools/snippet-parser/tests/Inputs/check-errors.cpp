@@ -0,0 +1,20 @@
+namespace check {
+//@s check-ok
+int ok();
+//- check-ok
+
+int f() {
+//@s check-typo
+  return 1;
+//- check-tyop
+}
+}
+}
+
+//@s check-loop-a replace=check-loop-b
+//- check-loop-a
+//@s check-loop-b replace=check-loop-a
+//- check-loop-b
+//@s check-ok
+//- check-ok
+//@s check-unclosed
@@ -0,0 +1,7 @@
+//@s indexed-dup
+int dup() { return 2; }
+//- indexed-dup
+
+//@s indexed-new replace=indexed-gone
+int replaced() { return 3; }
+//- indexed-new
@@ -0,0 +1,5 @@
+namespace second {
+//@s second-snip
+int second() { return 2; }
+//- second-snip
+}
@@ -0,0 +1,4 @@
+// A file without snippet markers, it is skipped after the scan
+namespace unmarked {
+int unmarked() { return 0; }
+}
@@ -0,0 +1,3 @@
+//@s server-open
+int open();
+//- server-other
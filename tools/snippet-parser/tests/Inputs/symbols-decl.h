@@ -0,0 +1,9 @@
+namespace llvm {
+class LLVM_LIBRARY_VISIBILITY NovaTargetLowering : public TargetLowering {
+public:
+  SDValue LowerReturn(SDValue Chain) const override;
+  struct Info {
+    int get();
+  };
+};
+} // namespace llvm
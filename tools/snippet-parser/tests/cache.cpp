@@ -0,0 +1,17 @@
+// RUN: rm -rf %t.cache
+// RUN: %parser --cache-dir %t.cache -o %t.first.json %s | %filecheck --check-prefix=MISS %s
+// RUN: %parser --cache-dir %t.cache -o %t.second.json %s | %filecheck --check-prefix=HIT %s
+// RUN: diff %t.first.json %t.second.json
+// RUN: %parser --cache-dir %t.cache --no-cache -o %t.third.json %s | %filecheck --check-prefix=MISS %s
+// RUN: diff %t.first.json %t.third.json
+
+// MISS: 1 snippets from 1 files.
+// MISS-NOT: (cached)
+// HIT: 1 snippets from 1 files.
+// HIT-NEXT: 1 files were unchanged (cached).
+
+namespace cached {
+//@s cached-snip
+int cached() { return 0; }
+//- cached-snip
+}
@@ -0,0 +1,30 @@
+// RUN: (%parser --check %s %S/Inputs/check-errors.cpp || echo failed) | %filecheck %s
+// RUN: (%parser --check --diagnostics-format json %S/Inputs/check-errors.cpp || echo failed) | %filecheck %s --check-prefix=JSON
+// RUN: %parser --check %s | %filecheck %s --check-prefix=CLEAN
+//@s check-clean
+int clean();
+//- check-clean
+
+// CHECK: check-errors.cpp:7: error: Found start snippet without end: 'check-typo' [start-without-end]
+// CHECK-NEXT: check-errors.cpp:9: error: Found end snippet without start: 'check-tyop' (the open snippet is 'check-typo') [mismatched-end]
+// CHECK-NEXT: check-errors.cpp:12: warning: unmatched } [unmatched-brace]
+// CHECK-NEXT: check-errors.cpp:14: warning: replace= cycle: check-loop-a -> check-loop-b -> check-loop-a [replace-cycle]
+// CHECK-NEXT: check-errors.cpp:16: warning: replace= cycle: check-loop-b -> check-loop-a -> check-loop-b [replace-cycle]
+// CHECK-NEXT: check-errors.cpp:18: warning: Snippet id 'check-ok' is defined 2 times: {{.*}} [duplicate-id]
+// CHECK-NEXT: check-errors.cpp:20: error: Found start snippet without end: 'check-unclosed' [start-without-end]
+// CHECK-NEXT: 3 errors, 4 warnings in 2 files
+// CHECK-NEXT: failed
+
+// JSON: "files": 1,
+// JSON-NEXT: "errors": 3,
+// JSON-NEXT: "warnings": 4,
+// JSON-NEXT: "diagnostics": [
+// JSON-NEXT: {
+// JSON-NEXT: "file": "{{.*}}check-errors.cpp",
+// JSON-NEXT: "line": 7,
+// JSON-NEXT: "code": "start-without-end",
+// JSON-NEXT: "message": "Found start snippet without end: 'check-typo'",
+// JSON-NEXT: "severity": "error"
+// JSON: failed
+
+// CLEAN: 0 errors, 0 warnings in 1 files
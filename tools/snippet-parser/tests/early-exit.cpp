@@ -0,0 +1,28 @@
+// RUN: %parser %s %S/Inputs/no-markers.cpp -o %t.early --no-manifest --no-cache --profile %t.profile
+// RUN: %filecheck %s < %t.profile
+// the context dump walks every line of every file
+// RUN: %parser %s %S/Inputs/no-markers.cpp -o %t.full --no-manifest --no-cache --dump-contexts > /dev/null
+// RUN: diff %t.early %t.full
+namespace early {
+class Early {
+//@s early-snip
+  int early() { return 0; }
+//- early-snip
+};
+// nothing below the last marker changes the snippets
+int after() { return 1; }
+}
+
+// CHECK: "per_file": [
+// CHECK: "filename": "{{.*}}early-exit.cpp",
+// CHECK: "counts": {
+// CHECK-NEXT: "lines": 28,
+// CHECK-NEXT: "lines_scanned": 10,
+// CHECK-NEXT: "marker_candidates": 2,
+// CHECK-NEXT: "marker_matches": 2,
+// CHECK: "filename": "{{.*}}no-markers.cpp",
+// CHECK: "counts": {
+// CHECK-NEXT: "lines": 0,
+// CHECK-NEXT: "lines_scanned": 0,
+// CHECK-NEXT: "marker_candidates": 0,
+// CHECK-NEXT: "marker_matches": 0
@@ -0,0 +1,22 @@
+// RUN: %parser --embed-text %s | %filecheck %s
+namespace embed {
+int before() { return 0; }
+//@s embedded
+int embedded() { return 1; }
+//- embedded
+}
+
+// CHECK: "id": "embedded"
+// CHECK: "context_stack": [
+// CHECK: "type": "NAMESPACE",
+// CHECK-NEXT: "line": 2,
+// CHECK-NEXT: "content": "namespace embed {"
+// CHECK: "code": "int embedded() { return 1; }\n",
+// CHECK-NEXT: "before": [
+// CHECK-NEXT: "// {{RUN}}: {{.*}}",
+// CHECK-NEXT: "namespace embed {",
+// CHECK-NEXT: "int before() { return 0; }"
+// CHECK-NEXT: ],
+// CHECK-NEXT: "after": [
+// CHECK-NEXT: "}",
+// CHECK: "hash": "{{[0-9a-f]+}}"
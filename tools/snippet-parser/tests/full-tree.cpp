@@ -0,0 +1,22 @@
+// RUN: rm -rf %t && mkdir -p %t/lib/Target %t/lib/build %t/docs
+// RUN: echo 'build/' > %t/.gitignore
+// RUN: echo '*.inc' > %t/lib/.gitignore
+// RUN: cp %s %t/lib/Target/Walk.cpp
+// RUN: cp %s %t/lib/build/Ignored.cpp
+// RUN: cp %s %t/lib/Target/Gen.inc
+// RUN: cp %s %t/docs/Walk.md
+// the index goes to %t, not to the directory the test runs in
+// RUN: env LLVM_ROOT_DIR=%t %parser --all --no-cache --index %t.ids | %filecheck %s
+// RUN: %parser --index %t.ids --list | %filecheck %s --check-prefix=INDEX
+namespace walk {
+//@s walked
+int walked() { return 1; }
+//- walked
+}
+
+// CHECK: "id": "walked",
+// CHECK-NEXT: "filename": "lib/Target/Walk.cpp",
+// CHECK-NOT: "id"
+
+// INDEX: walked	lib/Target/Walk.cpp:{{[0-9]+}}-{{[0-9]+}}	add
+// INDEX-NOT: {{.}}
@@ -43,4 +43,19 @@ bool llvm::debuginfoShouldUseDebugInstrRef(const Triple &T) {
   cout << "function";
 // CHECK: Context[[[@LINE-1]]]
 // CHECK-NEXT: [:[[@LINE-3]]]
-}
\ No newline at end of file
+}
+Derived::Derived(int a)
+    : Base(a), x(1) {
+  cout << "constructor";
+// CHECK: Context[[[@LINE-1]]]
+// CHECK-NEXT: [:[[@LINE-4]]] Derived::Derived(int a)
+}
+
+INITIALIZE_PASS_BEGIN(Pass, "pass", "A pass", false, false)
+INITIALIZE_PASS_END(Pass, "pass", "A pass", false, false)
+
+void afterMacros() {
+  cout << "after the macros";
+// CHECK: Context[[[@LINE-1]]]
+// CHECK-NEXT: [:[[@LINE-3]]] void afterMacros()
+}
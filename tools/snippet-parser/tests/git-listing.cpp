@@ -0,0 +1,23 @@
+// RUN: rm -rf %t && mkdir -p %t/repo/lib
+// RUN: git -C %t/repo init -q -b trunk
+// RUN: cp %s %t/repo/lib/Listed.cpp
+// RUN: git -C %t/repo add lib && git -C %t/repo -c user.name=t -c user.email=t@t commit -q -m base
+// RUN: echo '[]' > %t/out.json
+// without a main branch to diff against, the run fails and the
+// output and manifest are left alone
+// RUN: (env LLVM_ROOT_DIR=%t/repo %parser --no-cache --no-index -o %t/out.json 2>&1 || echo failed) | %filecheck %s
+// RUN: (env LLVM_ROOT_DIR=%t/repo %parser --no-cache --no-index --dump-contexts -o %t/out.json 2>&1 || echo failed) | %filecheck %s
+// RUN: (env LLVM_ROOT_DIR=%t/repo %parser --no-cache --no-index --symbols %t/symbols.json -o %t/out.json 2>&1 || echo failed) | %filecheck %s
+// RUN: (env LLVM_ROOT_DIR=%t/repo %parser --check 2>&1 || echo failed) | %filecheck %s
+// RUN: (env LLVM_ROOT_DIR=%t/repo %parser --diff 2>&1 || echo failed) | %filecheck %s
+// RUN: echo '[]' | diff - %t/out.json
+// RUN: test ! -e %t/out.manifest.json
+
+// CHECK-NOT: Traceback
+// CHECK: Error: {{.*}}main
+// CHECK-NOT: Traceback
+// CHECK: failed
+
+// snippet-begin listed
+int listed;
+// snippet-end listed
@@ -0,0 +1,36 @@
+// RUN: rm -rf %t && mkdir -p %t/repo/lib
+// RUN: git -C %t/repo init -q -b main
+// RUN: echo 'int base;' > %t/repo/lib/Base.cpp
+// RUN: git -C %t/repo add lib && git -C %t/repo -c user.name=t -c user.email=t@t commit -q -m base
+// RUN: git -C %t/repo checkout -q -b first
+// RUN: cp %s %t/repo/lib/Rev.cpp && cp %s %t/repo/lib/Shared.cpp
+// RUN: git -C %t/repo add lib && git -C %t/repo -c user.name=t -c user.email=t@t commit -q -m first
+// RUN: git -C %t/repo checkout -q -b second
+// RUN: sed -i 's/^  return 1;/  return 2;\n  return 3;/' %t/repo/lib/Rev.cpp
+// RUN: git -C %t/repo -c user.name=t -c user.email=t@t commit -q -am second
+// the working tree of each branch is the reference
+// RUN: env LLVM_ROOT_DIR=%t/repo %parser --no-cache --no-index --no-manifest -o %t/second.json
+// RUN: git -C %t/repo checkout -q first
+// RUN: env LLVM_ROOT_DIR=%t/repo %parser --no-cache --no-index --no-manifest -o %t/first.json
+// RUN: %filecheck %s < %t/first.json
+// the revisions are read from the git objects, whatever is checked out
+// RUN: echo 'garbage' > %t/repo/lib/Rev.cpp
+// RUN: env LLVM_ROOT_DIR=%t/repo %parser --no-cache --no-manifest --rev second -o %t/rev.json
+// RUN: diff %t/second.json %t/rev.json
+// RUN: env LLVM_ROOT_DIR=%t/repo %parser --no-cache --no-manifest --rev first --rev second -o %t/revs-{rev}.json -v 2>&1 | %filecheck %s --check-prefix=SHARED
+// RUN: diff %t/first.json %t/revs-first.json
+// RUN: diff %t/second.json %t/revs-second.json
+namespace rev {
+//@s rev-snip
+int rev() {
+  return 1;
+}
+//- rev-snip
+}
+
+// CHECK: "id": "rev-snip",
+// CHECK-NEXT: "filename": "lib/Rev.cpp",
+// CHECK: "id": "rev-snip",
+// CHECK-NEXT: "filename": "lib/Shared.cpp",
+
+// SHARED: 1 files are shared between the revisions
@@ -0,0 +1,16 @@
+; RUN: %parser -d %s | %filecheck %s
+; The braces of struct types and constants in a define body are not scopes.
+%pair = type { i32, i32 }
+declare void @g()
+
+define { i32, i32 } @f(i32 %a,
+                      i32 %b) {
+entry:
+  %p = insertvalue { i32, i32 } undef, i32 %a, 0 ; }
+; CHECK: Context[[[@LINE-1]]]
+; CHECK-NEXT: [:6] define { i32, i32 } @f(i32 %a,
+; CHECK-NEXT: ===end context===
+  ret { i32, i32 } %p
+}
+; CHECK: Context[[[@LINE-1]]]
+; CHECK-NEXT: ===end context===
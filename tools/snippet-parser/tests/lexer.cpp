@@ -0,0 +1,38 @@
+// RUN: %parser -d %s | %filecheck %s
+// Braces in comments, strings and macros do not open scopes.
+namespace lexer {
+
+const char *Open = "{ \"{";
+const char Brace = '}';
+const char *Raw = R"x(
+  } } }
+)x";
+/* a block comment { spanning
+   lines } */
+#define BLOCK(X) \
+  do { X; } while (0)
+
+void allman(int Count)
+{
+  int Big = 1'000'000;
+// CHECK: Context[[[@LINE-1]]]
+// CHECK-NEXT: [:3] namespace lexer {
+// CHECK-NEXT: [:15] void allman(int Count)
+// CHECK-NEXT: ===end context===
+  if (Count) {
+    return;
+  } else if (Count == 2) {
+    Count++;
+// CHECK: Context[[[@LINE-1]]]
+// CHECK-NEXT: [:3] namespace lexer {
+// CHECK-NEXT: [:15] void allman(int Count)
+// CHECK-NEXT: ===end context===
+  }
+}
+
+void declaration(int A,
+                 int B);
+// CHECK: Context[[[@LINE-1]]]
+// CHECK-NEXT: [:3] namespace lexer {
+// CHECK-NEXT: ===end context===
+}
@@ -0,0 +1,35 @@
+// RUN: %parser -d %s | %filecheck %s
+// The trackers read the LineTable columns: blank lines, lines that are
+// only a comment and directives are handled without lexing them, and
+// lines whose first and last characters cannot start a declaration are
+// not classified.
+namespace columns {
+
+    // an indented comment with a brace does not open a scope {
+#define OPEN_BRACE {
+  const char *s = "// not a comment {";
+  int y = 2; // a trailing comment {
+#ifdef COLUMNS
+int x = 1;
+// CHECK: Context[[[@LINE-1]]]:
+// CHECK-NEXT: [:6] namespace columns
+// CHECK-NEXT: [:[[@LINE-4]]] #ifdef COLUMNS
+// CHECK-NEXT: ===end context===
+#endif
+	struct Columns {	// tabs around the declaration
+  int f()
+  {
+    return 0;
+// CHECK: Context[[[@LINE-1]]]:
+// CHECK-NEXT: [:6] namespace columns
+// CHECK-NEXT: [:[[@LINE-6]]] struct Columns
+// CHECK-NEXT: [:[[@LINE-6]]] int f()
+// CHECK-NEXT: ===end context===
+  }
+  x = y + 1;
+  f(x);
+  };
+// CHECK: Context[[[@LINE-1]]]:
+// CHECK-NEXT: [:6] namespace columns
+// CHECK-NEXT: ===end context===
+}
@@ -13,7 +13,9 @@ FILECHECK_PATH = os.environ.get("FILECHECK_PATH")
 config.name = 'SnippetParser'
 config.test_format = lit.formats.ShTest(True)
 
-config.suffixes = ['.cpp', '.h']
+config.suffixes = ['.cpp', '.h', '.td', '.ll']
+# files used by the RUN lines of other tests
+config.excludes = ['Inputs']
 config.test_source_root = os.path.dirname(__file__)
 # config.test_exec_root = 
 # go to ../build for test_exec_root
@@ -24,6 +26,9 @@ substitutions = [
 ('%parser',
     'python3 ' + os.path.join(config.test_source_root, '..', 'main.py')
 ),
+('%server',
+    'python3 ' + os.path.join(config.test_source_root, '..', 'server.py')
+),
 (r'%filecheck', FILECHECK_PATH),
 ]
 
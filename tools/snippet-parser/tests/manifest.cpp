@@ -0,0 +1,52 @@
+// RUN: rm -rf %t && mkdir -p %t
+// RUN: cp %s %t/input.cpp
+// RUN: %parser %t/input.cpp -o %t/out.json | %filecheck %s --check-prefix=FIRST
+// RUN: %filecheck %s --check-prefix=ADDED < %t/out.manifest.json
+// RUN: %parser %t/input.cpp -o %t/out.json | %filecheck %s --check-prefix=SAME
+// RUN: sed -i 's/return 2;/return 3;/; s/manifest-gone/manifest-new/' %t/input.cpp
+// RUN: %parser %t/input.cpp -o %t/out.json --manifest %t/changes.json | %filecheck %s --check-prefix=CHANGED
+// RUN: %filecheck %s --check-prefix=MANIFEST < %t/changes.json
+int kept() {
+//@s manifest-kept
+  return 1;
+//- manifest-kept
+}
+
+int edited() {
+//@s manifest-edited
+  return 2;
+//- manifest-edited
+}
+
+//@s manifest-gone
+int gone();
+//- manifest-gone
+
+// FIRST: Written to {{.*}}out.json
+// FIRST: Manifest {{.*}}out.manifest.json: 3 added, 0 removed, 0 modified
+
+// ADDED: "written": true,
+// ADDED: "id": "manifest-edited"
+// ADDED: "id": "manifest-gone"
+// ADDED: "id": "manifest-kept"
+
+// SAME: out.json is unchanged, not written
+// SAME: Manifest {{.*}}: 0 added, 0 removed, 0 modified
+
+// CHANGED: Written to {{.*}}out.json
+// CHANGED: Manifest {{.*}}changes.json: 1 added, 1 removed, 1 modified
+
+// MANIFEST: "written": true,
+// MANIFEST: "added": [
+// MANIFEST-NEXT: {
+// MANIFEST-NEXT: "id": "manifest-new",
+// MANIFEST: "removed": [
+// MANIFEST-NEXT: {
+// MANIFEST-NEXT: "id": "manifest-gone",
+// MANIFEST: "modified": [
+// MANIFEST-NEXT: {
+// MANIFEST-NEXT: "id": "manifest-edited",
+// MANIFEST-NEXT: "old_hash": "{{[0-9a-f]+}}",
+// MANIFEST-NEXT: "hash": "{{[0-9a-f]+}}"
+// MANIFEST-NEXT: }
+// MANIFEST-NEXT: ]
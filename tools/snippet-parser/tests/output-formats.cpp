@@ -0,0 +1,18 @@
+// RUN: %parser --format ndjson %s | %filecheck %s --check-prefix=NDJSON
+// RUN: %parser --format compact %s | %filecheck %s --check-prefix=COMPACT
+namespace formats {
+//@s first
+int first() { return 1; }
+//- first
+
+//@s second
+int second() { return 2; }
+//- second
+}
+
+// NDJSON: {"id":"first","filename":"{{.*}}output-formats.cpp","start_lineno":[[@LINE-9]],{{.*}}"context_stack":[{"type":"NAMESPACE","line":3}]{{.*}}}
+// NDJSON-NEXT: {"id":"second",{{.*}}"start_lineno":[[@LINE-6]],{{.*}}}
+// NDJSON-NOT: {
+
+// COMPACT: {"format":"compact","files":["{{.*}}output-formats.cpp"],"context_stacks":[{{\[}}{"type":"NAMESPACE","line":3}]],"fields":["id","filename",
+// COMPACT-SAME: "snippets":{{\[}}["first",0,[[@LINE-14]],{{.*}}],["second",0,[[@LINE-10]],{{.*}}]]}
@@ -0,0 +1,14 @@
+// RUN: %parser %s %S/Inputs/jobs-second.cpp > %t.serial
+// RUN: %parser -j 2 %s %S/Inputs/jobs-second.cpp > %t.parallel
+// RUN: diff %t.serial %t.parallel
+// RUN: %filecheck %s < %t.parallel
+namespace first {
+//@s first-snip
+int first() { return 1; }
+//- first-snip
+}
+
+// CHECK: "id": "first-snip"
+// CHECK: "type": "NAMESPACE"
+// CHECK: "id": "second-snip"
+// CHECK: "type": "NAMESPACE"
@@ -0,0 +1,22 @@
+// RUN: rm -rf %t && mkdir -p %t
+// 40 files, more than two batches of the pipeline, listed in reverse
+// RUN: for i in $(seq 40); do printf '//@s pipe-%%s\nint f%%s;\n//- pipe-%%s\n' $i $i $i > %t/f$i.cpp; done
+// RUN: seq 40 -1 1 | sed 's/.*/pipe-&/' > %t/expected
+// RUN: %parser --no-cache --no-manifest -o %t/out.json $(seq 40 -1 1 | sed 's|.*|%t/f&.cpp|')
+// RUN: grep '"id"' %t/out.json | sed 's/.*"id": "\(.*\)",/\1/' | diff %t/expected -
+// RUN: %parser --no-cache --no-manifest -j 2 -o %t/parallel.json $(seq 40 -1 1 | sed 's|.*|%t/f&.cpp|')
+// RUN: diff %t/out.json %t/parallel.json
+// the first error in listing order is reported and the output is kept
+// RUN: printf '//@s broken-a\nint a;\n' > %t/f30.cpp
+// RUN: printf '//- broken-b\n' > %t/f10.cpp
+// RUN: cp %t/out.json %t/before.json
+// RUN: (%parser --no-cache --no-manifest -j 2 -o %t/out.json $(seq 40 -1 1 | sed 's|.*|%t/f&.cpp|') 2>&1 || echo failed) > %t/log
+// RUN: %filecheck %s < %t/log
+// RUN: diff %t/before.json %t/out.json
+// RUN: ls %t | %filecheck %s --check-prefix=FILES
+
+// CHECK: Error: {{.*}}f30.cpp:1: Found start snippet without end: 'broken-a'
+// CHECK-NOT: broken-b
+// CHECK: failed
+
+// FILES-NOT: .tmp
@@ -0,0 +1,24 @@
+// RUN: %parser --profile %t.json %s > /dev/null
+// RUN: %filecheck %s < %t.json
+namespace profiled {
+//@s profiled-snip
+int profiled() { return 0; }
+//- profiled-snip
+}
+// code after the last marker is not scanned
+int after() { return 1; }
+
+// CHECK: "snippets": 1,
+// CHECK: "run_phases": {
+// CHECK: "phases": {
+// CHECK: "context":
+// CHECK: "classify":
+// CHECK: "counts": {
+// CHECK-NEXT: "lines": 24,
+// CHECK-NEXT: "lines_scanned": 6,
+// CHECK-NEXT: "marker_candidates": 2,
+// CHECK-NEXT: "marker_matches": 2,
+// CHECK: "slowest": [
+// CHECK-NEXT: {
+// CHECK-NEXT: "filename": "{{.*}}profile.cpp",
+// CHECK: "per_file": [
@@ -0,0 +1,64 @@
+// RUN: rm -rf %t && mkdir -p %t
+// RUN: cp %s %t/input.cpp
+// RUN: %parser %t/input.cpp -o %t/old.json --no-manifest
+// RUN: sed -i '/^namespace relocate/i int upstream;' %t/input.cpp
+// RUN: sed -i 's/return 2;/return 3;/; /^\/\/@s relocate-gone/,/^\/\/- relocate-gone/d' %t/input.cpp
+// RUN: (%parser --relocate %t/old.json -o %t/new.json --no-manifest --relocate-report %t/report.json || echo failed) | %filecheck %s
+// RUN: %filecheck %s --check-prefix=REPORT < %t/report.json
+// RUN: %filecheck %s --check-prefix=OUTPUT < %t/new.json
+namespace relocate {
+
+int same() {
+//@s relocate-same
+  return 1;
+//- relocate-same
+}
+
+int edited() {
+//@s relocate-edited
+  return 2;
+//- relocate-edited
+}
+
+//@s relocate-gone
+int gone();
+//- relocate-gone
+
+} // namespace relocate
+
+// CHECK: moved relocate-same {{.*}}input.cpp:12-14 -> 13-15
+// CHECK: edited relocate-edited {{.*}}input.cpp:18-20 -> 19-21
+// CHECK: lost relocate-gone {{.*}}input.cpp:23-25
+// CHECK: 0 unchanged, 1 moved, 1 edited, 1 lost
+// CHECK: Written to {{.*}}new.json
+// CHECK: failed
+
+// REPORT: "moved": [
+// REPORT-NEXT: {
+// REPORT-NEXT: "id": "relocate-same",
+// REPORT: "old": [
+// REPORT-NEXT: 12,
+// REPORT-NEXT: 14
+// REPORT: "new": [
+// REPORT-NEXT: 13,
+// REPORT-NEXT: 15
+// REPORT: "lost": [
+// REPORT-NEXT: {
+// REPORT-NEXT: "id": "relocate-gone",
+// REPORT: "new": null
+
+// OUTPUT: "id": "relocate-same",
+// OUTPUT: "start_lineno": 13,
+// OUTPUT-NEXT: "end_lineno": 15,
+// OUTPUT-NEXT: "context_stack": [
+// OUTPUT-NEXT: {
+// OUTPUT-NEXT: "type": "NAMESPACE",
+// OUTPUT-NEXT: "line": 10
+// OUTPUT-NEXT: },
+// OUTPUT-NEXT: {
+// OUTPUT-NEXT: "type": "FUNCTION",
+// OUTPUT-NEXT: "line": 12
+// OUTPUT-NEXT: }
+// OUTPUT-NEXT: ],
+// OUTPUT: "id": "relocate-edited",
+// OUTPUT-NOT: relocate-gone
@@ -0,0 +1,62 @@
+// RUN: rm -rf %t.cache
+// RUN: %parser --cache-dir %t.cache %s 2>%t.err | %filecheck %s
+// RUN: %filecheck %s --check-prefix=WARN < %t.err
+// RUN: %parser --cache-dir %t.cache %s 2>/dev/null | %filecheck %s
+// RUN: %parser --format ndjson %s 2>/dev/null | %filecheck %s --check-prefix=NDJSON
+// RUN: %parser --format ndjson --embed-text %s 2>/dev/null | %filecheck %s --check-prefix=EMBED
+// RUN: %parser --format compact %s 2>/dev/null | %filecheck %s --check-prefix=COMPACT
+int lower(int X) {
+//@s replace-old
+  return X + 1;
+  return X;
+//- replace-old
+}
+
+int lowerAgain(int X) {
+//@s replace-new replace=replace-old
+  return X + 1;
+  return X * 2;
+//- replace-new
+}
+
+//@s replace-loop-a replace=replace-loop-b
+int a();
+//- replace-loop-a
+//@s replace-loop-b replace=replace-loop-a
+int b();
+//- replace-loop-b
+
+// CHECK: "id": "replace-new",
+// CHECK: "type": "replace=replace-old",
+// CHECK-NEXT: "hash": "{{[0-9a-f]+}}",
+// CHECK-NEXT: "fingerprint": {
+// CHECK: "replaces": {
+// CHECK-NEXT: "id": "replace-old",
+// CHECK-NEXT: "removed": "  return X + 1;\n  return X;\n",
+// CHECK-NEXT: "diff": [
+// CHECK-NEXT: "@@ -1,2 +1,2 @@",
+// CHECK-NEXT: "   return X + 1;",
+// CHECK-NEXT: "-  return X;",
+// CHECK-NEXT: "+  return X * 2;"
+// CHECK-NEXT: ]
+// CHECK: "id": "replace-loop-a",
+// CHECK-NOT: "replaces"
+// CHECK: "type": "replace=replace-loop-b",
+// CHECK-NEXT: "hash": "{{[0-9a-f]+}}",
+// CHECK-NEXT: "fingerprint": {
+
+// WARN: Warning: replace= cycle: replace-loop-a -> replace-loop-b -> replace-loop-a
+// WARN: Warning: replace= cycle: replace-loop-b -> replace-loop-a -> replace-loop-b
+
+// the resolved snippets come last
+// NDJSON: {"id":"replace-old",
+// NDJSON-NEXT: {"id":"replace-new",{{.*}}"replaces":{"id":"replace-old",
+
+// only the replace= snippets are kept whole, the code of the target is
+// read back from the file
+// EMBED: {"id":"replace-new",{{.*}}"replaces":{"id":"replace-old","removed":"  return X + 1;\n  return X;\n",
+
+// "replaces" is added after the snippets are handed to the writer, and
+// only to some of them
+// COMPACT: "fields":["id",{{.*}},"replaces"],"snippets":
+// COMPACT-SAME: ["replace-old",{{.*}},null],["replace-new",{{.*}},{"id":"replace-old","removed":"  return X + 1;\n  return X;\n",
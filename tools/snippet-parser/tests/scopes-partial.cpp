@@ -0,0 +1,36 @@
+// RUN: rm -rf %t && mkdir -p %t/repo/lib
+// RUN: git -C %t/repo init -q -b main
+// RUN: cp %s %t/repo/lib/Changed.cpp && cp %s %t/repo/lib/Unchanged.cpp
+// RUN: git -C %t/repo add lib && git -C %t/repo -c user.name=t -c user.email=t@t commit -q -m base
+// RUN: env LLVM_ROOT_DIR=%t/repo %parser --all --no-cache --no-index --no-manifest -o %t/out.json --scopes %t/scopes.json | %filecheck %s --check-prefix=ALL
+// a run over the files changed from main keeps the entries of the others
+// RUN: sed -i 's/^namespace partial {$/int inserted;\n&/' %t/repo/lib/Changed.cpp
+// RUN: env LLVM_ROOT_DIR=%t/repo %parser --no-cache --no-index --no-manifest -o %t/out.json --scopes %t/scopes.json | %filecheck %s --check-prefix=PARTIAL
+// RUN: env LLVM_ROOT_DIR=%t/repo %parser --scopes %t/scopes.json --context-at lib/Unchanged.cpp:17 | %filecheck %s --check-prefix=UNCHANGED
+// RUN: env LLVM_ROOT_DIR=%t/repo %parser --scopes %t/scopes.json --context-at lib/Changed.cpp:18 | %filecheck %s --check-prefix=CHANGED
+// an entry is not used once its file changed
+// RUN: echo 'int appended;' >> %t/repo/lib/Unchanged.cpp
+// RUN: (env LLVM_ROOT_DIR=%t/repo %parser --scopes %t/scopes.json --context-at lib/Unchanged.cpp:17 || echo failed) | %filecheck %s --check-prefix=STALE
+namespace partial {
+
+class Partial {
+  int get() const {
+    return 0;
+  }
+};
+
+} // namespace partial
+
+// ALL: Scopes of 2 files updated in {{.*}}scopes.json
+// PARTIAL: Scopes of 1 files updated in {{.*}}scopes.json
+
+// UNCHANGED: NAMESPACE lib/Unchanged.cpp:14 14-21
+// UNCHANGED-NEXT: CLASS lib/Unchanged.cpp:16 16-19
+// UNCHANGED-NEXT: FUNCTION lib/Unchanged.cpp:17 17-18
+
+// CHANGED: NAMESPACE lib/Changed.cpp:15 15-22
+// CHANGED-NEXT: CLASS lib/Changed.cpp:17 17-20
+// CHANGED-NEXT: FUNCTION lib/Changed.cpp:18 18-19
+
+// STALE: Error: lib/Unchanged.cpp changed since it was indexed
+// STALE: failed
@@ -0,0 +1,47 @@
+// RUN: rm -rf %t && mkdir -p %t
+// RUN: cp %s %t/input.cpp
+// RUN: %parser %t/input.cpp -o %t/out.json --no-manifest --scopes %t/scopes.json | %filecheck %s --check-prefix=FIRST
+// RUN: %parser %t/input.cpp -o %t/out.json --no-manifest --scopes %t/scopes.json | %filecheck %s --check-prefix=SAME
+// RUN: %parser --scopes %t/scopes.json --context-at %t/input.cpp:18 | %filecheck %s --check-prefix=FUNC
+// RUN: %parser --scopes %t/scopes.json --context-at %t/input.cpp:21 | %filecheck %s --check-prefix=CLASS
+// RUN: %parser --scopes %t/scopes.json --context-at %t/input.cpp:24 | %filecheck %s --check-prefix=TOP
+// RUN: (%parser --scopes %t/scopes.json --context-at %t/other.cpp:1 || echo failed) | %filecheck %s --check-prefix=MISSING
+// RUN: sed -i '/^class Scoped/i int before;' %t/input.cpp
+// RUN: %parser %t/input.cpp -o %t/out.json --no-manifest --scopes %t/scopes.json | %filecheck %s --check-prefix=EDITED
+// RUN: %parser --scopes %t/scopes.json --context-at %t/input.cpp:19 | %filecheck %s --check-prefix=MOVED
+namespace scopes {
+
+class Scoped {
+  int x;
+
+  int get() const {
+    return x;
+  }
+
+  void set(int v);
+};
+
+} // namespace scopes
+int after;
+
+// FIRST: Scopes of 1 files updated in {{.*}}scopes.json
+// SAME: Scopes of 0 files updated in {{.*}}scopes.json
+
+// FUNC: NAMESPACE {{.*}}input.cpp:12 12-23
+// FUNC-NEXT: CLASS {{.*}}input.cpp:14 14-21
+// FUNC-NEXT: FUNCTION {{.*}}input.cpp:17 17-18
+// FUNC-NOT: {{.}}
+
+// CLASS: NAMESPACE {{.*}}input.cpp:12 12-23
+// CLASS-NEXT: CLASS {{.*}}input.cpp:14 14-21
+// CLASS-NOT: {{.}}
+
+// TOP: input.cpp:24 is at the top level
+
+// MISSING: Error: {{.*}}other.cpp is not in the scope index
+// MISSING: failed
+
+// EDITED: Scopes of 1 files updated in {{.*}}scopes.json
+// MOVED: NAMESPACE {{.*}}input.cpp:12 12-24
+// MOVED-NEXT: CLASS {{.*}}input.cpp:15 15-22
+// MOVED-NEXT: FUNCTION {{.*}}input.cpp:18 18-19
@@ -0,0 +1,29 @@
+// RUN: rm -f %t.ids
+// RUN: %parser --index %t.ids %s -o %t.json
+// RUN: printf '%%s\n' \
+// RUN:   '{"jsonrpc":"2.0","id":1,"method":"snippets_for_file","params":{"path":"server.cpp"}}' \
+// RUN:   '{"jsonrpc":"2.0","id":2,"method":"snippets_for_file","params":{"path":"Inputs/server-broken.cpp"}}' \
+// RUN:   'not json' \
+// RUN:   '{"jsonrpc":"2.0","id":3,"method":"frobnicate"}' \
+// RUN:   '{"jsonrpc":"2.0","id":4,"method":"snippet","params":{"name":"server-first"}}' \
+// RUN:   '{"jsonrpc":"2.0","method":"ids"}' \
+// RUN:   '{"jsonrpc":"2.0","id":5,"method":"snippet","params":{"id":"server-first"}}' \
+// RUN:   '{"jsonrpc":"2.0","id":6,"method":"snippet","params":{"id":"server-missing"}}' \
+// RUN:   '{"jsonrpc":"2.0","id":7,"method":"shutdown"}' \
+// RUN:   '{"jsonrpc":"2.0","id":8,"method":"ids"}' \
+// RUN:   | %server --root %S --index %t.ids | %filecheck %s
+namespace llvm {
+//@s server-first
+int first() { return 1; }
+//- server-first
+}
+
+// CHECK: {"jsonrpc": "2.0", "id": 1, "result": {"snippets": [{"id": "server-first", "filename": "server.cpp", "start_lineno": 16, "end_lineno": 18, {{.*}}}], "diagnostics": []}}
+// CHECK-NEXT: {"jsonrpc": "2.0", "id": 2, "result": {"snippets": [], "diagnostics": [{"file": "Inputs/server-broken.cpp", "line": 3, "code": "mismatched-end", "message": "{{.*}}"}]}}
+// CHECK-NEXT: {"jsonrpc": "2.0", "id": null, "error": {"code": -32700,
+// CHECK-NEXT: {"jsonrpc": "2.0", "id": 3, "error": {"code": -32601, "message": "Unknown method 'frobnicate'"}}
+// CHECK-NEXT: {"jsonrpc": "2.0", "id": 4, "error": {"code": -32602,
+// CHECK-NEXT: {"jsonrpc": "2.0", "id": 5, "result": {"snippet": {"id": "server-first", {{.*}}}, "diagnostics": []}}
+// CHECK-NEXT: {"jsonrpc": "2.0", "id": 6, "result": {"snippet": null, "diagnostics": [{"file": "", "line": 0, "code": "unknown-id", "message": "No snippet with id 'server-missing'"}]}}
+// CHECK-NEXT: {"jsonrpc": "2.0", "id": 7, "result": {}}
+// CHECK-NOT: "id": 8
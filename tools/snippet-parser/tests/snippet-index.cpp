@@ -0,0 +1,26 @@
+// RUN: rm -f %t.ids
+// RUN: %parser --index %t.ids %s %S/Inputs/index-other.cpp -o %t.json 2>&1 | %filecheck %s --check-prefix=WARN
+// RUN: %parser --index %t.ids --query indexed-first | %filecheck %s --check-prefix=QUERY
+// RUN: %parser --index %t.ids --list | %filecheck %s --check-prefix=LIST
+// RUN: (%parser --index %t.ids --query indexed-missing || echo failed) | %filecheck %s --check-prefix=MISSING
+//@s indexed-first
+int first() { return 1; }
+//- indexed-first
+
+//@s indexed-dup mark
+int dup() { return 1; }
+//- indexed-dup
+
+// WARN-DAG: Warning: Snippet id 'indexed-dup' is defined 2 times: {{.*}}index-other.cpp:1-3, {{.*}}snippet-index.cpp:10-12
+// WARN-DAG: Warning: Snippet 'indexed-new' at {{.*}}index-other.cpp:5-7 replaces 'indexed-gone', which is not defined
+
+// QUERY: indexed-first	{{.*}}snippet-index.cpp:6-8	add
+// QUERY-NOT: indexed
+
+// LIST: indexed-dup	{{.*}}index-other.cpp:1-3	add
+// LIST-NEXT: indexed-dup	{{.*}}snippet-index.cpp:10-12	mark
+// LIST-NEXT: indexed-first	{{.*}}snippet-index.cpp:6-8	add
+// LIST-NEXT: indexed-new	{{.*}}index-other.cpp:5-7	replace=indexed-gone
+
+// MISSING: Error: no snippet with id 'indexed-missing'
+// MISSING-NEXT: failed
@@ -0,0 +1,9 @@
+// RUN: rm -rf %t && mkdir -p %t
+// RUN: (%parser %S/Inputs/check-errors.cpp -o %t/out.json --no-manifest --symbols %t/symbols.json --scopes %t/scopes.json 2>&1 || echo failed) | %filecheck %s
+
+// a marker error is reported like without the indexes, the file is
+// left out of them
+// CHECK-NOT: Traceback
+// CHECK: Error: {{.*}}check-errors.cpp:9: Found end snippet without start: 'check-tyop'
+// CHECK-NOT: Traceback
+// CHECK: failed
@@ -0,0 +1,45 @@
+// RUN: rm -rf %t && mkdir -p %t/lib/Nova %t/include/nova
+// RUN: cp %S/Inputs/symbols-decl.h %t/include/nova/decl.h
+// RUN: cp %s %t/lib/Nova/Lowering.cpp
+// the header is not given, it is found from the #include
+// RUN: %parser %t/lib/Nova/Lowering.cpp -o %t/out.json --no-manifest --symbols %t/symbols.json 2>&1 | %filecheck %s --check-prefix=FIRST
+// RUN: %filecheck %s < %t/out.json
+// RUN: %parser %t/lib/Nova/Lowering.cpp -o %t/out.json --no-manifest --symbols %t/symbols.json 2>&1 | %filecheck %s --check-prefix=SAME
+// RUN: %filecheck %s < %t/out.json
+#include "nova/decl.h"
+#include "missing.h"
+
+using namespace llvm;
+
+SDValue NovaTargetLowering::LowerReturn(SDValue Chain) const {
+//@s include-return
+  return Chain;
+//- include-return
+}
+
+void Unknown::run() {
+//@s include-unknown
+//- include-unknown
+}
+
+void llvm::dump() {
+//@s include-namespace
+//- include-namespace
+}
+
+// FIRST: Warning: {{.*}}Lowering.cpp:20: no declaration of Unknown is indexed
+// FIRST-NOT: Warning
+// FIRST: Symbols of 2 files updated in {{.*}}symbols.json
+// SAME: Warning: {{.*}}Lowering.cpp:20: no declaration of Unknown is indexed
+// SAME-NOT: Warning
+// SAME: Symbols of 0 files updated in {{.*}}symbols.json
+
+// CHECK: "id": "include-return",
+// CHECK: "declared_in": {
+// CHECK-NEXT: "name": "llvm::NovaTargetLowering",
+// CHECK-NEXT: "type": "CLASS",
+// CHECK-NEXT: "file": "{{.*}}include/nova/decl.h",
+// CHECK: "id": "include-unknown",
+// CHECK-NOT: declared_in
+// CHECK: "id": "include-namespace",
+// CHECK-NOT: declared_in
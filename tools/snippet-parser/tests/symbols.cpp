@@ -0,0 +1,82 @@
+// RUN: rm -rf %t && mkdir -p %t && cp %S/Inputs/symbols-decl.h %t/decl.h
+// RUN: %parser %s %t/decl.h -o %t/out.json --no-manifest --symbols %t/symbols.json | %filecheck %s --check-prefix=FIRST
+// RUN: %filecheck %s < %t/out.json
+// RUN: %parser %s %t/decl.h -o %t/out.json --no-manifest --symbols %t/symbols.json | %filecheck %s --check-prefix=SAME
+// the header is not parsed again, its entry is still up to date
+// RUN: %parser %s -o %t/out.json --no-manifest --symbols %t/symbols.json | %filecheck %s --check-prefix=SAME
+// RUN: %filecheck %s < %t/out.json
+// a header that changed is scanned again when a lookup lands in it
+// RUN: sed -i '1i // moved down a line' %t/decl.h
+// RUN: %parser %s -o %t/out.json --no-manifest --symbols %t/symbols.json | %filecheck %s --check-prefix=HEADER
+// RUN: %filecheck %s --check-prefix=MOVED < %t/out.json
+// RUN: %parser %s -o %t/plain.json --no-manifest
+// RUN: %filecheck %s --check-prefix=PLAIN < %t/plain.json
+using namespace llvm;
+
+SDValue
+NovaTargetLowering::LowerReturn(SDValue Chain) const {
+//@s symbols-return
+  return Chain;
+//- symbols-return
+}
+
+NovaTargetLowering::NovaTargetLowering(const TargetMachine &TM)
+    : TargetLowering(TM), Subtarget(nullptr) {
+//@s symbols-constructor
+  computeRegisterProperties();
+//- symbols-constructor
+}
+
+namespace llvm {
+int NovaTargetLowering::Info::get() {
+//@s symbols-info
+  return 0;
+//- symbols-info
+}
+} // namespace llvm
+
+static int helper() {
+//@s symbols-helper
+  return 1;
+//- symbols-helper
+}
+
+// FIRST: Symbols of 2 files updated in {{.*}}symbols.json
+// SAME: Symbols of 0 files updated in {{.*}}symbols.json
+// HEADER: Symbols of 1 files updated in {{.*}}symbols.json
+
+// CHECK: "id": "symbols-return",
+// CHECK: "type": "FUNCTION",
+// CHECK-NEXT: "line": 17,
+// CHECK-NEXT: "declared_in": {
+// CHECK-NEXT: "name": "llvm::NovaTargetLowering",
+// CHECK-NEXT: "type": "CLASS",
+// CHECK-NEXT: "file": "{{.*}}decl.h",
+// CHECK-NEXT: "line": 2
+// the member initializer list is part of the declaration
+// CHECK: "id": "symbols-constructor",
+// CHECK: "type": "FUNCTION",
+// CHECK-NEXT: "line": 23,
+// CHECK-NEXT: "declared_in": {
+// CHECK-NEXT: "name": "llvm::NovaTargetLowering",
+// CHECK: "id": "symbols-info",
+// CHECK: "type": "FUNCTION",
+// CHECK-NEXT: "line": 31,
+// CHECK-NEXT: "declared_in": {
+// CHECK-NEXT: "name": "llvm::NovaTargetLowering::Info",
+// CHECK-NEXT: "type": "STRUCT",
+// CHECK-NEXT: "file": "{{.*}}decl.h",
+// CHECK-NEXT: "line": 5
+// CHECK: "id": "symbols-helper",
+// CHECK: "type": "FUNCTION",
+// CHECK-NEXT: "line": 38
+// CHECK-NEXT: }
+
+// MOVED: "id": "symbols-return",
+// MOVED: "file": "{{.*}}decl.h",
+// MOVED-NEXT: "line": 3
+// MOVED: "id": "symbols-info",
+// MOVED: "file": "{{.*}}decl.h",
+// MOVED-NEXT: "line": 6
+
+// PLAIN-NOT: declared_in
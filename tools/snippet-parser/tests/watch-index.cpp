@@ -0,0 +1,21 @@
+// RUN: rm -rf %t && mkdir -p %t && cp %s %t/input.cpp
+// RUN: printf '//@s other\nint other;\n//- other\n' > %t/other.cpp
+// RUN: %parser --no-cache --no-manifest --index %t/ids.json %t/other.cpp -o %t/other.json
+// the watcher only replaces the entries of the files it parses
+// RUN: env PYTHONUNBUFFERED=1 timeout 20 %parser --watch --watch-interval 0.05 --no-cache --no-manifest --index %t/ids.json %t/input.cpp -o %t/out.json > %t/log 2>&1 & echo $! > %t/pid
+// RUN: for i in $(seq 100); do grep -q 'Watching' %t/log && break; sleep 0.1; done
+// RUN: %filecheck %s --check-prefix=FIRST < %t/ids.json
+// RUN: sed -i 's/^\/\/@s indexed$/\/\/@s indexed-renamed/; s/^\/\/- indexed$/\/\/- indexed-renamed/' %t/input.cpp
+// RUN: for i in $(seq 100); do grep -q 'Updated' %t/log && break; sleep 0.1; done
+// RUN: kill $(cat %t/pid)
+// RUN: %filecheck %s --check-prefix=RENAMED < %t/ids.json
+//@s indexed
+int indexed;
+//- indexed
+
+// FIRST-DAG: "id": "other"
+// FIRST-DAG: "id": "indexed"
+
+// RENAMED-NOT: "id": "indexed"
+// RENAMED-DAG: "id": "other"
+// RENAMED-DAG: "id": "indexed-renamed"
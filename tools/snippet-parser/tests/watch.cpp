@@ -0,0 +1,26 @@
+// RUN: rm -rf %t && mkdir -p %t && cp %s %t/input.cpp
+// the log is read while the watcher runs, timeout stops it if the test fails
+// RUN: env PYTHONUNBUFFERED=1 timeout 20 %parser --watch --watch-interval 0.05 --no-cache --no-index --no-manifest %t/input.cpp -o %t/out.json > %t/log 2>&1 & echo $! > %t/pid
+// RUN: for i in $(seq 100); do grep -q 'Watching' %t/log && break; sleep 0.1; done
+// RUN: %filecheck %s --check-prefix=FIRST < %t/out.json
+// the size changes too, the mtime alone may not within a clock tick
+// RUN: sed -i 's/^\/\/@s watched$/\/\/@s watched-renamed/; s/^\/\/- watched$/\/\/- watched-renamed/' %t/input.cpp
+// RUN: for i in $(seq 100); do grep -q 'Updated' %t/log && break; sleep 0.1; done
+// RUN: kill $(cat %t/pid)
+// RUN: %filecheck %s --check-prefix=LOG < %t/log
+// RUN: %filecheck %s --check-prefix=RENAMED < %t/out.json
+namespace watch {
+//@s watched
+int watched() { return 0; }
+//- watched
+}
+
+// FIRST: "id": "watched",
+// FIRST-NOT: "id"
+
+// LOG: Watching 1 files
+// LOG: Updated {{.*}}out.json (1 files changed)
+
+// RENAMED: "id": "watched-renamed",
+// RENAMED-NEXT: "filename": "{{.*}}input.cpp",
+// RENAMED-NOT: "id"
@@ -0,0 +1,144 @@
+# Lists every file of a source tree with os.scandir, so snippets can be
+# extracted from the whole LLVM checkout and not only from the files that
+# differ from main.
+#
+# .gitignore files are honoured, with the syntax git documents for them:
+# globs with "*", "?", "[...]" and "**", patterns anchored by a slash,
+# "dir/" patterns that only match directories and "!" negations. As in
+# git, a file in an ignored directory cannot be re-included, so ignored
+# directories are pruned without being read.
+
+import os
+import re
+from pathlib import Path
+
+# never entered, whatever the .gitignore files say
+PRUNED_DIRS = {".git"}
+
+
+def glob_to_regex(glob: str):
+    """ Regex source matching a .gitignore glob, "/" is a separator """
+    regex = ""
+    i = 0
+    while i < len(glob):
+        c = glob[i]
+        if glob.startswith("**/", i):
+            regex += "(?:.*/)?"
+            i += 3
+            continue
+        if glob.startswith("**", i):
+            regex += ".*"
+            i += 2
+            continue
+        if c == "*":
+            regex += "[^/]*"
+        elif c == "?":
+            regex += "[^/]"
+        elif c == "[":
+            end = glob.find("]", i + 2)
+            if end < 0:
+                regex += re.escape(c)
+            else:
+                chars = glob[i + 1:end]
+                if chars[0] == "!":
+                    chars = "^" + chars[1:]
+                regex += "[" + chars.replace("\\", "\\\\") + "]"
+                i = end
+        elif c == "\\" and i + 1 < len(glob):
+            i += 1
+            regex += re.escape(glob[i])
+        else:
+            regex += re.escape(c)
+        i += 1
+    return regex
+
+
+class IgnoreRule:
+    """
+    One line of a .gitignore
+    base: the directory of the .gitignore, relative to the root
+    ("" or ending with "/")
+    """
+
+    def __init__(self, base: str, pattern: str):
+        self.base = base
+        self.negate = pattern.startswith("!")
+        if self.negate:
+            pattern = pattern[1:]
+        self.dir_only = pattern.endswith("/")
+        pattern = pattern.rstrip("/")
+        # a slash at the start or in the middle anchors the
+        # pattern to the .gitignore directory, otherwise it
+        # matches the name at any depth
+        self.anchored = "/" in pattern
+        self.regex = re.compile(glob_to_regex(pattern.lstrip("/")) + r"\Z")
+
+    def matches(self, rel_path: str, name: str, is_dir: bool):
+        if self.dir_only and not is_dir:
+            return False
+        if not rel_path.startswith(self.base):
+            return False
+        if self.anchored:
+            return self.regex.match(rel_path, len(self.base)) is not None
+        return self.regex.match(name) is not None
+
+
+def read_ignore_file(path: Path, base: str):
+    """ The rules of the .gitignore at path, [] if there is none """
+    try:
+        with open(path, encoding="utf-8", errors="replace") as f:
+            lines = f.read().splitlines()
+    except OSError:
+        return []
+    rules = []
+    for line in lines:
+        # trailing spaces are ignored unless escaped
+        if not line.endswith("\\ "):
+            line = line.rstrip()
+        if not line or line.startswith("#"):
+            continue
+        rules.append(IgnoreRule(base, line))
+    return rules
+
+
+def is_ignored(rules, rel_path: str, name: str, is_dir: bool):
+    # the last matching rule wins, deeper .gitignore files come last
+    for rule in reversed(rules):
+        if rule.matches(rel_path, name, is_dir):
+            return not rule.negate
+    return False
+
+
+def walk_tree(root: Path, suffixes):
+    """
+    Paths relative to root (as posix strings, sorted) of the files
+    under root that have one of suffixes and are not ignored.
+    """
+    root_rules = read_ignore_file(root / ".git" / "info" / "exclude", "")
+    files = []
+    # (directory, its path relative to root with a trailing "/", rules)
+    stack = [(str(root), "", root_rules)]
+    while stack:
+        dir_path, rel_dir, rules = stack.pop()
+        try:
+            with os.scandir(dir_path) as it:
+                entries = list(it)
+        except OSError:
+            continue
+        for entry in entries:
+            if entry.name == ".gitignore":
+                rules = rules + read_ignore_file(Path(entry.path), rel_dir)
+        for entry in entries:
+            name = entry.name
+            rel_path = rel_dir + name
+            if entry.is_dir(follow_symlinks=False):
+                if name in PRUNED_DIRS or \
+                        is_ignored(rules, rel_path, name, True):
+                    continue
+                stack.append((entry.path, rel_path + "/", rules))
+            elif os.path.splitext(name)[1] in suffixes and \
+                    entry.is_file() and \
+                    not is_ignored(rules, rel_path, name, False):
+                files.append(rel_path)
+    files.sort()
+    return files